@@ -1,19 +1,57 @@
 from abc import abstractmethod, ABC
-from pydantic import BaseModel
+from typing import TYPE_CHECKING, Callable
+import base64
 
+if TYPE_CHECKING:
+    from card_features import FeatureIndex
 
-class Card(BaseModel):
-    """card with image, path, checksum for verification and encoded picture"""
-    key: int
-    path: str
-    checksum: str
-    encoded_picture: str
+
+class Card:
+    """card with image, path and checksum for verification;
+    two cards are equal when they have the same key and checksum, so comparing and hashing never touches the image.
+    The picture itself is loaded only when it is needed, from the card store (see CardManager) or from the path
+    """
+    __slots__ = ("key", "path", "checksum", "_loader")
+
+    def __init__(self, key: int, path: str, checksum: str, loader: Callable[[], bytes] | None = None) -> None:
+        self.key = key
+        self.path = path
+        self.checksum = checksum
+        self._loader = loader
+
+    def set_loader(self, loader: Callable[[], bytes]) -> None:
+        """where image_bytes come from, e.g. the memory mapped card pack"""
+        self._loader = loader
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Card):
+            return NotImplemented
+        return self.key == other.key and self.checksum == other.checksum
+
+    def __hash__(self) -> int:
+        return hash((self.key, self.checksum))
+
+    def __repr__(self) -> str:
+        return f"Card(key={self.key}, path={self.path!r}, checksum={self.checksum!r})"
+
+    @property
+    def image_bytes(self) -> bytes:
+        if self._loader is not None:
+            return self._loader()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @property
+    def encoded_picture(self) -> str:
+        """base64 of the image, computed on every access"""
+        return base64.b64encode(self.image_bytes).decode("utf-8")
 
 
 class AbstractCardManager(ABC):
     """An object, which keeps track of all the cards
     by default loads all images and makes Card instances out of them
     """
+    dict_of_cards: dict[int, Card]
 
     @abstractmethod
     def _load_cards(self) -> None:
@@ -25,9 +63,17 @@ class AbstractCardManager(ABC):
         """find a card by key"""
         ...
 
+    @abstractmethod
+    def features(self) -> "FeatureIndex":
+        """feature index of the cards, for players choosing by the features of the pictures"""
+        ...
+
 
 class AbstractPlayer(ABC):
     """Player"""
+    name: str
+    score: int
+    cards_on_hand: list[Card]
 
     @abstractmethod
     def take_card(self, card: Card) -> None:
@@ -47,4 +93,33 @@ class AbstractPlayer(ABC):
     @abstractmethod
     def score_add(self, number: int) -> None:
         """add score"""
-        ...
\ No newline at end of file
+        ...
+
+
+class AbstractAsyncPlayer(AbstractPlayer):
+    """Player whose API calls can run as coroutines, so many of them share one event loop"""
+
+    @abstractmethod
+    async def make_description_async(self, card: Card) -> str:
+        """make description for one card"""
+        ...
+
+    @abstractmethod
+    async def choose_card_async(self, description: str, laid_out_cards: list[Card]) -> Card:
+        """look at all cards on the table and choose which one best fits the description"""
+        ...
+
+
+class AbstractBatchChooser(ABC):
+    """Chooses cards for several players with one call, e.g. one model request for the whole voting"""
+
+    @abstractmethod
+    def choose_cards(self, description: str, options: list[tuple[AbstractPlayer, list[Card]]]) -> list[Card | None]:
+        """one card from each player's options, in the same order; None where the player's choice is not known"""
+        ...
+
+    @abstractmethod
+    async def choose_cards_async(self, description: str,
+                                 options: list[tuple[AbstractPlayer, list[Card]]]) -> list[Card | None]:
+        """choose_cards as a coroutine"""
+        ...
@@ -0,0 +1,73 @@
+import io
+import os
+import base64
+import logging
+import threading
+
+from PIL import Image
+
+from abstracts import Card
+
+
+log = logging.getLogger("dixit")
+
+
+class ApiImageCache:
+    """Compact variants of the card images for the API requests; the original files stay for the display.
+    With detail "low" the model only sees the image scaled into max_side x max_side, so the cards are shrunk
+    to that size and re-encoded as JPEG (or WEBP). Each variant is made once, kept in memory and in directory
+    under the card checksum, so later runs only read the small file
+    """
+
+    def __init__(self, directory: str = "api_images", max_side: int = 512, quality: int = 80,
+                 image_format: str = "JPEG") -> None:
+        self.directory = directory
+        self.max_side = max_side
+        self.quality = quality
+        self.image_format = image_format
+        self._urls: dict[tuple[int, str], str] = {}
+
+    def data_url(self, card: Card) -> str:
+        """data URL of the compact variant for the image_url part of a request"""
+        cache_key = (card.key, card.checksum)
+        url = self._urls.get(cache_key)
+        if url is None:
+            encoded = base64.b64encode(self._variant_bytes(card)).decode("utf-8")
+            url = f"data:image/{self.image_format.lower()};base64,{encoded}"
+            self._urls[cache_key] = url
+        return url
+
+    def _file(self, card: Card) -> str:
+        extension = "jpg" if self.image_format == "JPEG" else self.image_format.lower()
+        return os.path.join(self.directory, f"{card.checksum}_{self.max_side}_{self.quality}.{extension}")
+
+    def _variant_bytes(self, card: Card) -> bytes:
+        path = self._file(card)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        with Image.open(io.BytesIO(card.image_bytes)) as original:
+            image = original.convert("RGBA")
+        image.thumbnail((self.max_side, self.max_side))
+        flattened = Image.new("RGB", image.size, (255, 255, 255))  # JPEG has no transparency
+        flattened.paste(image, mask=image.getchannel("A"))
+        buffer = io.BytesIO()
+        flattened.save(buffer, self.image_format, quality=self.quality, optimize=True)
+        data = buffer.getvalue()
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)  # Atomic, other threads and processes never see a half written file
+        except OSError as e:
+            log.info(f"Zmenšený obrázek karty {card.key} se nepodařilo uložit: {e}")
+        return data
+
+
+# One cache for all players of the process
+api_images = ApiImageCache()
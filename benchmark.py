@@ -0,0 +1,330 @@
+"""Reproducible benchmarks of the hot paths; the results are written as JSON, so runs of different commits
+can be compared
+
+    card_loading    CardManager start: without a store, without a manifest, warm
+    process_images  process_images_to_json, process_images_to_pack (full and incremental)
+    debug_turn      one DixitEngine.turn in debug mode, logic only
+    scores          DixitEngine._calculate_scores with 4 to 12 players, vote_matrix.score_turns on 100k turns
+    ui              DixitGame._preview and _update_ui redraws, needs a display (Xvfb is started when available)
+    real_turn       one threaded real turn against fake_openai.py with a fixed latency
+    startup         fresh interpreters importing simulate.py and dixit_game.py and playing one debug game,
+                    checked against STARTUP_BUDGET_MS
+
+usage: python benchmark.py --output benchmark.json
+       python benchmark.py --only scores,debug_turn --compare benchmark.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable
+
+import numpy as np
+
+from abstracts import AbstractCardManager, Card
+from card_features import FEATURES, FeatureIndex
+from card_manager import CardManager
+from dixit_engine import DixitEngine
+from image_importer import process_images_to_json, process_images_to_pack
+from players import Player
+from vote_matrix import TurnBatch, score_turns
+
+
+# Milliseconds a fresh process may spend on top of the bare interpreter; a debug game must not load the modules
+# of HEAVY_MODULES, which are imported only by the runs that need them
+STARTUP_BUDGET_MS = {"import_simulate": 250, "import_dixit_game": 250, "debug_game": 300}
+HEAVY_MODULES = ("openai", "httpx", "numpy", "sk")
+
+PLAYER_NAMES = ["Petr", "Jana", "Josef", "Pavel", "Eva", "Karel", "Anna", "Tomáš", "Lucie", "Martin", "Tereza", "Jakub"]
+
+
+def _stats(samples: list[float]) -> dict[str, Any]:
+    """summary of the measured times in ms"""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "median_ms": round(statistics.median(ordered) * 1000, 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p90_ms": round(ordered[min(len(ordered) - 1, len(ordered) * 9 // 10)] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def _measure(function: Callable[[], Any], repeat: int, setup: Callable[[], Any] | None = None) -> dict[str, Any]:
+    """time repeat calls of function, setup runs before each call and is not timed"""
+    samples: list[float] = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+def named_players(count: int) -> list[Player]:
+    """up to 12 players of different names; debug games never call the model, so any Player will do"""
+    return [Player(PLAYER_NAMES[i], "hráč", 0.5) for i in range(count)]
+
+
+class SyntheticCards(AbstractCardManager):
+    """enough cards for any number of players, without image files; also the deck of the tests"""
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self._load_cards()
+
+    def _load_cards(self) -> None:
+        self.dict_of_cards = {key: Card(key, f"{key}.png", f"{key:032x}", bytes) for key in range(1, self.count + 1)}
+
+    def find_card(self, key: int) -> Card:
+        return self.dict_of_cards[key]
+
+    def features(self) -> FeatureIndex:
+        cards = list(self.dict_of_cards.values())
+        return FeatureIndex([card.checksum for card in cards], np.zeros((len(cards), len(FEATURES))))
+
+
+def bench_card_loading(args: argparse.Namespace) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        store = os.path.join(directory, "cards.pack")
+        manifest = os.path.join(directory, "cards.manifest.json")
+
+        def remove_store() -> None:
+            for path in (store, manifest):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        def remove_manifest() -> None:
+            if os.path.exists(manifest):
+                os.remove(manifest)
+
+        json_store = os.path.join(directory, "cards.json")
+        CardManager(json_store, args.deck)
+        return {
+            "deck": args.deck,
+            "cards": len(os.listdir(args.deck)),
+            "without_store": _measure(lambda: CardManager(store, args.deck), max(1, args.repeat // 10), remove_store),
+            "without_manifest": _measure(lambda: CardManager(store, args.deck), args.repeat, remove_manifest),
+            "warm": _measure(lambda: CardManager(store, args.deck), args.repeat),
+            "warm_json": _measure(lambda: CardManager(json_store, args.deck), args.repeat),
+        }
+
+
+def bench_process_images(args: argparse.Namespace) -> dict[str, Any]:
+    repeat = max(1, args.repeat // 10)
+    with tempfile.TemporaryDirectory() as directory:
+        json_file, pack_file = os.path.join(directory, "cards.json"), os.path.join(directory, "cards.pack")
+        return {
+            "deck": args.deck,
+            "to_json": _measure(lambda: process_images_to_json(args.deck, json_file), repeat),
+            "to_pack_full": _measure(lambda: process_images_to_pack(args.deck, pack_file, incremental=False), repeat),
+            "to_pack_incremental": _measure(lambda: process_images_to_pack(args.deck, pack_file), repeat),
+        }
+
+
+def bench_debug_turn(args: argparse.Namespace) -> dict[str, Any]:
+    manager = CardManager("cards.pack", "card_images")
+    games = [DixitEngine(named_players(4), manager, debug=True, seed=args.seed)]
+
+    def new_game_if_over() -> None:
+        if games[-1].is_over():
+            games.append(DixitEngine(named_players(4), manager, debug=True, seed=args.seed + len(games)))
+
+    # The biggest table with a big deck, a turn must not get slower with the size of the deck
+    big = DixitEngine(named_players(12), SyntheticCards(100_000), debug=True, seed=args.seed, winning_score=10 ** 9)
+    return {"turn": _measure(lambda: games[-1].turn(), args.repeat * 100, new_game_if_over), "games": len(games),
+            "turn_12_players_100k_cards": _measure(big.turn, args.repeat * 100)}
+
+
+def bench_scores(args: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for count in (4, 6, 8, 12):
+        engine = DixitEngine(named_players(count), SyntheticCards(count * 7), debug=True, seed=args.seed)
+        storyteller = engine.players[0]
+        engine.cards_on_table = [(player.cards_on_hand[0], player) for player in engine.players]
+        table = [card for card, _ in engine.cards_on_table]
+        voting = [(player, table[(i * 3) % count]) for i, player in enumerate(engine.players) if player is not storyteller]
+        batch = 1000
+
+        def score_batch() -> None:
+            for _ in range(batch):
+                engine._calculate_scores(voting, storyteller, table[0])
+
+        result = _measure(score_batch, args.repeat)
+        result["per_call_us"] = round(result["median_ms"] * 1000 / batch, 4)
+        results[f"{count}_players"] = result
+
+    # The same kind of turns scored all at once, as for statistics over simulation batches
+    turns = 100_000
+    rng = np.random.default_rng(args.seed)
+    owners = np.argsort(rng.random((turns, 6)), axis=1).astype(np.int32)
+    storytellers = np.zeros(turns, dtype=np.int32)
+    own_slot = np.argsort(owners, axis=1)  # Slot of every player's card
+    votes = (own_slot + rng.integers(1, 6, (turns, 6))) % 6  # Never the voter's own card
+    votes[:, 0] = -1
+    matrix = TurnBatch(np.arange(turns, dtype=np.int32), np.full(turns, 6, dtype=np.int32), storytellers, owners,
+                       votes.astype(np.int32), np.zeros((turns, 6), dtype=np.int32))
+    result = _measure(lambda: score_turns(matrix), args.repeat)
+    result["per_turn_us"] = round(result["median_ms"] * 1000 / turns, 4)
+    results["vectorized_6_players"] = result
+    return results
+
+
+def _start_display() -> subprocess.Popen[bytes] | None:
+    """a virtual display for the UI benchmark when there is none"""
+    if os.environ.get("DISPLAY") or sys.platform == "win32" or not shutil.which("Xvfb"):
+        return None
+    display = ":99"
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0", "1920x1200x24"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(1)
+    return process
+
+
+def bench_ui(args: argparse.Namespace) -> dict[str, Any]:
+    import tkinter as tk
+
+    display = _start_display()
+    try:
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            return {"skipped": f"no display: {e}"}
+        from dixit_game import DixitGame  # Only imported when needed, its window needs a display
+
+        game = DixitGame(named_players(4), root, debug=True)
+        game.engine.rng.seed(args.seed)
+        results = {"preview": _measure(game._preview, args.repeat)}
+        turns = [game.engine.turn() for _ in range(args.repeat)]
+        results["update_ui"] = _measure(lambda: game._update_ui(turns.pop(0)), args.repeat)
+        root.destroy()
+        return results
+    finally:
+        if display is not None:
+            display.terminate()
+
+
+def bench_real_turn(args: argparse.Namespace) -> dict[str, Any]:
+    from fake_openai import FakeApiSettings, start_fake_openai
+    from players import use_base_url
+
+    server = start_fake_openai(FakeApiSettings(port=0, latency="fixed", latency_ms=args.fake_latency_ms, seed=args.seed))
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    use_base_url(server.base_url)
+    try:
+        engine = DixitEngine(named_players(4), CardManager("cards.pack", "card_images"), debug=False, seed=args.seed)
+        engine.turn()  # Warm up the connections and the compact API images
+        result = {"api_latency_ms": args.fake_latency_ms,
+                  "turn": _measure(engine.turn, max(3, args.repeat // 5)),
+                  "server": server.stats()}
+        engine.close()
+        return result
+    finally:
+        server.shutdown()
+
+
+def bench_startup(args: argparse.Namespace) -> dict[str, Any]:
+    commands = {
+        "interpreter": [sys.executable, "-c", "pass"],
+        "import_simulate": [sys.executable, "-c", "import simulate"],
+        "import_dixit_game": [sys.executable, "-c", "import dixit_game"],
+        "debug_game": [sys.executable, "simulate.py", "--games", "1"],
+    }
+    repeat = max(3, args.repeat // 2)
+    results: dict[str, Any] = {name: _measure(partial(subprocess.run, command, check=True, capture_output=True), repeat)
+                               for name, command in commands.items()}
+    interpreter = results["interpreter"]["median_ms"]
+    for name, budget in STARTUP_BUDGET_MS.items():
+        results[name]["budget_ms"] = budget
+        results[name]["within_budget"] = results[name]["median_ms"] - interpreter <= budget
+
+    check = ("import sys; sys.argv = ['simulate.py', '--games', '1']; import simulate; simulate.main(); "
+             f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", check], check=True, capture_output=True, text=True).stdout
+    results["debug_game"]["heavy_modules_loaded"] = [name for name in output.splitlines()[-1].split(",") if name]
+    return results
+
+
+BENCHMARKS: dict[str, Callable[[argparse.Namespace], dict[str, Any]]] = {
+    "card_loading": bench_card_loading,
+    "process_images": bench_process_images,
+    "debug_turn": bench_debug_turn,
+    "scores": bench_scores,
+    "ui": bench_ui,
+    "real_turn": bench_real_turn,
+    "startup": bench_startup,
+}
+
+
+def _environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "time": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> list[str]:
+    """lines with the change of every median present in both runs"""
+    lines: list[str] = []
+
+    def walk(old_part: dict[str, Any], new_part: dict[str, Any], path: str) -> None:
+        for name, value in new_part.items():
+            if isinstance(value, dict) and isinstance(old_part.get(name), dict):
+                if "median_ms" in value and "median_ms" in old_part[name]:
+                    before, after = old_part[name]["median_ms"], value["median_ms"]
+                    ratio = f"{after / before:.2f}x" if before else "-"
+                    lines.append(f"{path}{name}: {before:.4f} ms -> {after:.4f} ms ({ratio})")
+                else:
+                    walk(old_part[name], value, f"{path}{name}.")
+
+    walk(old.get("results", {}), new.get("results", {}), "")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of card loading, turns, scoring and rendering")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=20, help="base number of repetitions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--deck", default="card_images", help="directory of images for card_loading and process_images")
+    parser.add_argument("--fake-latency-ms", type=float, default=100, help="fixed latency of the fake API for real_turn")
+    parser.add_argument("--output", default=None, help="JSON file for the results, default is stdout")
+    parser.add_argument("--compare", default=None, help="JSON of an earlier run to compare the medians with")
+    args = parser.parse_args()
+
+    CardManager("cards.pack", "card_images")  # Make sure the store exists, so its creation is not measured
+    report: dict[str, Any] = {"environment": _environment(), "settings": vars(args), "results": {}}
+    for name in args.only.split(","):
+        if name not in BENCHMARKS:
+            parser.error(f"neznámý benchmark: {name}")
+        print(f"{name}...", file=sys.stderr)
+        report["results"][name] = BENCHMARKS[name](args)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        for line in compare(old, report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Precomputed features of the card pictures and an offline player that plays by them
+
+Every card is reduced to a short vector: how much of the picture is in each of twelve hues, its saturation,
+brightness, contrast and how busy it is. A description is turned into a vector of the same features by a small
+Czech vocabulary (words like "noc", "moře", "oheň" point to dark, blue or red and orange pictures), so choosing
+a card is one dot product of the description with the vectors of the cards on the table; no model and no
+network, a decision takes microseconds and is the same on every run.
+
+The vectors are computed once per picture and kept next to the card store, see CardManager.features().
+
+    index = manager.features()
+    players = [FeaturePlayer(name, index, seed=i) for i, name in enumerate(["Petr", "Jana", "Josef", "Pavel"])]
+"""
+import io
+import logging
+import os
+import re
+from functools import lru_cache
+from random import Random
+
+import numpy as np
+from PIL import Image
+
+from abstracts import AbstractAsyncPlayer, Card
+
+
+log = logging.getLogger("dixit")
+
+FORMAT_VERSION = 1  # Stored with the features, a file of another version is computed again
+HUE_BINS = 12
+FEATURES = ("červená", "oranžová", "žlutá", "žlutozelená", "zelená", "tyrkysová", "azurová", "nebeská", "modrá",
+            "fialová", "purpurová", "růžová", "sytost", "jas", "kontrast", "členitost")
+_SIDE = 64  # The pictures are analysed at this size
+
+# word used in descriptions, stems it is recognised by (Czech words change their endings), the features it means
+VOCABULARY: list[tuple[str, tuple[str, ...], dict[str, float]]] = [
+    ("krev", ("krev", "krv"), {"červená": 1, "jas": -0.3}),
+    ("oheň", ("oheň", "ohn", "plam"), {"červená": 0.6, "oranžová": 1, "jas": 0.4}),
+    ("podzim", ("podzim", "listí"), {"oranžová": 1, "žlutá": 0.5}),
+    ("slunce", ("slun",), {"žlutá": 1, "jas": 0.8}),
+    ("louka", ("louk", "tráv", "jaro", "jarn"), {"žlutozelená": 0.6, "zelená": 1}),
+    ("les", ("les", "strom"), {"zelená": 1, "členitost": 0.6, "jas": -0.3}),
+    ("moře", ("moř", "vln", "oceá"), {"tyrkysová": 0.6, "azurová": 1, "modrá": 0.5}),
+    ("nebe", ("nebe", "nebi", "oblo", "let"), {"nebeská": 1, "azurová": 0.5, "jas": 0.4}),
+    ("voda", ("vod", "řek", "déšť", "dešt"), {"azurová": 0.6, "modrá": 1}),
+    ("noc", ("noc", "tma", "tmy", "temn", "hvězd"), {"modrá": 0.4, "jas": -1}),
+    ("sen", ("sen", "sny", "snů", "snu", "snít", "spán"), {"fialová": 1, "sytost": -0.3}),
+    ("kouzlo", ("kouz", "magi", "čaro"), {"fialová": 0.6, "purpurová": 1}),
+    ("láska", ("lás", "srd", "polib"), {"růžová": 1, "červená": 0.5}),
+    ("světlo", ("světl", "zář", "den", "dne"), {"jas": 1}),
+    ("stín", ("stín", "stin", "tajem"), {"jas": -0.6, "kontrast": 0.6}),
+    ("mlha", ("mlh", "šed", "smut", "stesk"), {"sytost": -1, "kontrast": -0.6}),
+    ("radost", ("rados", "vesel", "pestr", "barev"), {"sytost": 1, "jas": 0.3}),
+    ("chaos", ("chao", "dav", "měst", "zmat"), {"členitost": 1, "kontrast": 0.4}),
+    ("ticho", ("tich", "klid", "prázd", "samot"), {"členitost": -1, "kontrast": -0.4}),
+    ("bouře", ("bouř", "boj", "dram", "strach"), {"kontrast": 1, "jas": -0.3}),
+    ("červená", ("červen", "rud"), {"červená": 1}),
+    ("oranžová", ("oranž",), {"oranžová": 1}),
+    ("žlutá", ("žlut", "zlat"), {"žlutá": 1}),
+    ("zelená", ("zelen",), {"zelená": 1}),
+    ("modrá", ("modr",), {"modrá": 1}),
+    ("fialová", ("fial",), {"fialová": 1}),
+    ("růžová", ("růž",), {"růžová": 1}),
+]
+
+
+def _vector(weights: dict[str, float]) -> np.ndarray:
+    vector = np.zeros(len(FEATURES))
+    for name, weight in weights.items():
+        vector[FEATURES.index(name)] = weight
+    return vector
+
+
+_WORDS = [word for word, _, _ in VOCABULARY]
+_WORD_VECTORS = np.array([_vector(weights) for _, _, weights in VOCABULARY])  # (words, features)
+_STEMS = sorted(((stem, index) for index, (_, stems, _) in enumerate(VOCABULARY) for stem in stems),
+                key=lambda item: -len(item[0]))  # Longest first, "světl" before "svět"
+
+
+def image_features(data: bytes) -> np.ndarray:
+    """feature vector (see FEATURES) of one picture"""
+    with Image.open(io.BytesIO(data)) as original:
+        image = original.convert("RGB")
+    image.thumbnail((_SIDE, _SIDE))
+    hsv = np.asarray(image.convert("HSV"), dtype=np.float64) / 255
+    hue, saturation, value = hsv[..., 0].ravel(), hsv[..., 1].ravel(), hsv[..., 2].ravel()
+    # Bins centred on red (0°), orange (30°) ...; grey and dark pixels carry almost no hue
+    bins = ((hue * HUE_BINS + 0.5).astype(np.int64)) % HUE_BINS
+    hues = np.bincount(bins, weights=saturation * value, minlength=HUE_BINS) / len(hue)
+    grey = np.asarray(image.convert("L"), dtype=np.float64) / 255
+    edges = (np.abs(np.diff(grey, axis=0)).mean() + np.abs(np.diff(grey, axis=1)).mean()) / 2
+    return np.concatenate([hues, [saturation.mean(), value.mean(), value.std(), edges]])
+
+
+@lru_cache(maxsize=1024)
+def description_vector(description: str) -> np.ndarray:
+    """features the words of the description point to, zero when no word is known; read only"""
+    vector = np.zeros(len(FEATURES))
+    for token in re.findall(r"\w+", description.casefold()):
+        for stem, index in _STEMS:
+            if token.startswith(stem):
+                vector += _WORD_VECTORS[index]
+                break
+    vector.setflags(write=False)
+    return vector
+
+
+class FeatureIndex:
+    """Feature vectors of the cards by checksum; vectors() are standardized over the cards of the index,
+    so "dark" means darker than the other cards of the deck"""
+
+    def __init__(self, checksums: list[str], features: np.ndarray) -> None:
+        self.checksums = checksums
+        self.features = features  # (cards, FEATURES) raw values, as image_features computed them
+        self._rows = {checksum: row for row, checksum in enumerate(checksums)}
+        spread = features.std(axis=0) if len(features) else np.ones(len(FEATURES))
+        self._standardized = (features - features.mean(axis=0)) / np.where(spread > 0, spread, 1)
+        # Words of every card from the best fitting to the worst, the descriptions are only looked up
+        fit = self._standardized @ (_WORD_VECTORS / np.linalg.norm(_WORD_VECTORS, axis=1)[:, None]).T
+        self._ranked_words = np.argsort(-fit, axis=1, kind="stable")
+
+    @staticmethod
+    def for_cards(cards: list[Card], path: str) -> "FeatureIndex":
+        """index of the cards; features stored in path are reused, those of new pictures are computed
+        and the file is updated"""
+        stored = _load(path)
+        missing = [card for card in cards if card.checksum not in stored]
+        for card in missing:
+            stored[card.checksum] = image_features(card.image_bytes)
+        if missing:
+            log.info(f"Spočítány rysy {len(missing)} karet, ukládám do '{path}'")
+            _save(path, stored)
+        checksums = list(dict.fromkeys(card.checksum for card in cards))
+        return FeatureIndex(checksums, np.array([stored[checksum] for checksum in checksums]).reshape(-1, len(FEATURES)))
+
+    @staticmethod
+    def merged(indexes: list["FeatureIndex"]) -> "FeatureIndex":
+        """one index of the cards of all indexes, e.g. of combined decks"""
+        rows = {checksum: row for index in indexes for checksum, row in zip(index.checksums, index.features)}
+        return FeatureIndex(list(rows), np.array(list(rows.values())).reshape(-1, len(FEATURES)))
+
+    def vectors(self, cards: list[Card]) -> np.ndarray:
+        """(cards, FEATURES) standardized vectors; raises KeyError for a card not in the index"""
+        vectors: np.ndarray = self._standardized[[self._rows[card.checksum] for card in cards]]
+        return vectors
+
+    def scores(self, description: str, cards: list[Card]) -> np.ndarray:
+        """how well every card fits the description, higher is better"""
+        scores: np.ndarray = self.vectors(cards) @ description_vector(description)
+        return scores
+
+    def describe(self, card: Card, words: int = 2) -> str:
+        """the words of the vocabulary that fit the card best"""
+        return " ".join(_WORDS[index] for index in self._ranked_words[self._rows[card.checksum], :words])
+
+
+def _load(path: str) -> dict[str, np.ndarray]:
+    try:
+        with np.load(path) as data:
+            if int(data["version"]) != FORMAT_VERSION or data["features"].shape[1:] != (len(FEATURES),):
+                return {}
+            return dict(zip(data["checksums"].tolist(), data["features"]))
+    except (OSError, KeyError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            log.info(f"Rysy karet '{path}' nelze načíst, počítám znovu: {e}")
+        return {}
+
+
+def _save(path: str, features: dict[str, np.ndarray]) -> None:
+    try:
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, version=FORMAT_VERSION, checksums=np.array(list(features)),
+                 features=np.array(list(features.values())).reshape(-1, len(FEATURES)))
+        os.replace(temporary, path)
+    except OSError as e:
+        log.info(f"Rysy karet se nepodařilo uložit do '{path}': {e}")
+
+
+class FeaturePlayer(AbstractAsyncPlayer):
+    """Offline player choosing by the feature index; describes a card by the vocabulary words that fit it best
+    and chooses the card whose features fit the description best. Ties, and descriptions without any known word
+    (e.g. from a model player), are decided by a Random of its own, so a game with the same seeds is always the same;
+    fewer words make vaguer descriptions"""
+
+    def __init__(self, name: str, index: FeatureIndex, words: int = 2, seed: int = 0) -> None:
+        self.name = name
+        self.index = index
+        self.words = words
+        self.rng = Random(seed)
+        self.cards_on_hand: list[Card] = []
+        self.score = 0
+
+    def take_card(self, card: Card) -> None:
+        self.cards_on_hand.append(card)
+
+    def make_description(self, card: Card) -> str:
+        return self.index.describe(card, self.words)
+
+    def choose_card(self, description: str, laid_out_cards: list[Card]) -> Card:
+        scores = self.index.scores(description, laid_out_cards)
+        best = np.flatnonzero(scores >= scores.max() - 1e-9)
+        return laid_out_cards[int(best[0]) if len(best) == 1 else self.rng.choice(best.tolist())]
+
+    def score_add(self, number: int) -> None:
+        self.score += number
+
+    async def make_description_async(self, card: Card) -> str:
+        return self.make_description(card)
+
+    async def choose_card_async(self, description: str, laid_out_cards: list[Card]) -> Card:
+        return self.choose_card(description, laid_out_cards)
@@ -0,0 +1,222 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable
+
+from abstracts import AbstractCardManager, Card
+from card_pack import CardPack
+from image_importer import process_images_to_json, process_images_to_pack
+
+if TYPE_CHECKING:
+    from card_features import FeatureIndex
+
+
+log = logging.getLogger("dixit")
+
+_FAILED: list[Any] = []  # Manifest entry of a file whose deferred check failed
+
+
+class CardManager(AbstractCardManager):
+    """An object, which keeps track of all the cards;
+    by default loads all images and makes Card instances out of them.
+
+    The cards are stored in a binary card pack (*.pack, memory mapped, pictures are read only on demand)
+    or in the older json with base64 pictures (*.json).
+    Files whose size and modification time match the manifest (or the index of the pack) are not hashed again;
+    when the images change, the pack is updated incrementally, only added and changed files are hashed;
+    verify="background" checks their checksums on a background thread, verify="full" hashes every file at startup,
+    verify="deferred" hashes nothing at startup: files whose size or time changed since the manifest are checked
+    on a background thread, mismatches are reported in verification_errors and the next start imports them again
+    """
+
+    def __init__(self, store_file: str, input_directory: str, verify: str = "manifest") -> None:
+        self.dict_of_cards: dict[int, Card] = {}
+        self.store_file = store_file
+        self.input_directory = input_directory
+        self.manifest_file = os.path.splitext(store_file)[0] + ".manifest.json"
+        self.features_file = os.path.splitext(store_file)[0] + ".features.npz"
+        self.verify = verify
+        self.verification_errors: list[str] = []  # Filled by the background verification
+        self._pack: CardPack | None = None
+        self._features: "FeatureIndex | None" = None
+        self._load_cards()
+
+    def _load_cards(self) -> None:
+        """Loads all the cards from the card store into dict"""
+        try:
+            records = self._read_store()
+
+            # Check if the number of cards in the store matches the number of files in the directory
+            stats = {entry.path: entry.stat() for entry in os.scandir(self.input_directory) if entry.is_file()}
+            if len(records) != len(stats):
+                raise ValueError(f"Počet obrázků nesedí. V úložišti ({len(records)}) a ve složce ({len(stats)}).")
+
+            # Verify checksums and file existence, files unchanged since the last start are trusted
+            manifest = self._read_manifest()
+            new_manifest: dict[str, list[Any]] = {}
+            cards: dict[int, Card] = {}
+            unverified: list[tuple[Card, list[Any]]] = []
+            for key, path, checksum, loader, imported in records:
+                stat = stats.get(path)
+                if stat is None:
+                    raise FileNotFoundError(f"Soubor '{path}' neexistuje!")
+
+                fingerprint = [stat.st_size, stat.st_mtime_ns, checksum]
+                cards[key] = Card(key, path, checksum, loader)
+                if self.verify == "full" or fingerprint not in (manifest.get(path), imported):
+                    if self.verify == "deferred" and manifest.get(path) != _FAILED:
+                        unverified.append((cards[key], fingerprint))  # Goes to the manifest once it is checked
+                        continue
+                    if _file_checksum(path) != checksum:
+                        raise ValueError(f"Checksum verifikace selhala u karty s klíčem {key}")
+                new_manifest[path] = fingerprint
+
+            self.dict_of_cards = cards
+            if new_manifest != manifest and not unverified:
+                self._write_manifest(new_manifest)
+            log.info(f"Karty byly úspěšně načteny '{self.store_file}'.")
+            if self.verify == "background":
+                threading.Thread(target=self._verify_all, daemon=True).start()
+            elif unverified:
+                threading.Thread(target=self._verify_changed, args=(unverified, new_manifest), daemon=True).start()
+
+        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+            log.info(f"Chyba se souborem '{self.store_file}': {e}. Regeneruji...")
+            self._close_pack()
+            if self.store_file.endswith(".json"):
+                process_images_to_json(self.input_directory, self.store_file)
+            else:
+                report = process_images_to_pack(self.input_directory, self.store_file)
+                log.info(f"Balíček karet aktualizován: {report.added} nových, {report.changed} změněných, "
+                         f"{report.removed} odebraných, {report.unchanged} beze změny")
+            self._load_cards()  # Retry loading after regeneration
+
+    def _read_store(self) -> list[tuple[int, str, str, Callable[[], bytes], list[Any] | None]]:
+        """key, path, checksum, a loader of the picture and the fingerprint the importer hashed (packs only)
+        for every card in the store"""
+        if not self.store_file.endswith(".json"):
+            self._close_pack()
+            self._pack = CardPack(self.store_file)  # Only the index is read here
+            return [(entry.key, entry.path, entry.checksum, partial(self._pack.image_bytes, entry.key),
+                     [entry.length, entry.mtime_ns, entry.checksum])
+                    for entry in self._pack.entries.values()]
+
+        with open(self.store_file, "r", encoding="utf-8") as f:
+            data:list[Any] = json.load(f)
+        # Validate contents
+        if not isinstance(data, list) or not all(
+                'key' in item and 'path' in item and 'checksum' in item and 'encoded_picture' in item for item in
+                data):
+            raise ValueError(f"obsah JSONu {self.store_file} je chybný")
+        return [(item['key'], item['path'], item['checksum'], partial(base64.b64decode, item['encoded_picture']),
+                 None) for item in data]
+
+    def _close_pack(self) -> None:
+        # The old mapping has to be closed before the pack file is replaced (Windows cannot replace a mapped file)
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+
+    def _read_manifest(self) -> dict[str, list[Any]]:
+        """path -> [size, mtime in ns, checksum] of every file, as it was when it was last verified"""
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            return manifest if isinstance(manifest, dict) else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, manifest: dict[str, list[Any]]) -> None:
+        try:
+            temporary = self.manifest_file + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(temporary, self.manifest_file)
+        except OSError as e:
+            log.info(f"Manifest '{self.manifest_file}' se nepodařilo uložit: {e}")
+
+    def _verify_all(self) -> None:
+        # Runs on a background thread, the game may already be running; mismatches are only reported
+        for card in list(self.dict_of_cards.values()):
+            try:
+                if _file_checksum(card.path) != card.checksum:
+                    self.verification_errors.append(f"Checksum verifikace selhala u karty s klíčem {card.key}")
+            except OSError as e:
+                self.verification_errors.append(f"Soubor '{card.path}' nelze přečíst: {e}")
+        for error in self.verification_errors:
+            log.warning(error)
+        if self.verification_errors:
+            self._write_manifest({})  # Force a full check on the next start
+
+    def _verify_changed(self, unverified: list[tuple[Card, list[Any]]], manifest: dict[str, list[Any]]) -> None:
+        # Runs on a background thread for verify="deferred"; only the files that match go to the manifest
+        for card, fingerprint in unverified:
+            try:
+                if _file_checksum(card.path) == card.checksum:
+                    manifest[card.path] = fingerprint
+                else:
+                    manifest[card.path] = _FAILED  # The next start checks it before loading and imports it again
+                    self.verification_errors.append(f"Checksum verifikace selhala u karty s klíčem {card.key}")
+            except OSError as e:
+                self.verification_errors.append(f"Soubor '{card.path}' nelze přečíst: {e}")
+        for error in self.verification_errors:
+            log.warning(error)
+        self._write_manifest(manifest)
+        log.info(f"Dodatečně ověřeno {len(unverified)} karet, chyb: {len(self.verification_errors)}")
+
+    def find_card(self, key: int) -> Card:
+        """find a card by key"""
+        return self.dict_of_cards[key]
+
+    def features(self) -> "FeatureIndex":
+        """feature index of the cards for FeaturePlayer, kept next to the store (*.features.npz);
+        only the pictures not in the file yet are analysed, on the first call"""
+        if self._features is None:
+            from card_features import FeatureIndex  # NumPy only for the games that use it
+            self._features = FeatureIndex.for_cards(list(self.dict_of_cards.values()), self.features_file)
+        return self._features
+
+
+class CombinedCardManager(AbstractCardManager):
+    """Several decks played as one, e.g. for tables of more than six players; the cards of the first deck keep
+    their keys, those of every further deck are shifted past the highest key of the decks before it, so the keys stay
+    unique and the same from run to run. The same deck can be added more than once, its copies are different cards"""
+
+    def __init__(self, managers: list[CardManager]) -> None:
+        self.managers = managers
+        self.dict_of_cards: dict[int, Card] = {}
+        self._features: "FeatureIndex | None" = None
+        self._load_cards()
+
+    def _load_cards(self) -> None:
+        offset = 0
+        for manager in self.managers:
+            for key, card in manager.dict_of_cards.items():
+                self.dict_of_cards[offset + key] = Card(offset + key, card.path, card.checksum,
+                                                        partial(_image_bytes, card))
+            offset += max(manager.dict_of_cards, default=0) + 1
+        log.info(f"Spojeno {len(self.managers)} balíčků, celkem {len(self.dict_of_cards)} karet")
+
+    def find_card(self, key: int) -> Card:
+        return self.dict_of_cards[key]
+
+    def features(self) -> "FeatureIndex":
+        """feature index of all decks, from the indexes the decks keep next to their stores"""
+        if self._features is None:
+            from card_features import FeatureIndex
+            self._features = FeatureIndex.merged([manager.features() for manager in self.managers])
+        return self._features
+
+
+def _image_bytes(card: Card) -> bytes:
+    return card.image_bytes
+
+
+def _file_checksum(path: str) -> str:
+    """MD5 of the base64 encoded file, the same checksum as process_images_to_json computes"""
+    with open(path, "rb") as _f:
+        return hashlib.md5(base64.b64encode(_f.read())).hexdigest()
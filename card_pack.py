@@ -0,0 +1,110 @@
+"""Binary card store: a small index followed by the raw image files
+
+layout (little endian):
+    header  b"DIXPACK2", number of cards (uint32), size of the index in bytes (uint32)
+    index   per card: key (int64), offset (uint64), length (uint64), modification time of the source file in ns (int64),
+            MD5 checksum (16 B), path length (uint16), path (UTF-8)
+    data    image bytes of all cards; offsets are counted from the start of the file
+
+Opening a pack reads only the header and the index, the image bytes are mapped with mmap
+and copied out only when a card's picture is really needed.
+"""
+import os
+import mmap
+import struct
+from typing import Callable, Iterable, NamedTuple
+
+
+MAGIC = b"DIXPACK2"
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<qQQq16sH")
+
+
+class PackEntry(NamedTuple):
+    key: int
+    path: str
+    checksum: str  # hex MD5 of the base64 encoded image, as in Card.checksum
+    offset: int
+    length: int
+    mtime_ns: int  # of the source file when it was imported
+
+
+class PackSource(NamedTuple):
+    """one card to be written; read is called only while the pack is being written"""
+    key: int
+    path: str
+    checksum: str
+    mtime_ns: int
+    length: int
+    read: Callable[[], bytes]
+
+
+class CardPack:
+    """Read-only, memory mapped card pack"""
+
+    def __init__(self, pack_file: str) -> None:
+        self.pack_file = pack_file
+        with open(pack_file, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.entries = self._read_index()
+        except (struct.error, UnicodeDecodeError) as e:
+            self.close()
+            raise ValueError(f"balíček karet {pack_file} je poškozený: {e}") from e
+
+    def _read_index(self) -> dict[int, PackEntry]:
+        magic, count, index_size = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"soubor {self.pack_file} není balíček karet")
+        entries: dict[int, PackEntry] = {}
+        position = _HEADER.size
+        for _ in range(count):
+            key, offset, length, mtime_ns, digest, path_length = _ENTRY.unpack_from(self._map, position)
+            position += _ENTRY.size
+            path = self._map[position:position + path_length].decode("utf-8")
+            position += path_length
+            if offset + length > len(self._map):
+                raise ValueError(f"karta s klíčem {key} leží mimo soubor {self.pack_file}")
+            entries[key] = PackEntry(key, path, digest.hex(), offset, length, mtime_ns)
+        if position != _HEADER.size + index_size:
+            raise ValueError(f"index balíčku {self.pack_file} má špatnou délku")
+        return entries
+
+    def image_bytes(self, key: int) -> bytes:
+        """raw image file of the card, copied out of the mapped file"""
+        entry = self.entries[key]
+        return self._map[entry.offset:entry.offset + entry.length]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def write_card_pack(pack_file: str, cards: Iterable[PackSource], before_replace: Callable[[], None] | None = None) -> None:
+    """write all cards into a temporary file, which then atomically replaces pack_file;
+    before_replace is called after all the data was read, e.g. to close the old pack that is being replaced
+    """
+    cards = list(cards)
+    index = bytearray()
+    paths = [card.path.encode("utf-8") for card in cards]
+    index_size = sum(_ENTRY.size + len(path) for path in paths)
+    offset = _HEADER.size + index_size
+    for card, path in zip(cards, paths):
+        index += _ENTRY.pack(card.key, offset, card.length, card.mtime_ns, bytes.fromhex(card.checksum), len(path)) + path
+        offset += card.length
+
+    temporary = f"{pack_file}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(cards), index_size))
+            f.write(index)
+            for card in cards:
+                data = card.read()
+                if len(data) != card.length:
+                    raise ValueError(f"karta s klíčem {card.key} se změnila během zápisu")
+                f.write(data)
+        if before_replace is not None:
+            before_replace()
+        os.replace(temporary, pack_file)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
@@ -0,0 +1,594 @@
+from random import Random
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable, NamedTuple, Sequence, TypeVar
+from abstracts import AbstractAsyncPlayer, AbstractBatchChooser, AbstractCardManager, AbstractPlayer, Card
+from metrics import metrics
+from worker_pool import WorkerPool
+import asyncio
+import logging
+import threading
+import time
+
+
+log = logging.getLogger("dixit")
+
+T = TypeVar("T")
+
+# Phases of a turn, reported to GameObserver.player_finished
+PHASE_DESCRIPTION = "description"
+PHASE_PLACEMENT = "placement"
+PHASE_VOTING = "voting"
+
+PHASE_METRIC = "dixit_phase_seconds"  # Durations of the phases of real turns, labelled by phase (and "scoring")
+
+FALLBACK_DESCRIPTION = "Neumím vymyslet popis"  # When the storyteller's call fails or misses its deadline
+
+MIN_PLAYERS = 3
+MAX_PLAYERS = 12
+
+
+@dataclass
+class TurnResult:
+    """snapshot of one finished turn; everything a view needs to draw it"""
+    round_number: int
+    storyteller: AbstractPlayer
+    storyteller_card: Card
+    description: str
+    cards_on_table: list[tuple[Card, AbstractPlayer]]
+    voting: list[tuple[AbstractPlayer, Card]]
+    hands: list[list[Card]]  # hands before the played cards were removed, same order as players
+
+
+class _Speculation(NamedTuple):
+    """work started in the background for the next turn, valid only while the state it was based on holds"""
+    turns_played: int
+    storyteller: AbstractPlayer
+    card: Card
+    description: Future[str]
+    choices: dict[AbstractPlayer, tuple[tuple[Card, ...], Future[tuple[str, Card]]]]  # hand it was based on, result
+
+
+class GameObserver:
+    """Gets notified by DixitEngine about the game progress; override only what you need.
+    In real games the notifications come from the threads doing the API calls
+    """
+
+    def player_finished(self, player: AbstractPlayer, phase: str) -> None:
+        """called whenever a player has finished its part of a phase (PHASE_* constants)"""
+        ...
+
+    def turn_finished(self, result: TurnResult) -> None:
+        """called after scoring, before the played cards leave the players' hands"""
+        ...
+
+
+class DixitEngine:
+    """Game logic of Dixit without any UI; set debug=True to simulate without any API calls,
+    pass seed to make the shuffling and the simulated decisions reproducible.
+    With speculate=True a real turn ends by starting the next storyteller's description and the other players'
+    card choices in the background, so the next turn() (e.g. after the user looked at the result) mostly only waits
+    for the voting; results whose hand or description no longer match are thrown away.
+    Every phase of a real turn waits at most call_deadline seconds for the players' calls, a player whose call
+    failed or was late plays a random legal card (from the seeded rng), so a turn takes at most three deadlines.
+    With a batch chooser all players of the placement and of the voting are asked in one call per phase; only the
+    players it gave no valid card for are then asked one by one, within the same deadline. In this mode only the
+    description is speculated, the placement is one call anyway.
+    3 to 12 players can play, the deck needs at least six cards per player (CombinedCardManager joins several decks);
+    the deck is a deque, drawing a card costs the same for any size of the deck
+    """
+
+    def __init__(self, players: Sequence[AbstractPlayer], manager: AbstractCardManager, debug: bool = False,
+                 seed: int | None = None, winning_score: int = 30, speculate: bool = False,
+                 call_deadline: float = 60.0, pool: WorkerPool | None = None,
+                 batch: AbstractBatchChooser | None = None) -> None:
+        self.debug = debug
+        self.batch = batch
+        self.speculate = speculate
+        self.call_deadline = call_deadline
+        self._pool = pool
+        self._owns_pool = pool is None  # A pool passed in belongs to the caller, close() leaves it running
+        if not MIN_PLAYERS <= len(players) <= MAX_PLAYERS:
+            raise ValueError(f"Hrát může {MIN_PLAYERS} až {MAX_PLAYERS} hráčů, ne {len(players)}")
+        # Batch answers, the event log and recordings tell the players apart by name
+        names = [player.name for player in players]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Jména hráčů se nesmí opakovat: {', '.join(duplicates)}")
+        self.rng = Random(seed)
+        self.winning_score = winning_score
+        self.number_of_players = len(players)
+        self.players: list[AbstractPlayer] = list(players)
+        self.cards_in_deck: deque[Card] = deque()
+        self.discard_pile: list[Card] = []
+        self.cards_on_table: list[tuple[Card, AbstractPlayer]] = []
+        # The turn changes the table, views and late calls on other threads read it through table()
+        self._table_lock = threading.Lock()
+        self.number_of_cards_per_player: int = 6
+        self.round_number: int = 1
+        self.index_storyteller: int = 0
+        self.turns_played: int = 0
+        self.manager = manager
+        self.observers: list[GameObserver] = []
+        self._speculation: _Speculation | None = None
+        self._speculation_executor: ThreadPoolExecutor | None = None
+        self._shuffle_cards()
+        self._hand_out_cards()
+
+    def add_observer(self, observer: GameObserver) -> None:
+        self.observers.append(observer)
+
+    def table(self) -> list[tuple[Card, AbstractPlayer]]:
+        """copy of the cards on the table and their owners, safe to call from any thread"""
+        with self._table_lock:
+            return list(self.cards_on_table)
+
+    def _put_on_table(self, card: Card, player: AbstractPlayer) -> None:
+        with self._table_lock:
+            self.cards_on_table.append((card, player))
+
+    def _shuffle_table(self) -> None:
+        with self._table_lock:
+            self.rng.shuffle(self.cards_on_table)
+
+    def _notify_player_finished(self, player: AbstractPlayer, phase: str) -> None:
+        for observer in self.observers:
+            observer.player_finished(player, phase)
+
+    def is_over(self) -> bool:
+        return max(player.score for player in self.players) >= self.winning_score
+
+    def winners(self) -> list[AbstractPlayer]:
+        max_score = max(player.score for player in self.players)
+        return [player for player in self.players if player.score == max_score]
+
+    def play_game(self, max_turns: int = 1000) -> list[AbstractPlayer]:
+        """play turns until someone reaches the winning score, returns the winners"""
+        for _ in range(max_turns):
+            if self.is_over():
+                break
+            self.turn()
+        return self.winners()
+
+    async def play_game_async(self, max_turns: int = 1000) -> list[AbstractPlayer]:
+        """play_game on the running event loop, see turn_async"""
+        for _ in range(max_turns):
+            if self.is_over():
+                break
+            await self.turn_async()
+        return self.winners()
+
+    def turn(self) -> TurnResult:
+        """Perform one turn where the current storyteller describes a card and others guess"""
+        storyteller, storyteller_card = self._start_turn()
+        description: str
+        voting: list[tuple[AbstractPlayer, Card]] = []
+
+        if self.debug:
+            # Simulate turn in debug mode
+            description = "Sample popis dlouhý bla bla bla"
+            self._notify_player_finished(storyteller, PHASE_DESCRIPTION)
+            log.info("Vypraveč: %s", storyteller.name)
+            log.info("Vybraná karta: %s, Popis: %s", storyteller_card.key, description)
+            self._simulated_game_turn(storyteller, storyteller_card, description, voting)
+
+        else:
+            # Normal game flow with threads
+            with metrics.time(PHASE_METRIC, phase=PHASE_DESCRIPTION):
+                speculated = self._speculated_description(storyteller, storyteller_card)
+                description = speculated if speculated is not None else self.worker_pool().call(
+                    partial(storyteller.make_description, storyteller_card), lambda: FALLBACK_DESCRIPTION,
+                    self.call_deadline)
+            self._notify_player_finished(storyteller, PHASE_DESCRIPTION)
+            log.info("Vypraveč: %s", storyteller.name)
+            log.info("Vybraná karta: %s, Popis: %s", storyteller_card.key, description)
+            self._real_game_turn(storyteller, storyteller_card, description, voting)
+
+        result = self._finish_turn(storyteller, storyteller_card, description, voting)
+        if not self.debug and self.speculate:
+            self._start_speculation()
+        return result
+
+    def worker_pool(self) -> WorkerPool:
+        """pool for the players' calls in real turns, created on first use"""
+        if self._pool is None:
+            self._pool = WorkerPool(max_workers=2 * len(self.players), deadline=self.call_deadline)
+        return self._pool
+
+    def close(self) -> None:
+        """stop the threads of the pools the engine created (for the calls and the speculation), after the game;
+        calls still running finish, nobody waits for them"""
+        self.cancel_speculation()
+        if self._speculation_executor is not None:
+            self._speculation_executor.shutdown(wait=False, cancel_futures=True)
+            self._speculation_executor = None
+        if self._pool is not None and self._owns_pool:
+            self._pool.shutdown()
+            self._pool = None
+
+    def cancel_speculation(self) -> None:
+        """throw away the background work for the next turn; calls already running finish, their results are ignored"""
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            speculation.description.cancel()
+            for _, future in speculation.choices.values():
+                future.cancel()
+
+    def _start_speculation(self) -> None:
+        self.cancel_speculation()
+        if self.is_over():
+            return
+        if self._speculation_executor is None:
+            self._speculation_executor = ThreadPoolExecutor(max_workers=len(self.players),
+                                                            thread_name_prefix="speculation")
+        storyteller = self.players[self.index_storyteller]
+        card = storyteller.cards_on_hand[0]
+        description = self._speculation_executor.submit(storyteller.make_description, card)
+        choices: dict[AbstractPlayer, tuple[tuple[Card, ...], Future[tuple[str, Card]]]] = {}
+        for player in self.players:
+            if player is not storyteller and self.batch is None:
+                hand = list(player.cards_on_hand)
+                choices[player] = (tuple(hand), self._speculation_executor.submit(
+                    self._speculative_choice, player, description, hand))
+        self._speculation = _Speculation(self.turns_played, storyteller, card, description, choices)
+
+    @staticmethod
+    def _speculative_choice(player: AbstractPlayer, description: Future[str], hand: list[Card]) -> tuple[str, Card]:
+        # Waits on a pool thread for the speculated description; the pool has a thread for every player
+        speculated = description.result()
+        return speculated, player.choose_card(speculated, hand)
+
+    def _speculated_description(self, storyteller: AbstractPlayer, card: Card) -> str | None:
+        """the description started at the end of the last turn, if it was made for this storyteller and card"""
+        speculation = self._speculation
+        if speculation is None:
+            return None
+        if speculation.turns_played != self.turns_played or speculation.storyteller is not storyteller \
+                or speculation.card != card:
+            metrics.inc("dixit_speculation_total", part=PHASE_DESCRIPTION, result="stale")
+            self.cancel_speculation()
+            return None
+        try:
+            description = speculation.description.result(timeout=self.call_deadline)
+        except TimeoutError:
+            log.warning("Předem počítaný popis nestihl termín, použije se náhradní popis")
+            metrics.inc("dixit_speculation_total", part=PHASE_DESCRIPTION, result="late")
+            self.cancel_speculation()
+            return FALLBACK_DESCRIPTION
+        except Exception:
+            log.exception("Předem počítaný popis selhal, počítá se znovu")
+            metrics.inc("dixit_speculation_total", part=PHASE_DESCRIPTION, result="failed")
+            self.cancel_speculation()
+            return None
+        metrics.inc("dixit_speculation_total", part=PHASE_DESCRIPTION, result="used")
+        return description
+
+    def _speculated_choice(self, player: AbstractPlayer, description: str, current_hand: list[Card]) -> Card | None:
+        """the card the player chose in the background, if it was for this description and the same hand"""
+        speculation = self._speculation
+        entry = speculation.choices.get(player) if speculation is not None else None
+        if entry is None:
+            return None
+        hand, future = entry
+        if hand != tuple(current_hand):
+            future.cancel()
+            metrics.inc("dixit_speculation_total", part=PHASE_PLACEMENT, result="stale")
+            return None
+        try:
+            speculated_description, card = future.result()
+        except Exception:
+            log.exception("Předem počítaná volba karty hráče %s selhala, počítá se znovu", player.name)
+            metrics.inc("dixit_speculation_total", part=PHASE_PLACEMENT, result="failed")
+            return None
+        if speculated_description != description:
+            metrics.inc("dixit_speculation_total", part=PHASE_PLACEMENT, result="stale")
+            return None
+        metrics.inc("dixit_speculation_total", part=PHASE_PLACEMENT, result="used")
+        return card
+
+    async def turn_async(self) -> TurnResult:
+        """Same as turn, but the API calls of each phase run as coroutines on the running event loop instead of
+        threads, so many games can share one loop and one connection pool; players must be AbstractAsyncPlayer
+        """
+        if self.debug:
+            return self.turn()
+        storyteller, storyteller_card = self._start_turn()
+        voting: list[tuple[AbstractPlayer, Card]] = []
+
+        with metrics.time(PHASE_METRIC, phase=PHASE_DESCRIPTION):
+            description = await self._with_deadline(
+                self._async_player(storyteller).make_description_async(storyteller_card), lambda: FALLBACK_DESCRIPTION)
+        self._notify_player_finished(storyteller, PHASE_DESCRIPTION)
+        log.info("Vypraveč: %s", storyteller.name)
+        log.info("Vybraná karta: %s, Popis: %s", storyteller_card.key, description)
+
+        others = [player for player in self.players if player is not storyteller]
+        with metrics.time(PHASE_METRIC, phase=PHASE_PLACEMENT):
+            batched = await self._batch_async(PHASE_PLACEMENT, description, others,
+                                              [list(player.cards_on_hand) for player in others])
+            await asyncio.gather(*(self._choose_card_async(player, description, card)
+                                   for player, card in zip(others, batched)))
+        self._shuffle_table()
+        with metrics.time(PHASE_METRIC, phase=PHASE_VOTING):
+            table = self.table()
+            batched = await self._batch_async(PHASE_VOTING, description, others,
+                                              [[card for card, owner in table if owner is not player]
+                                               for player in others])
+            await asyncio.gather(*(self._vote_async(player, description, voting, card)
+                                   for player, card in zip(others, batched)))
+        with metrics.time(PHASE_METRIC, phase="scoring"):
+            self._calculate_scores(voting, storyteller, storyteller_card)
+
+        return self._finish_turn(storyteller, storyteller_card, description, voting)
+
+    def _start_turn(self) -> tuple[AbstractPlayer, Card]:
+        log.info('Hraje se kolo číslo %s', self.round_number)
+        storyteller: AbstractPlayer = self.players[self.index_storyteller]
+        storyteller_card: Card = storyteller.cards_on_hand[0]  # storyteller chooses a card
+        self._put_on_table(storyteller_card, storyteller)
+        return storyteller, storyteller_card
+
+    def _finish_turn(self, storyteller: AbstractPlayer, storyteller_card: Card, description: str,
+                     voting: list[tuple[AbstractPlayer, Card]]) -> TurnResult:
+        result = TurnResult(self.round_number, storyteller, storyteller_card, description, self.table(),
+                            voting, [list(player.cards_on_hand) for player in self.players])
+        try:
+            for observer in self.observers:
+                observer.turn_finished(result)
+        finally:
+            # The turn is scored, it is finished even when an observer failed: remove cards from players' hands,
+            # clear cards on the table and give a new card to the players
+            self._prepare_next_round()
+            self._next_storyteller()
+            self.turns_played += 1
+        return result
+
+    def abandon_turn(self) -> None:
+        """clear the table after a turn that failed before scoring; the hands are changed only when a turn finishes,
+        so the same storyteller can play the turn again"""
+        with self._table_lock:
+            self.cards_on_table.clear()
+
+    def _next_storyteller(self) -> None:
+        self.index_storyteller += 1
+        if self.index_storyteller >= len(self.players):  # Everybody was the storyteller once,
+            self.index_storyteller = 0  # reset it and increase the round number
+            self.round_number += 1
+
+    def _simulated_game_turn(self, storyteller: AbstractPlayer, storyteller_card: Card, description: str,
+                             voting: list[tuple[AbstractPlayer, Card]]) -> None:
+        for player in self.players:
+            if player is not storyteller:
+                chosen_card = self.rng.choice(player.cards_on_hand)
+                log.info("Hrac %s vybral k popisu %s kartu: %s a vylozil ji na stul",
+                         player.name, description, chosen_card.key)
+                self._put_on_table(chosen_card, player)
+                self._notify_player_finished(player, PHASE_PLACEMENT)
+
+        self._shuffle_table()
+
+        # Simulate voting
+        table = self.table()
+        for player in self.players:
+            if player is not storyteller:
+                list_without_players_card = [card for card in table if card[1] is not player]
+                chosen_card = self.rng.choice(list_without_players_card)[0]
+                log.info("Hrac %s hlasoval pro kartu: %s", player.name, chosen_card.key)
+                voting.append((player, chosen_card))
+                self._notify_player_finished(player, PHASE_VOTING)
+
+        self._calculate_scores(voting, storyteller, storyteller_card)
+
+    def _real_game_turn(self, storyteller: AbstractPlayer, storyteller_card: Card, description: str,
+                        voting: list[tuple[AbstractPlayer, Card]]) -> None:
+        # The calls run on the worker pool, the results are put on the table here, in seating order
+        others = [player for player in self.players if player is not storyteller]
+        # Calls that missed the deadline may still run during the next turn, so they get copies of the hands
+        hands = [list(player.cards_on_hand) for player in others]
+        with metrics.time(PHASE_METRIC, phase=PHASE_PLACEMENT):
+            placed = self._call_all(
+                PHASE_PLACEMENT, description, others, hands,
+                [partial(self._choose_card_call, player, description, hand) for player, hand in zip(others, hands)],
+                [partial(self._fallback_card, player, PHASE_PLACEMENT, hand) for player, hand in zip(others, hands)])
+        self._speculation = None  # Everything speculated was used up or thrown away
+        for player, chosen_card in zip(others, placed):
+            self._put_on_table(chosen_card, player)
+            log.info("Hráč %s vybral k popisu %s kartu: %s a vyložil ji na stůl", player.name, description, chosen_card.key)
+
+        self._shuffle_table()
+
+        # Players except storyteller vote
+        with metrics.time(PHASE_METRIC, phase=PHASE_VOTING):
+            table = self.table()
+            choices = [[card for card, owner in table if owner is not player] for player in others]
+            votes = self._call_all(
+                PHASE_VOTING, description, others, choices,
+                [partial(self._vote_call, player, description, cards) for player, cards in zip(others, choices)],
+                [partial(self._fallback_card, player, PHASE_VOTING, cards) for player, cards in zip(others, choices)])
+        for player, chosen_card in zip(others, votes):
+            voting.append((player, chosen_card))
+            log.info("Hráč %s hlasoval pro kartu: %s", player.name, chosen_card.key)
+
+        with metrics.time(PHASE_METRIC, phase="scoring"):
+            self._calculate_scores(voting, storyteller, storyteller_card)
+
+    def _call_all(self, phase: str, description: str, players: list[AbstractPlayer], options: list[list[Card]],
+                  calls: list[Callable[[], Card]], fallbacks: list[Callable[[], Card]]) -> list[Card]:
+        """the players' cards of one phase, first from the batch chooser if there is one, the players it did not
+        answer for with their own calls; all within one call_deadline"""
+        end = time.monotonic() + self.call_deadline
+        chosen: list[Card | None] = [None] * len(players)
+        if self.batch is not None:
+            chosen = self.worker_pool().call(partial(self._batch_call, self.batch, phase, description, players, options),
+                                             lambda: [None] * len(players), self.call_deadline)
+        missing = [i for i, card in enumerate(chosen) if card is None]
+        if missing:
+            rest = self.worker_pool().call_all([calls[i] for i in missing], [fallbacks[i] for i in missing],
+                                               max(0.0, end - time.monotonic()))
+            for i, card in zip(missing, rest):
+                chosen[i] = card
+        return [card for card in chosen if card is not None]
+
+    def _batch_call(self, batch: AbstractBatchChooser, phase: str, description: str, players: list[AbstractPlayer],
+                    options: list[list[Card]]) -> list[Card | None]:
+        # Runs on the worker pool; a card the player may not choose counts as no answer
+        chosen = batch.choose_cards(description, list(zip(players, options)))
+        return self._checked_batch(phase, players, options, chosen)
+
+    def _checked_batch(self, phase: str, players: list[AbstractPlayer], options: list[list[Card]],
+                       chosen: list[Card | None]) -> list[Card | None]:
+        checked = [card if card is not None and card in cards else None for card, cards in zip(chosen, options)]
+        answered = sum(card is not None for card in checked)
+        result = "complete" if answered == len(players) else "partial" if answered else "failed"
+        metrics.inc("dixit_batch_total", phase=phase, result=result)
+        for player, card in zip(players, checked):
+            if card is not None:
+                self._notify_player_finished(player, phase)
+        return checked
+
+    def _choose_card_call(self, player: AbstractPlayer, description: str, hand: list[Card]) -> Card:
+        # Runs on the worker pool, the player chooses a card from the hand to put on the table
+        chosen_card = self._speculated_choice(player, description, hand) or player.choose_card(description, hand)
+        if chosen_card not in hand:
+            raise ValueError(f"Hráč {player.name} vybral kartu {chosen_card.key}, kterou nemá v ruce")
+        self._notify_player_finished(player, PHASE_PLACEMENT)
+        return chosen_card
+
+    def _vote_call(self, player: AbstractPlayer, description: str, choices: list[Card]) -> Card:
+        # Runs on the worker pool, choices are the cards on the table except the player's own
+        chosen_card = player.choose_card(description, choices)
+        if chosen_card not in choices:
+            raise ValueError(f"Hráč {player.name} hlasoval pro kartu {chosen_card.key}, která není na výběr")
+        self._notify_player_finished(player, PHASE_VOTING)
+        return chosen_card
+
+    def _fallback_card(self, player: AbstractPlayer, phase: str, cards: list[Card]) -> Card:
+        """random legal card for a player whose call failed or missed the deadline; uses the seeded rng"""
+        chosen_card = self.rng.choice(cards)
+        log.warning("Hráč %s neodpověděl včas, za něj byla zvolena náhodná karta %s", player.name, chosen_card.key)
+        self._notify_player_finished(player, phase)
+        return chosen_card
+
+    async def _with_deadline(self, call: Awaitable[T], fallback: Callable[[], T]) -> T:
+        """the result of an async call, or the fallback when it fails or takes longer than call_deadline"""
+        try:
+            return await asyncio.wait_for(call, self.call_deadline)
+        except Exception as e:
+            reason = "deadline" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+            metrics.inc("dixit_call_fallbacks_total", reason=reason)
+            log.warning("Volání selhalo nebo nestihlo termín (%s), použije se náhradní odpověď", reason)
+            return fallback()
+
+    @staticmethod
+    def _async_player(player: AbstractPlayer) -> AbstractAsyncPlayer:
+        if not isinstance(player, AbstractAsyncPlayer):
+            raise TypeError(f"Hráč {player.name} neumí hrát asynchronně")
+        return player
+
+    async def _batch_async(self, phase: str, description: str, players: list[AbstractPlayer],
+                           options: list[list[Card]]) -> list[Card | None]:
+        """the batch chooser's cards for the players, all None without a batch chooser or when its call failed"""
+        if self.batch is None:
+            return [None] * len(players)
+        chosen = await self._with_deadline(self.batch.choose_cards_async(description, list(zip(players, options))),
+                                           lambda: [None] * len(players))
+        return self._checked_batch(phase, players, options, chosen)
+
+    async def _choose_card_async(self, player: AbstractPlayer, description: str, batched: Card | None = None) -> None:
+        if batched is not None:  # Chosen by the batch chooser, already notified
+            self._put_on_table(batched, player)
+            log.info("Hráč %s vybral k popisu %s kartu: %s a vyložil ji na stůl", player.name, description, batched.key)
+            return
+        hand = list(player.cards_on_hand)
+        chosen_card = await self._with_deadline(self._async_player(player).choose_card_async(description, hand),
+                                                partial(self.rng.choice, hand))
+        if chosen_card not in hand:
+            chosen_card = self.rng.choice(hand)
+        self._put_on_table(chosen_card, player)
+        log.info("Hráč %s vybral k popisu %s kartu: %s a vyložil ji na stůl", player.name, description, chosen_card.key)
+        self._notify_player_finished(player, PHASE_PLACEMENT)
+
+    async def _vote_async(self, player: AbstractPlayer, description: str, voting: list[tuple[AbstractPlayer, Card]],
+                          batched: Card | None = None) -> None:
+        if batched is not None:  # Chosen by the batch chooser, already notified
+            voting.append((player, batched))
+            log.info("Hráč %s hlasoval pro kartu: %s", player.name, batched.key)
+            return
+        choices = [k[0] for k in self.table() if k[1] is not player] # Cards that are on the table, except the choosing player's card
+        chosen_card = await self._with_deadline(self._async_player(player).choose_card_async(description, choices),
+                                                partial(self.rng.choice, choices))
+        if chosen_card not in choices:
+            chosen_card = self.rng.choice(choices)
+        voting.append((player, chosen_card))
+        log.info("Hráč %s hlasoval pro kartu: %s", player.name, chosen_card.key)
+        self._notify_player_finished(player, PHASE_VOTING)
+
+    def _prepare_next_round(self) -> None:
+        # Remove selected cards from players' hands after the observers have seen them,
+        # cards hash by key and checksum, so the set lookup never compares pictures
+        with self._table_lock:
+            table, self.cards_on_table = self.cards_on_table, []
+        played = {card for card, _ in table}
+        for player in self.players:
+            player.cards_on_hand[:] = [card for card in player.cards_on_hand if card not in played]
+
+        self.discard_pile.extend([card for card, player in table])
+        # Adds the discarded cards to the discard pile
+
+        if len(self.cards_in_deck) < self.number_of_players:  # If there are not enough cards, add the discard pile to the deck
+            self.rng.shuffle(self.discard_pile)
+            self.cards_in_deck.extend(self.discard_pile)
+            self.discard_pile.clear()
+
+        for player in self.players:
+            player.take_card(self.cards_in_deck.popleft())
+
+    def _calculate_scores(self, voting: list[tuple[AbstractPlayer, Card]], storyteller: AbstractPlayer,
+                          storyteller_card: Card) -> None:
+        """Calculate scores for the round according to the Dixit rules:
+         1. If everyone or no one guessed correctly, add 2 points to everyone except storyteller
+         2. If someone guessed correctly, add 3 points to storyteller and 3 points to the correct guesser
+         3. Add points to the voters for the number of votes they received
+        The votes are counted once, so scoring is linear in the number of players; see vote_matrix.py for batches"""
+        votes: dict[Card, int] = {}
+        for _, chosen_card in voting:
+            votes[chosen_card] = votes.get(chosen_card, 0) + 1
+        number_of_correct_votes = votes.get(storyteller_card, 0)
+
+        if number_of_correct_votes == 0 or number_of_correct_votes == len(self.players) - 1:
+            for player in self.players:
+                if player is not storyteller:
+                    log.info('Hráč %s získal 2 body', player.name)
+                    player.score_add(2)
+        else:
+            storyteller.score_add(3)
+            log.info('Hráč %s získal 3 body jako vypravěč', storyteller.name)
+            for player, chosen_card in voting:
+                if chosen_card == storyteller_card:
+                    log.info('Hráč %s získal 3 body', player.name)
+                    player.score_add(3)
+
+        for card, player in self.table():
+            if card != storyteller_card:
+                for_voted = votes.get(card, 0)
+                player.score_add(for_voted)
+                log.info('Hráč %s získal %s body', player.name, for_voted)
+
+    def _shuffle_cards(self) -> None:
+        cards = list(self.manager.dict_of_cards.values())
+        self.rng.shuffle(cards)  # Shuffled as a list, indexing into the middle of a deque is slow
+        self.cards_in_deck.extend(cards)
+        log.info("Karty byly zamíchány")
+
+    def _hand_out_cards(self) -> None:
+        log.info("Karty byly rozdány")
+        # Ensure there are enough cards in the deck
+        if len(self.cards_in_deck) < self.number_of_players * self.number_of_cards_per_player:
+            raise ValueError(f"Chyba s kartami, v balíčku jich není dost: {len(self.cards_in_deck)} karet "
+                             f"pro {self.number_of_players} hráčů, je potřeba spojit více balíčků")
+
+        for player in self.players:
+            for i in range(self.number_of_cards_per_player):
+                player.take_card(self.cards_in_deck.popleft())  # Take a card from the deck and give it to the player
@@ -1,194 +1,111 @@
-from random import shuffle, choice
-import os
-from typing import Any
-from abstracts import AbstractCardManager, AbstractPlayer, Card
-from image_importer import process_images_to_json
-from sk import mykey
-import openai
-import json
 import tkinter as tk
 from tkinter import Canvas
-from PIL import Image, ImageTk
 import logging
-import threading
-import base64
-import hashlib
 import platform
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any
 
+from card_manager import CardManager
+from abstracts import AbstractCardManager, AbstractPlayer, Card
+from dixit_engine import (DixitEngine, GameObserver, TurnResult, PHASE_DESCRIPTION, PHASE_METRIC, PHASE_PLACEMENT,
+                          PHASE_VOTING)
+from event_log import EventLog
+from game_recording import GameRecorder
+from log_viewer import LogViewer
+from metrics import metrics
+from players import Player
+from thumbnails import ThumbnailCache
 
-logging.basicConfig(filename='dixit.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
-                    filemode='w', encoding='utf-8')  # 'w' write mode or 'a' append mode
-logging.getLogger("httpx").setLevel(logging.WARNING)
-log = logging.getLogger("dixit")
 
+LOG_FILE = 'dixit.log'
+EVENTS_FILE = 'dixit.events.jsonl'  # One JSON line per turn, see event_log.py
 
-class CardManager(AbstractCardManager):
-    """An object, which keeps track of all the cards;
-    by default loads all images and makes Card instances out of them
-    """
+log = logging.getLogger("dixit")
 
-    def __init__(self, json_file: str, input_directory: str) -> None:
-        self.dict_of_cards: dict[int, Card] = {}
-        self.json_file = json_file
-        self.input_directory = input_directory
-        self._load_cards()
+POLL_INTERVAL_MS = 100  # How often the Tk loop checks the progress of a running turn
+PHASE_LABELS: dict[str, str] = {PHASE_DESCRIPTION: "Popis", PHASE_PLACEMENT: "Vykládání karet", PHASE_VOTING: "Hlasování"}
+REDRAW_METRIC = "dixit_redraw_seconds"
+PANEL_WIDTH = 560  # A player's panel with six cards in the hand, including the gap to the next one
+ROW_HEIGHT = 200  # A row of panels, the name above the cards included
+VOTE_LINE_HEIGHT = 16  # One voter's name under a card on the table
+
+
+def configure_logging() -> None:
+    """log of the window to LOG_FILE, appended across starts, rotated at 5 MB with 3 old files kept (dixit.log.1 ...);
+    called by DixitGame, so importing this module changes no logging; does nothing when logging is already set up"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[RotatingFileHandler(LOG_FILE, maxBytes=5_000_000, backupCount=3, encoding='utf-8')])
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def table_layout(count: int, canvas_width: int, canvas_height: int) -> tuple[list[tuple[int, int]], int]:
+    """top left corner of the hand of every player and the y of the middle of the cards on the table;
+    the panels are in rows of as many as fit (at least two), half of the rows above the table and half below it.
+    The table is in the middle of the canvas; under its cards are the names of up to count - 1 voters, for bigger
+    tables it moves up towards the rows above and the rows below move down by what is still missing"""
+    columns = max(2, min(-(-count // 2), (canvas_width - 40) // PANEL_WIDTH))
+    rows = -(-count // columns)
+    rows_above = -(-rows // 2)
+    above_end = 80 + (rows_above - 1) * ROW_HEIGHT + 130  # Bottom edge of the lowest panel above the table
+    below_start = canvas_height - 230 - (rows - rows_above - 1) * ROW_HEIGHT  # The last row stays at the bottom edge
+    below_table = 140 + VOTE_LINE_HEIGHT * (count - 1)  # Cards, the voters' names and the next row's name
+    table_y = max(above_end + 90, min(canvas_height // 2, below_start - below_table))
+    shift = max(0, table_y + below_table - below_start)
+    positions = []
+    for idx in range(count):
+        col, row = idx % columns, idx // columns
+        x_offset = 30 + col * (canvas_width - 590) // (columns - 1)
+        if row < rows_above:
+            y_offset = 80 + row * ROW_HEIGHT
+        else:
+            y_offset = below_start + shift + (row - rows_above) * ROW_HEIGHT
+        positions.append((x_offset, y_offset))
+    return positions, table_y
 
-    def _load_cards(self) -> None:
-        """Loads all the cards from the json file into dict"""
-        try:
-            with open(self.json_file, "r", encoding="utf-8") as f:
-                data:list[Any] = json.load(f)
-            # Validate contents
-            if not isinstance(data, list) or not all(
-                    'key' in item and 'path' in item and 'checksum' in item and 'encoded_picture' in item for item in
-                    data):
-                raise ValueError(f"obsah JSONu {self.json_file} je chybný")
-
-            # Check if the number of items in the JSON file matches the number of files in the directory
-            num_files_in_directory = len([name for name in os.listdir(self.input_directory) if os.path.isfile(os.path.join(self.input_directory, name))])
-            if len(data) != num_files_in_directory:
-                raise ValueError(f"Počet obrázků nesedí. V JSONu ({len(data)}) a ve složce ({num_files_in_directory}).")
-
-            # Verify checksums and file existence
-            for item in data:
-                if not os.path.exists(item['path']):
-                    raise FileNotFoundError(f"Soubor '{item['path']}' neexistuje!")
-
-                with open(item['path'], "rb") as _f:
-                    b64_image: bytes = base64.b64encode(_f.read())
-                    calculated_checksum = hashlib.md5(b64_image).hexdigest()
-
-                if calculated_checksum != item['checksum']:
-                    raise ValueError(f"Checksum verifikace selhala u karty s klíčem {item['key']}")
-
-            self.dict_of_cards = {item['key']: Card(**item) for item in data}
-            log.info(f"Karty byly úspěšně načteny '{self.json_file}'.")
-
-        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-            log.info(f"Chyba se souborem '{self.json_file}': {e}. Regeneruji...")
-            process_images_to_json(self.input_directory, self.json_file)
-            self._load_cards()  # Retry loading after regeneration
-
-    def find_card(self, key: int) -> Card:
-        """find a card by key"""
-        return self.dict_of_cards[key]
-
-
-
-class Player(AbstractPlayer):
-    """AI powered player"""
-
-    def __init__(self, name: str, nature: str = "jsi hráč hry dixit", temperature: float = 0) -> None:
-        """set how the player will behave"""
-        self.nature = nature
-        self.temperature = temperature
-        self.name = name
-        self.cards_on_hand: list[Card] = []
-        self.score = 0
-
-    def take_card(self, card: Card) -> None:
-        self.cards_on_hand.append(card)
-
-    def make_description(self, card: Card) -> str:
-        prompt = """Na základě zadaného obrázku vytvoř originální a abstraktní pojem, který vystihuje jeho atmosféru nebo koncept. 
-        Vyhni se přímému popisu věcí na obrázku. 
-        Například pro obrázek králíka ve skafandru by správný pojem mohl být "dobrodružství mimozemského života",
-        nikoliv "zvířecí astronaut".
-        Pojem nesmí být delší než 30 znaků a musí být originální. 
-        Vypiš mi pouze tento pojem ve formátu: 'pojem'.
-        """
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f" jsi hráč hry Dixit, který odpovídá na dotazy v roli {self.nature}, tvoje role by se mela odrazit v tom jak odpovidáš na dotazy"
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{card.encoded_picture}",
-                                "detail": "low",
-                            },
-                        },
-                    ],
-                }
-            ],
-            max_completion_tokens=75,
-            n=1,
-            temperature=self.temperature
-        )
-        content = response.choices[0].message.content
-        return content if content else "Neumím vymyslet popis"
-
-    def choose_card(self, description: str, laid_out_cards: list[Card]) -> Card:
-        """look at all cards 'on the table' and compare them with the description"""
-
-        prompt = f"Na základě zadaných obrázků vyber ten, který nejlépe sedí zadanému popisu:{description}. Napiš mi pouze číslo karty ve formatu:1"
-        built_message:list[dict[str,str]|dict[str,Any]] = []
-        for i in range(len(laid_out_cards)):
-            g = {"type": "image_url",
-                 "image_url": {
-                     "url": f"data:image/png;base64,{laid_out_cards[i].encoded_picture}",
-                     "detail": "low"}}
-            built_message.append(g)
-
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f" jsi hráč hry Dixit, který odpovídá na dotazy v roli {self.nature}, tvoje role by se mela odrazit v tom jak se rozhoduješ"
-                },
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": prompt}] + built_message,
-                }
-            ],
-            max_tokens=300,
-            n=1,
-            temperature=self.temperature
-        )
-        content = response.choices[0].message.content
-        return laid_out_cards[int(content) - 1] if content else choice(laid_out_cards)
-
-    def score_add(self, number: int) -> None:
-        self.score += number
-
-
-
-class DixitGame:
-    """Simulates a game of Dixit; set debug=True to simulate without any API calls
 
+class DixitGame(GameObserver):
+    """Tk view of a game of Dixit, the game itself is played by DixitEngine;
+    set debug=True to simulate without any API calls; show_metrics adds phase and API timings to the bottom bar,
+    metrics_file gets the metrics dumped every 10 s (Prometheus text for *.prom, JSON otherwise),
+    record_file gets the whole game for a later replay (see game_recording.py);
+    3 to 12 players fit the window, more than six need a bigger deck, e.g. manager=CombinedCardManager([...])
     """
 
-    def     __init__(self, players: list[Player], root_window: tk.Tk, debug: bool = False) -> None:
+    def     __init__(self, players: list[Player], root_window: tk.Tk, debug: bool = False, show_metrics: bool = False,
+                 metrics_file: str | None = None, record_file: str | None = None,
+                 manager: AbstractCardManager | None = None) -> None:
+        configure_logging()
         log.info("Začátek aplikace")
         ################################ GAME SETUP ################################
         # Initialize game settings
         self.debug = debug
-        self.number_of_players = 4
         self.players: list[Player] = players
-        self.cards_in_deck: list[Card] = []
-        self.discard_pile: list[Card] = []
-        self.cards_on_table: list[tuple[Card, Player]] = []
-        self.number_of_cards_per_player: int = 6
-        self.round_number: int = 1
-        self.index_storyteller: int = 0
-        self.manager = CardManager("images.json", "card_images")
-        self._shuffle_cards()
-        self._hand_out_cards()
-        if not self.debug:
-            openai.api_key = mykey  # OpenAI API key
+        # While the user looks at a finished turn, the next description and card choices are computed in the background
+        # Files changed since the last start are verified in the background, the window does not wait for the hashing
+        self.engine = DixitEngine(players, manager or CardManager("cards.pack", "card_images", verify="deferred"),
+                                  debug=debug, speculate=not debug)
+        self.engine.add_observer(self)
+        # A turn every few seconds, so every event is written at once and the log window sees it immediately
+        self.events = EventLog(EVENTS_FILE, buffer_size=1)
+        self.game_id = time.strftime("%Y%m%d-%H%M%S")
+        self.engine.add_observer(self.events.observer(self.game_id))
+        self.recorder = GameRecorder(record_file, self.engine) if record_file else None
+        self._events: queue.Queue[tuple[str, Any]] = queue.Queue()  # Events from the turn worker for the Tk thread
+        self._progress: dict[str, list[str]] = {}  # Names of players who finished each phase of the running turn
+        self._turn_storyteller: str | None = None  # Storyteller of the running turn, as the worker reported it
+        self._turn_shown = False  # The result of the running turn is drawn, it only has to finish on the worker
 
         ################################ UI SETUP ###################################
         # Initialize UI components
-        self.backgrounds: list[str] = ['dodger blue', 'IndianRed1', 'slate blue', 'PaleGreen1']
-        self.card_images: list[ImageTk.PhotoImage] = []
+        self.backgrounds: list[str] = ['dodger blue', 'IndianRed1', 'slate blue', 'PaleGreen1', 'orange', 'gold',
+                                       'orchid1', 'turquoise', 'tan1', 'pink', 'khaki', 'SeaGreen1']
+        self.thumbnails = ThumbnailCache()  # Decoded and resized card images, reused by every redraw
+        # Decoded while the start screen is shown; a card drawn before it is done is decoded by the redraw itself
+        threading.Thread(target=self.thumbnails.preload, args=(list(self.engine.manager.dict_of_cards.values()),),
+                         daemon=True).start()
 
 
         # Set up the main Tkinter window
@@ -221,365 +138,279 @@ class DixitGame:
 
         self.log_button = tk.Button(self.bottom_bar, text="Log", command=self._show_log)
         self.log_button.pack(side=tk.LEFT, padx=2, pady=1)
+        self.events_button = tk.Button(self.bottom_bar, text="Průběh hry", command=self._show_events)
+        self.events_button.pack(side=tk.LEFT, padx=2, pady=1)
 
-        # Log player creation
-        for player in self.players:
-            log.info(f'Vytvořen hráč jménem {player.name} s povahou {player.nature} a temperature {player.temperature}')
-
-    def turn(self, storyteller_idx: int) -> None:
-        """Perform one turn where one player is selected as the storyteller and others guess"""
-            
-        storyteller: Player = self.players[storyteller_idx]
-        storyteller_card: Card = storyteller.cards_on_hand[0]  # storyteller chooses a card
-        self.cards_on_table.append((storyteller_card, storyteller))
-        description:str
-        voting: list[tuple[Player, Card]] = []
-
-        if self.debug:
-            # Simulate turn in debug mode
-            description = "Sample popis dlouhý bla bla bla"
-            log.info(f"Vypraveč: {storyteller.name}")
-            log.info(f"Vybraná karta: {storyteller_card.key}, Popis: {description}")
-            self._simulated_game_turn(storyteller, storyteller_card, description, voting)
-            
+        # Footer with the round number, packed on the first preview
+        self.footer_text = tk.Label(self.bottom_bar, text='', bg='lightgrey', font=('Arial', 12, 'bold'))
 
-        else:
-            # Normal game flow with threads
-            description = storyteller.make_description(storyteller_card)
-            log.info(f"Vypraveč: {storyteller.name}")
-            log.info(f"Vybraná karta: {storyteller_card.key}, Popis: {description}")
-            self._real_game_turn(storyteller, storyteller_card, description, voting)
-
-        # Show the updated UI
-        self._update_ui(storyteller, storyteller_card, description, voting)
-        # Remove cards from players' hands, clear cards on the table and give a new card to the players
-        self._prepare_next_round()
-
-    def _simulated_game_turn(self,storyteller: Player, storyteller_card: Card, description: str, voting: list[tuple[Player, Card]]) -> None:
-        for player in self.players:
-                if player != storyteller:
-                    chosen_card = choice(player.cards_on_hand)
-                    logging.info(
-                        f"Hrac {player.name} vybral k popisu {description} kartu: {chosen_card.key} a vylozil ji na stul")
-                    self.cards_on_table.append((chosen_card, player))
-
-        shuffle(self.cards_on_table)
-
-        # Simulate voting
-
-        for player in self.players:
-            if player != storyteller:
-                list_without_players_card = [card for card in self.cards_on_table if card[1] != player]
-                chosen_card = choice(list_without_players_card)[0]
-                log.info(f"Hrac {player.name} hlasoval pro kartu: {chosen_card.key}")
-                voting.append((player, chosen_card))
+        # Optional overlay with the timings of the phases and of the API calls
+        self.metrics_text: tk.Label | None = None
+        if show_metrics:
+            self.metrics_text = tk.Label(self.bottom_bar, text='', bg='lightgrey', font=('Arial', 10))
+            self.metrics_text.pack(side=tk.LEFT, padx=10)
+        if metrics_file:
+            metrics.start_dump(metrics_file)
 
-        self._calculate_scores(voting, storyteller, storyteller_card)
-    
-    def _real_game_turn(self, storyteller: Player, storyteller_card: Card, description: str, voting: list[tuple[Player, Card]]) -> None:
-        threads: list[threading.Thread] = []
-        for player in self.players: 
-            thread = threading.Thread(target=self._choose_card_thread, args=(player, storyteller, description,))
-            threads.append(thread)
-            thread.start()
-
-        for thread in threads: # Wait for all threads to finish
-            thread.join()
-
-        shuffle(self.cards_on_table)
-
-        # Players except storyteller vote
-
-        vote_threads: list[threading.Thread] = []
-        for player in self.players:
-            thread = threading.Thread(target=self._vote_thread, args=(player, storyteller, description, voting,))
-            vote_threads.append(thread)
-            thread.start()
-
-        for thread in vote_threads: # Wait for all threads to finish
-            thread.join()
-
-        self._calculate_scores(voting, storyteller, storyteller_card)
-
-    def _choose_card_thread(self, player: Player, storyteller: Player, description: str) -> None:
-        # Thread for player to choose a card
-        if player is not storyteller:
-            chosen_card = player.choose_card(description, player.cards_on_hand)
-            self.cards_on_table.append((chosen_card, player))
-            log.info(f"Hráč {player.name} vybral k popisu {description} kartu: {chosen_card.key} a vyložil ji na stůl")
-
-    def _vote_thread(self, player: Player, storyteller: Player, description: str, voting: list[tuple[Player, Card]]) -> None:
-        # Thread for player to vote for a card
-        if player is not storyteller:
-            choices = [k[0] for k in self.cards_on_table if k[1] != player] # Cards that are on the table, except the choosing player's card
-            chosen_card = player.choose_card(description, choices)
-            voting.append((player, chosen_card))
-            log.info(f"Hráč {player.name} hlasoval pro kartu: {chosen_card.key}")
-
-
-    def _prepare_next_round(self) -> None:
-        # Remove selected cards from players' hands after updating the canvas
-        for player in self.players:
-            for chosen_card, _ in self.cards_on_table:
-                if chosen_card in player.cards_on_hand:
-                    player.cards_on_hand.remove(chosen_card)
-
-        self.discard_pile.extend([card for card, player in self.cards_on_table])
-        # Adds the discarded cards to the discard pile
-        self.cards_on_table.clear()
-
-        if len(self.cards_in_deck) < self.number_of_players:  # If there are not enough cards, add the discard pile to the deck
-            shuffle(self.discard_pile)
-            self.cards_in_deck.extend(self.discard_pile)
-            self.discard_pile.clear()
+        # Retained scene; canvas items are created on the first preview, key is the tag, value the options last set
+        self._scene: dict[str, dict[str, Any]] = {}
+        self._scene_built = False
 
+        # Log player creation
         for player in self.players:
-            player.take_card(self.cards_in_deck.pop(0))
-
-    def _calculate_scores(self, voting: list[tuple[Player, Card]], storyteller: Player, storyteller_card: Card) -> None:
-        """Calculate scores for the round according to the Dixit rules:
-         1. If everyone or no one guessed correctly, add 2 points to everyone except storyteller
-         2. If someone guessed correctly, add 3 points to storyteller and 3 points to the correct guesser
-         3. Add points to the voters for the number of votes they received"""
-        number_of_correct_votes = sum(1 for h in voting if h[1] == storyteller_card)
-
-        if number_of_correct_votes == 0 or number_of_correct_votes == len(self.players) - 1:
-            for player in self.players:
-                if player != storyteller:
-                    log.info(f'Hráč {player.name} získal 2 body')
-                    player.score_add(2)
-        else:
-            storyteller.score_add(3)
-            log.info(f'Hráč {storyteller.name} získal 3 body jako vypravěč')
-            for player, chosen_card in voting:
-                if chosen_card == storyteller_card:
-                    log.info(f'Hráč {player.name} získal 3 body')
-                    player.score_add(3)
-
-        for card, player in self.cards_on_table:
-            if card != storyteller_card:
-                for_voted = sum(1 for h in voting if h[1] == card)
-                player.score_add(for_voted)
-                log.info(f'Hráč {player.name} získal {for_voted} body')
+            log.info(f'Vytvořen hráč jménem {player.name} s povahou {player.nature} a temperature {player.temperature}')
 
     def _preview(self) -> None:
         # Preview the game state before the turn
-        self.canvas.update()
         self.start_game_button.destroy()
-        self._clear_widget_from_bottom_bar()
-        self.canvas.delete('all')
-        self.canvas.pack(fill=tk.BOTH, expand=True)
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-        self.canvas.create_text(canvas_width // 2, canvas_height // 2,
-                               text=f"Vypočítává se tah hráče {self.players[self.index_storyteller].name}",
-                               font=("Arial", 24, "bold"))
-        footer_text = tk.Label(self.bottom_bar,
-                               text=f'Probíha kolo číslo {self.round_number}, vypraveč je {self.players[self.index_storyteller].name}',
-                               bg='lightgrey', font=('Arial', 12, 'bold'))
-        footer_text.pack(side=tk.BOTTOM, pady=10)
-
-        self.card_images = []  # Clear list for storing images
-        for idx, player in enumerate(self.players):
-            col = idx % 2   # If idx is even, col is 0, else col is 1
-            row = idx // 2  # If idx is even, row is 0, else row is 1
-            x_offset = 30 + col * (canvas_width - 590)
-            y_offset = 80 + row * (canvas_height -230)
-
-            self.canvas.create_rectangle(x_offset - 10, y_offset - 10, x_offset + 540, y_offset + 130, fill='lightgrey',
-                                         outline='')
-            self.canvas.create_oval(x_offset - 20, y_offset - 60, x_offset - 5, y_offset - 45,
-                                    fill=self.backgrounds[idx % len(self.backgrounds)], outline='')
+        if not self._scene_built:
+            self._build_scene()
+        storyteller = self.players[self.engine.index_storyteller]
+        self._set('status', text=f"Vypočítává se tah hráče {storyteller.name}", state=tk.NORMAL)
+        self._set_footer(f'Probíha kolo číslo {self.engine.round_number}, vypraveč je {storyteller.name}')
 
-            description_text = f'{player.name} (Skóre: {player.score})'
-            self.canvas.create_text(x_offset, y_offset - 50, text=description_text, anchor='w',
-                                    font=('Arial', 16, 'bold'))
-            for card_idx, card in enumerate(player.cards_on_hand):
-                x = x_offset + card_idx * 90
-                y = y_offset
-                image: Image.Image = Image.open(card.path)
-                image = image.resize((80, 120))
-                card_image = ImageTk.PhotoImage(image)
-                self.canvas.create_image(x + 40, y + 60, image=card_image)
-                self.card_images.append(card_image)  # Store the reference to avoid garbage collection
+        for idx, player in enumerate(self.players):
+            self._set(f'name{idx}', text=f'{player.name} (Skóre: {player.score})')
+            self._show_hand(idx, player.cards_on_hand, ())
+        for slot in range(len(self.players)):
+            self._show_table_slot(slot, None)
 
         self.canvas.update()
 
-    def _shuffle_cards(self) -> None:
-        for item in self.manager.dict_of_cards:
-            self.cards_in_deck.append(self.manager.dict_of_cards[item])
-        shuffle(self.cards_in_deck)
-        log.info("Karty byly zamíchány")
-
-    def _hand_out_cards(self) -> None:
-        log.info("Karty byly rozdány")
-        # Ensure there are enough cards in the deck
-        if len(self.cards_in_deck) < self.number_of_players * self.number_of_cards_per_player:
-            raise ValueError("Chyba s kartami, v balíčku jich není dost")
-
-        for player in self.players:
-            for i in range(self.number_of_cards_per_player):
-                player.take_card(self.cards_in_deck.pop(0))  # Take a card from the deck and give it to the player
-
+    def _build_scene(self) -> None:
+        """Create every canvas item once; redraws then only change them through _set.
+        Tags: panel/dot/name{player}, hand{player}_{slot}(_outline), table{slot}(_bg/_owner/_votes), status
+        """
+        self.canvas.delete('all')
+        self._scene.clear()
+        for idx in range(len(self.players)):
+            color = self.backgrounds[idx % len(self.backgrounds)]
+            self.canvas.create_rectangle(0, 0, 0, 0, fill='lightgrey', outline='', tags=('scene', f'panel{idx}'))
+            self.canvas.create_oval(0, 0, 0, 0, fill=color, outline='', tags=('scene', f'dot{idx}'))
+            self.canvas.create_text(0, 0, anchor='w', font=('Arial', 16, 'bold'), tags=('scene', f'name{idx}'))
+            for slot in range(self.engine.number_of_cards_per_player):
+                self.canvas.create_image(0, 0, tags=('scene', f'hand{idx}_{slot}'))
+                self.canvas.create_rectangle(0, 0, 0, 0, outline=color, width=5, state=tk.HIDDEN,
+                                             tags=('scene', f'hand{idx}_{slot}_outline'))  # Outline of chosen cards
+
+        for slot in range(len(self.players)):
+            self.canvas.create_rectangle(0, 0, 0, 0, width=3, state=tk.HIDDEN, tags=('scene', f'table{slot}_bg'))
+            self.canvas.create_image(0, 0, state=tk.HIDDEN, tags=('scene', f'table{slot}'))
+            self.canvas.create_text(0, 0, anchor='s', font=('Arial', 10, 'bold'), state=tk.HIDDEN,
+                                    tags=('scene', f'table{slot}_owner'))
+            self.canvas.create_text(0, 0, anchor='n', font=('Arial', 10), state=tk.HIDDEN,
+                                    tags=('scene', f'table{slot}_votes'))
+
+        self.canvas.create_text(0, 0, font=("Arial", 24, "bold"), tags=('scene', 'status'))
+        self._scene_built = True
+        self.canvas.bind('<Configure>', lambda event: self._layout())
+        self._layout()
+
+    def _layout(self) -> None:
+        """Position all scene items for the current canvas size, only called on build and on resize"""
+        if not self._scene_built:
+            return
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        positions, table_y = table_layout(len(self.players), canvas_width, canvas_height)
+        for idx, (x_offset, y_offset) in enumerate(positions):
+            self.canvas.coords(f'panel{idx}', x_offset - 10, y_offset - 10, x_offset + 540, y_offset + 130)
+            self.canvas.coords(f'dot{idx}', x_offset - 20, y_offset - 60, x_offset - 5, y_offset - 45)
+            self.canvas.coords(f'name{idx}', x_offset, y_offset - 50)
+            for slot in range(self.engine.number_of_cards_per_player):
+                x, y = x_offset + slot * 90, y_offset
+                self.canvas.coords(f'hand{idx}_{slot}', x + 40, y + 60)
+                self.canvas.coords(f'hand{idx}_{slot}_outline', x, y, x + 80, y + 120)
+
+        num_cards = len(self.players)
+        starting_x = (canvas_width - (num_cards * 80 + (num_cards - 1) * 10)) // 2
+        for slot in range(num_cards):
+            x, y = starting_x + slot * (80 + 10), table_y
+            self.canvas.coords(f'table{slot}_bg', x, y - 80, x + 80, y + 60)
+            self.canvas.coords(f'table{slot}', x + 40, y)
+            self.canvas.coords(f'table{slot}_owner', x + 40, y - 60)
+            self.canvas.coords(f'table{slot}_votes', x + 40, y + 70)
+        self.canvas.coords('status', canvas_width // 2, canvas_height // 2)
+
+    def _set(self, tag: str, **options: Any) -> None:
+        """itemconfig only the options of the item which changed since the last redraw"""
+        current = self._scene.setdefault(tag, {})
+        changed = {option: value for option, value in options.items() if current.get(option) != value}
+        if changed:
+            self.canvas.itemconfig(tag, **changed)
+            current.update(changed)
+
+    def _show_hand(self, idx: int, cards: list[Card], chosen: tuple[Card, ...]) -> None:
+        for slot in range(self.engine.number_of_cards_per_player):
+            if slot < len(cards):
+                self._set(f'hand{idx}_{slot}', image=self.thumbnails.photo(cards[slot]), state=tk.NORMAL)
+                self._set(f'hand{idx}_{slot}_outline', state=tk.NORMAL if cards[slot] in chosen else tk.HIDDEN)
+            else:
+                self._set(f'hand{idx}_{slot}', state=tk.HIDDEN)
+                self._set(f'hand{idx}_{slot}_outline', state=tk.HIDDEN)
+
+    def _show_table_slot(self, slot: int, content: tuple[Card, AbstractPlayer, str] | None) -> None:
+        # content is the card, its owner and the names of the voters, None hides the slot
+        tags = (f'table{slot}_bg', f'table{slot}', f'table{slot}_owner', f'table{slot}_votes')
+        if content is None:
+            for tag in tags:
+                self._set(tag, state=tk.HIDDEN)
+            return
+        card, owner, voters = content
+        color = self.backgrounds[self.engine.players.index(owner) % len(self.backgrounds)]
+        self._set(f'table{slot}_bg', fill=color, outline=color, state=tk.NORMAL)
+        self._set(f'table{slot}', image=self.thumbnails.photo(card), state=tk.NORMAL)
+        self._set(f'table{slot}_owner', text=owner.name, state=tk.NORMAL)
+        self._set(f'table{slot}_votes', text=voters, state=tk.NORMAL)
+
+    def _set_footer(self, text: str) -> None:
+        self.footer_text.config(text=text)
+        if not self.footer_text.winfo_manager():
+            self.footer_text.pack(side=tk.BOTTOM, pady=10)
 
     def _play_turn(self) -> None:
-        # After pressing button, check if game is over or play turn
+        # After pressing button, check if game is over or play turn; the log stays available during the turn
         self.play_button.config(state=tk.DISABLED)
-        self.log_button.config(state=tk.DISABLED)
         self.canvas.update()
 
-        log.info(f'Hraje se kolo číslo {self.round_number}')
         self.play_button.pack(side=tk.RIGHT, padx=10, pady=10)
-        max_score = max(player.score for player in self.players)
-        if max_score >= 30:
-            self._game_end(max_score)
+        if self.engine.is_over():
+            self._game_end(max(player.score for player in self.players))
         else:
-            self._preview()
+            with metrics.time(REDRAW_METRIC, view="preview"):
+                self._preview()
 
             if not self.debug:
-                self.turn(self.index_storyteller)
+                self._run_turn()
             else:
-                self.canvas.after(500, self.turn, self.index_storyteller)
-            self.index_storyteller += 1
-
-            if self.index_storyteller >= len(self.players):  # If the index_storyteller is greater than or equal to the number of players,
-                self.index_storyteller = 0  # Reset it and increase the round number
-                self.round_number += 1
-            self.play_button.config(state=tk.NORMAL)
-            self.log_button.config(state=tk.NORMAL)
-
-    def _update_ui(self, storyteller: Player, storyteller_card: Card, description: str,
-                  voting: list[tuple[Player, Card]]) -> None:
-        self._clear_widget_from_bottom_bar()
-        self.canvas.delete('all')
-        self.canvas.pack(fill=tk.BOTH, expand=True)
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+                self.canvas.after(500, self._run_turn)
+
+    def _run_turn(self) -> None:
+        # The turn is computed on a worker thread, the Tk loop keeps running and polls its events
+        self._progress = {phase: [] for phase in PHASE_LABELS}
+        self._turn_storyteller = None
+        self._turn_shown = False
+        while not self._events.empty():  # Nothing of an earlier turn may be taken for this one
+            self._events.get_nowait()
+        threading.Thread(target=self._turn_worker, daemon=True).start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_turn)
+
+    def _turn_worker(self) -> None:
+        # The engine is read only by this thread while the turn runs, the Tk thread gets everything through _events
+        self._events.put(('turn_started', self.engine.players[self.engine.index_storyteller].name))
+        try:
+            self.engine.turn()
+        except Exception as e:
+            log.exception("Výpočet tahu selhal")
+            self._events.put(('error', e))
+        else:
+            # Only now is the engine ready for the next turn, 'turn_finished' comes before the hands are refilled
+            self._events.put(('done', None))
+
+    # GameObserver callbacks come from the worker threads, Tk may only be touched by _poll_turn
+    def player_finished(self, player: AbstractPlayer, phase: str) -> None:
+        self._events.put(('player_finished', (player, phase)))
+
+    def turn_finished(self, result: TurnResult) -> None:
+        self._events.put(('turn_finished', result))
+
+    def _poll_turn(self) -> None:
+        # Runs on the Tk thread every POLL_INTERVAL_MS until the turn is finished
+        while True:
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'turn_started':
+                self._turn_storyteller = payload
+            elif kind == 'player_finished':
+                player, phase = payload
+                self._progress[phase].append(player.name)
+            elif kind == 'turn_finished':
+                with metrics.time(REDRAW_METRIC, view="update_ui"):
+                    self._update_ui(payload)
+                self._show_metrics()
+                self._turn_shown = True
+            elif kind == 'done':
+                self.play_button.config(state=tk.NORMAL)
+                return
+            elif kind == 'error':
+                if self._turn_shown:  # An observer failed after scoring, the turn itself was finished
+                    self._set('status', text=f"Chyba po skončení tahu: {payload}", state=tk.NORMAL)
+                else:  # The cards of the failed turn leave the table, the same storyteller can play the turn again
+                    self.engine.abandon_turn()
+                    for slot in range(len(self.players)):
+                        self._show_table_slot(slot, None)
+                    self._set('status', text=f"Výpočet tahu selhal: {payload}\nTah lze zahrát znovu", state=tk.NORMAL)
+                self.play_button.config(state=tk.NORMAL)
+                return
+        if not self._turn_shown:
+            self._show_progress()
+            self._show_metrics()
+        self.root.after(POLL_INTERVAL_MS, self._poll_turn)
+
+    def _show_progress(self) -> None:
+        others = len(self.players) - 1
+        lines = [f"Vypočítává se tah hráče {self._turn_storyteller}" if self._turn_storyteller else "Vypočítává se tah"]
+        for phase, label in PHASE_LABELS.items():
+            done = self._progress[phase]
+            expected = 1 if phase == PHASE_DESCRIPTION else others
+            lines.append(f"{label} ({len(done)}/{expected}): {', '.join(done) if done else '...'}")
+        self._set('status', text='\n'.join(lines), state=tk.NORMAL)
+
+    def _show_metrics(self) -> None:
+        # Averages over the turns played so far, only when the overlay is on
+        if self.metrics_text is None:
+            return
+        parts = []
+        for phase, label in PHASE_LABELS.items():
+            histogram = metrics.histogram(PHASE_METRIC, phase=phase)
+            if histogram is not None:
+                parts.append(f"{label} {histogram.sum / histogram.count:.1f} s")
+        redraw = metrics.merged(REDRAW_METRIC)
+        if redraw is not None:
+            parts.append(f"Překreslení {redraw.sum / redraw.count * 1000:.0f} ms")
+        calls = metrics.merged("dixit_api_call_seconds")
+        if calls is not None:
+            sent = metrics.merged("dixit_api_request_bytes")
+            parts.append(f"API {calls.count}× p50 {calls.quantile(0.5):.1f} s p90 {calls.quantile(0.9):.1f} s, "
+                         f"odesláno {(sent.sum if sent else 0) / 1e6:.1f} MB, "
+                         f"{metrics.total('dixit_api_tokens_total'):.0f} tokenů, "
+                         f"{metrics.total('dixit_api_retries_total'):.0f} opakování, "
+                         f"{metrics.total('dixit_api_errors_total'):.0f} chyb")
+        self.metrics_text.config(text=' | '.join(parts))
+
+    def _update_ui(self, result: TurnResult) -> None:
+        storyteller = result.storyteller
+        self._set('status', state=tk.HIDDEN)
+        table_cards = tuple(card for card, _ in result.cards_on_table)
 
-        self.card_images = []
         for idx, player in enumerate(self.players):
-            col = idx % 2   # If idx is even, col is 0, else col is 1
-            row = idx // 2  # If idx is even, row is 0, else row is 1
-            x_offset = 30 + col * (canvas_width - 590)
-            y_offset = 80 + row * (canvas_height -230)
-
-            self.canvas.create_rectangle(x_offset - 10, y_offset - 10, x_offset + 540, y_offset + 130, fill='lightgrey',
-                                         outline='')
-            self.canvas.create_oval(x_offset - 20, y_offset - 60, x_offset - 5, y_offset - 45,
-                                    fill=self.backgrounds[idx % len(self.backgrounds)], outline='')
-
             description_text = f'{player.name} (Skóre: {player.score})'
-            if player == storyteller:
-                description_text += f' - {description}'
-            self.canvas.create_text(x_offset, y_offset - 50, text=description_text, anchor='w',
-                                    font=('Arial', 16, 'bold'))
-
-            # Cards on hand
-            for card_idx, card in enumerate(player.cards_on_hand):
-                x, y = x_offset + card_idx * 90, y_offset
-                image = Image.open(card.path).resize((80, 120))
-                card_image = ImageTk.PhotoImage(image)
-                self.canvas.create_image(x + 40, y + 60, image=card_image)
-                outline_color = self.backgrounds[idx % len(self.backgrounds)] if card == storyteller_card or any(
-                    card == k[0] for k in self.cards_on_table) else None
-                if outline_color:
-                    self.canvas.create_rectangle(x, y, x + 80, y + 120, outline=outline_color, width=5) # Outline chosen cards
-                self.card_images.append(card_image)
-
-        # Cards on table
-        canvas_width = self.canvas.winfo_width()
-        num_cards = len(self.cards_on_table)
-        starting_x = (canvas_width - (num_cards * 80 + (num_cards - 1) * 10)) // 2
+            if player is storyteller:
+                description_text += f' - {result.description}'
+            self._set(f'name{idx}', text=description_text)
+            self._show_hand(idx, result.hands[idx], table_cards)
+
+        voters: dict[Card, list[str]] = {}  # Names of the voters of every card, collected in one pass
+        for voter, voted_card in result.voting:
+            voters.setdefault(voted_card, []).append(voter.name)
+        for slot in range(len(self.players)):
+            if slot < len(result.cards_on_table):
+                card, owner = result.cards_on_table[slot]
+                self._show_table_slot(slot, (card, owner, '\n'.join(voters.get(card, []))))
+            else:
+                self._show_table_slot(slot, None)
 
-        for idx, (card, player) in enumerate(self.cards_on_table):
-            x, y = starting_x + idx * (80 + 10), self.canvas.winfo_height() // 2
-            image = Image.open(card.path).resize((80, 120))
-            card_image = ImageTk.PhotoImage(image)
-            outline_color = self.backgrounds[self.players.index(player) % len(self.backgrounds)]
-            self.canvas.create_rectangle(x, y - 80, x + 80, y + 60, fill=outline_color, outline=outline_color, width=3)
-            self.canvas.create_image(x + 40, y, image=card_image)
-
-            self.card_images.append(card_image)
-            self.canvas.create_text(x + 40, y - 60, text=player.name, anchor='s', font=('Arial', 10, 'bold'))
-
-            y_offset_text = y + 70
-            for voting_player, voted_card in voting:
-                if card == voted_card:
-                    self.canvas.create_text(x + 40, y_offset_text, text=voting_player.name, anchor='n',
-                                            font=('Arial', 10))
-                    y_offset_text += 15
-
-        footer_text = tk.Label(self.bottom_bar,
-                               text=f'Proběhlo kolo číslo {self.round_number}, vypraveč je {storyteller.name}',
-                               bg='lightgrey', font=('Arial', 12, 'bold'))
-        footer_text.pack(side=tk.BOTTOM, pady=10)
+        self._set_footer(f'Proběhlo kolo číslo {result.round_number}, vypraveč je {storyteller.name}')
         self.canvas.update()
 
-    def _clear_widget_from_bottom_bar(self)-> None:
-        for widget in self.bottom_bar.winfo_children(): # Remove existing labels from the bottom bar
-            if isinstance(widget, tk.Label):
-                widget.destroy()
-
     def _show_log(self) -> None:
-        log_window = tk.Toplevel(self.root)
-        log_window.title("Log")
-
-        # Calculate size based on main window
-        main_width = self.root.winfo_width()
-        main_height = self.root.winfo_height()
-        window_width = int(main_width * 0.4)
-        window_height = int(main_height * 0.8)
-
-        # Calculate position (centered horizontally, 10% from top)
-        x = self.root.winfo_x() + (main_width - window_width) // 2
-        y = self.root.winfo_y() + int(main_height * 0.1)  # Start at 10% from top
-
-        log_window.geometry(f"{window_width}x{window_height}+{x}+{y}") # positions the log window
-        log_window.minsize(300, 400)
-
-        # Create main frame for log window with padding
-        log_frame = tk.Frame(log_window)
-        log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        log_frame.grid_rowconfigure(0, weight=1)
-        log_frame.grid_rowconfigure(1, weight=0)
-        log_frame.grid_columnconfigure(0, weight=1)
-
-        # Create text widget with scrollbars
-        text_frame = tk.Frame(log_frame)
-        text_frame.grid(row=0, column=0, sticky="nsew")
-
-        log_text = tk.Text(text_frame, wrap=tk.NONE)
-        scrollbar_y = tk.Scrollbar(text_frame, orient=tk.VERTICAL, command=log_text.yview)
-        scrollbar_x = tk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=log_text.xview)
-
-        log_text.configure(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
-
-        # Grid layout for text and scrollbars
-        log_text.grid(row=0, column=0, sticky='nsew')
-        scrollbar_y.grid(row=0, column=1, sticky='ns')
-        scrollbar_x.grid(row=1, column=0, sticky='ew')
-
-        # Configure grid weights so when resized
-        text_frame.grid_rowconfigure(0, weight=1)
-        text_frame.grid_columnconfigure(0, weight=1)
-
-
-        # Load and display log content
-        try:
-            with open('dixit.log', 'r', encoding='utf-8') as log_file:
-                log_content = log_file.read()
-                log_text.insert('1.0', log_content)
-                log_text.config(state='disabled')  # Make text read-only
-        except Exception as e:
-            log_text.insert('1.0', f"Problém při načítaní obsahu z logu: {str(e)}")
-            log_text.config(state='disabled')
+        # Shows the end of the log and follows it, the window reads only what was appended since
+        LogViewer(self.root, LOG_FILE)
 
-        # Add close button in its own frame at the bottom with more padding
-        button_frame = tk.Frame(log_frame)
-        button_frame.grid(row=1, column=0, sticky='ew')
-        close_button = tk.Button(button_frame, text="Zavřít", command=log_window.destroy)
-        close_button.pack(pady=10, padx=5)
+    def _show_events(self) -> None:
+        LogViewer(self.root, EVENTS_FILE, events=True)
 
     def _game_end(self, max_score: int) -> None:
         winners = [hrac for hrac in self.players if hrac.score == max_score]
@@ -589,11 +420,18 @@ class DixitGame:
         else:
             message = f"Konec hry, vyhrál hráč {winner_names} s {max_score} body."
         log.info(message)
+        self.events.write("game_end", game=self.game_id, winners=[hrac.name for hrac in winners],
+                          scores={hrac.name: hrac.score for hrac in self.players})
+        if self.recorder:
+            self.recorder.close()
+        self.engine.close()
         self._display_winner_message(message)
 
     def _display_winner_message(self, message: str) -> None:
-        self._clear_widget_from_bottom_bar()
+        self.footer_text.pack_forget()
         self.canvas.delete('all')
+        self._scene.clear()
+        self._scene_built = False
         self.canvas.create_text(self.canvas.winfo_width() // 2, self.canvas.winfo_height() // 2, text=message,
                                 font=("Arial", 24), anchor=tk.CENTER)
         self.play_button.config(state=tk.DISABLED)
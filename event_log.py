@@ -0,0 +1,106 @@
+"""Structured log of the game events, one JSON object per line
+
+Every finished turn is written as one "turn" event with the storyteller, the description, the cards put on the
+table, the votes and the scores after the turn; other events (e.g. "game_end") can be written with write().
+The lines are buffered and the file is rotated like logging's RotatingFileHandler, so long batch runs neither
+write on every turn nor grow one file without limit.
+
+    events = EventLog("dixit.events.jsonl")
+    engine.add_observer(events.observer(game=42))
+    ...
+    events.close()
+
+log_viewer.py shows the file and follows it while it grows.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, TextIO
+
+from dixit_engine import GameObserver, TurnResult
+
+
+class EventLog:
+    """Thread-safe JSONL writer; lines are kept in memory until buffer_size of them are waiting,
+    flush() or close(); a file bigger than max_bytes is renamed to path.1 (path.1 to path.2 ...),
+    at most backup_count old files are kept"""
+
+    def __init__(self, path: str, buffer_size: int = 100, max_bytes: int = 10_000_000, backup_count: int = 5) -> None:
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+        self._file: TextIO | None = None
+
+    def observer(self, game: int | str | None = None) -> GameObserver:
+        """observer writing the turns of one game; game is written to every event to tell games apart"""
+        return _TurnEvents(self, game)
+
+    def write(self, event: str, **fields: Any) -> None:
+        record = {"event": event, "time": round(time.time(), 3), **fields}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _flush(self) -> None:
+        # Under the lock
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._file.flush()
+        self._buffer.clear()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        assert self._file is not None
+        self._file.close()
+        self._file = None
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+class _TurnEvents(GameObserver):
+    """writes a "turn" event for every finished turn of one game"""
+
+    def __init__(self, events: EventLog, game: int | str | None) -> None:
+        self.events = events
+        self.game = game
+
+    def turn_finished(self, result: TurnResult) -> None:
+        # Called after scoring, so the scores already include this turn; every player has a card on the table
+        self.events.write(
+            "turn",
+            game=self.game,
+            round=result.round_number,
+            storyteller=result.storyteller.name,
+            storyteller_card=result.storyteller_card.key,
+            description=result.description,
+            placements={owner.name: card.key for card, owner in result.cards_on_table},
+            table=[card.key for card, _ in result.cards_on_table],
+            votes={player.name: card.key for player, card in result.voting},
+            scores={owner.name: owner.score for _, owner in result.cards_on_table},
+        )
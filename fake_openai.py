@@ -0,0 +1,263 @@
+"""Local stand-in for the OpenAI chat completions API, for load tests without an API key or network
+
+Answers descriptions with random phrases and card choices with a random valid card number (batched choices with
+a JSON object of random valid numbers), after a delay drawn from a configurable distribution; a part of the
+requests can fail with 500 or be rejected with 429 (at random, or because a requests-per-minute limit is exceeded),
+like the real API does under load. With a requests-per-minute limit the answers carry x-ratelimit-* headers like
+the real ones.
+
+usage: python fake_openai.py --port 8765 --latency lognormal --latency-ms 800 --error-rate 0.01
+       OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python simulate.py --api --games 10
+
+or in-process: server = start_fake_openai(FakeApiSettings(latency_ms=50)); ...; server.shutdown()
+every setting can also be given by an environment variable FAKE_OPENAI_<NAME>, e.g. FAKE_OPENAI_ERROR_RATE=0.05
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+_TYPES = {"host": str, "port": int, "latency": str, "latency_ms": float, "latency_sigma": float, "error_rate": float,
+          "rate_limit_rate": float, "invalid_rate": float, "rpm_limit": int, "retry_after": float, "seed": int}
+
+DESCRIPTIONS = ["ztracený čas", "tichá naděje", "cesta domů", "sen o létání", "poslední tanec", "skrytá hrozba",
+                "dětská zvědavost", "zapomenutý slib", "nekonečné léto", "ranní mlha", "pád z výšky", "tajná radost"]
+
+
+@dataclass
+class FakeApiSettings:
+    """behaviour of the fake endpoint"""
+    host: str = "127.0.0.1"
+    port: int = 8765  # 0 picks a free port
+    latency: str = "lognormal"  # fixed, uniform, exponential or lognormal
+    latency_ms: float = 800  # fixed value, mean (uniform, exponential) or median (lognormal)
+    latency_sigma: float = 0.5  # spread of lognormal, uniform is latency_ms +- latency_ms * sigma
+    error_rate: float = 0.0  # share of requests answered with 500
+    rate_limit_rate: float = 0.0  # share of requests answered with 429 at random
+    invalid_rate: float = 0.0  # share of card choices answered with text instead of a card number
+    rpm_limit: int = 0  # requests per minute before 429, 0 is unlimited
+    retry_after: float = 1.0  # seconds, sent with every 429
+    seed: int | None = None
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> "FakeApiSettings":
+        """defaults, overridden by FAKE_OPENAI_<NAME> variables and then by the keyword arguments"""
+        settings = cls()
+        for field in fields(cls):
+            value = os.environ.get(f"FAKE_OPENAI_{field.name.upper()}")
+            if value is not None:
+                setattr(settings, field.name, _TYPES[field.name](value))
+        for name, value in overrides.items():
+            if value is not None:
+                setattr(settings, name, value)
+        return settings
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """HTTP server with one thread per request, so slow answers overlap like on the real API"""
+    daemon_threads = True
+
+    def __init__(self, settings: FakeApiSettings) -> None:
+        super().__init__((settings.host, settings.port), _Handler)
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+        self.lock = threading.Lock()
+        self.allowance = float(settings.rpm_limit)  # Requests left for rpm_limit, refilled continuously like the API
+        self.refilled = time.monotonic()
+        self.counts = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0}
+        self.latencies: list[float] = []  # Injected delays of the successful answers, in seconds
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Clients that gave up waiting (deadline, timeout) close the connection, that is expected under load
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode("ascii")
+        return f"http://{host}:{port}/v1"
+
+    def admit(self) -> tuple[int, float]:
+        """status code of the next request and how long to wait before answering"""
+        settings = self.settings
+        with self.lock:
+            self.counts["requests"] += 1
+            self._refill()
+            if settings.rpm_limit and self.allowance < 1 or self.random.random() < settings.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return 429, 0.0
+            self.allowance -= 1
+            delay = self._delay()
+            if self.random.random() < settings.error_rate:
+                self.counts["errors"] += 1
+                return 500, delay
+            self.counts["ok"] += 1
+            self.latencies.append(delay)
+            return 200, delay
+
+    def rate_limit_headers(self) -> dict[str, str]:
+        """x-ratelimit-* headers like the real API sends them, only when rpm_limit is set"""
+        if not self.settings.rpm_limit:
+            return {}
+        with self.lock:
+            self._refill()
+            remaining = int(self.allowance)
+            reset = (self.settings.rpm_limit - self.allowance) * 60 / self.settings.rpm_limit
+        return {"x-ratelimit-limit-requests": str(self.settings.rpm_limit),
+                "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s"}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        rpm = self.settings.rpm_limit
+        self.allowance = min(rpm, self.allowance + (now - self.refilled) * rpm / 60)
+        self.refilled = now
+
+    def _delay(self) -> float:
+        settings, rng = self.settings, self.random
+        mean = settings.latency_ms / 1000
+        if settings.latency == "fixed":
+            return mean
+        if settings.latency == "uniform":
+            return max(0.0, rng.uniform(mean * (1 - settings.latency_sigma), mean * (1 + settings.latency_sigma)))
+        if settings.latency == "exponential":
+            return rng.expovariate(1 / mean) if mean > 0 else 0.0
+        if settings.latency == "lognormal":
+            return mean * rng.lognormvariate(0, settings.latency_sigma)
+        raise ValueError(f"neznámé rozdělení zpoždění: {settings.latency}")
+
+    def answer(self, request: dict[str, Any]) -> tuple[str, int]:
+        """content of the answer and the estimated number of prompt tokens"""
+        text, images = "", 0
+        for message in request.get("messages", []):
+            content = message.get("content", "")
+            parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+            for part in parts:
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    text += part.get("text", "")
+        prompt_tokens = len(text) // 4 + 85 * images  # An image with detail "low" costs 85 tokens
+        with self.lock:
+            if request.get("response_format", {}).get("type") == "json_object":
+                if self.random.random() < self.settings.invalid_rate:
+                    return "Tohle je opravdu těžké rozhodnutí.", prompt_tokens
+                # Batched choices list the players as "- name (povaha: ...): 1, 2, 4"
+                choices = {name: self.random.choice(numbers.split(", "))
+                           for name, numbers in re.findall(r"^- (.+?) \(povaha: .*\): ([\d, ]+)$", text, re.MULTILINE)}
+                return json.dumps({name: int(number) for name, number in choices.items()}, ensure_ascii=False), prompt_tokens
+            if images > 1 or re.search(r"číslo karty", text):
+                if self.random.random() < self.settings.invalid_rate:
+                    return "Tohle je opravdu těžké rozhodnutí.", prompt_tokens
+                return str(self.random.randint(1, max(1, images))), prompt_tokens
+            return self.random.choice(DESCRIPTIONS), prompt_tokens
+
+    def stats(self) -> dict[str, Any]:
+        """request counts and percentiles of the injected delays in ms"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats: dict[str, Any] = dict(self.counts)
+        for percentile in (50, 90, 99):
+            stats[f"p{percentile}_ms"] = round(latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)]
+                                               * 1000, 1) if latencies else None
+        return stats
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+    protocol_version = "HTTP/1.1"  # Keep-alive, the clients reuse their connections
+    # Headers and body go out as two writes; with Nagle on, every request after the first on a reused connection
+    # would wait for the client's delayed ACK (about 40 ms) before the body is sent
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"neznámá cesta {self.path}", "type": "invalid_request_error"}})
+            return
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError as e:
+            self._send(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+            return
+
+        status, delay = self.server.admit()
+        if status == 429:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                       {"Retry-After": f"{self.server.settings.retry_after:g}", **self.server.rate_limit_headers()})
+            return
+        time.sleep(delay)
+        if status != 200:
+            self._send(status, {"error": {"message": "The server had an error while processing your request.",
+                                          "type": "server_error"}})
+            return
+
+        content, prompt_tokens = self.server.answer(request)
+        completion_tokens = max(1, len(content) // 4)
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }, self.server.rate_limit_headers())
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send(200, self.server.stats())
+        else:
+            self._send(404, {"error": {"message": f"neznámá cesta {self.path}", "type": "invalid_request_error"}})
+
+    def _send(self, status: int, payload: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # One line per request would drown the output of a load test
+
+
+def start_fake_openai(settings: FakeApiSettings | None = None) -> FakeOpenAIServer:
+    """start the fake endpoint on a daemon thread; point the clients to server.base_url, stop it with shutdown()"""
+    server = FakeOpenAIServer(settings or FakeApiSettings.from_env())
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake of the OpenAI chat completions API for load tests")
+    for field in fields(FakeApiSettings):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=_TYPES[field.name], default=None)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(FakeApiSettings.from_env(**vars(args)))
+    print(f"Falešné OpenAI API běží na {server.base_url} (statistiky na {server.base_url}/stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats(), ensure_ascii=False))
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
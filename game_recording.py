@@ -0,0 +1,300 @@
+"""Recording of whole games as a compact event stream, and their replay without any model calls
+
+A recording is JSONL (gzip compressed for *.gz): a "game" line with the seed and the players, one "turn" line per
+turn and an "end" line. A turn holds the cards every player drew before it, the storyteller's card and
+description, the table in its shuffled order, the votes and the score changes; players are indexes into the
+player list, cards are card keys. Nothing depends on the random generator, so a recording replays the same
+whatever the engine does with its rng later.
+
+    recorder = GameRecorder("game.jsonl.gz", engine, seed=42)  # before the first turn
+    engine.play_game()
+    recorder.close()
+
+    replay = GameReplay.load("game.jsonl.gz")
+    replay.state(120)                       # hands and scores before turn 120, from the nearest snapshot
+    replay.rescore(RULES["capped_bonus"])   # scores after every turn under other rules
+
+usage: python game_recording.py game.jsonl.gz [--turn 12] [--rules capped_bonus] [--verify]
+"""
+import argparse
+import gzip
+import io
+import json
+import time
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Iterable
+
+from abstracts import AbstractCardManager, AbstractPlayer, Card
+from dixit_engine import DixitEngine, GameObserver, TurnResult
+
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class RecordedTurn:
+    """one turn of a recording; players are indexes, cards are keys"""
+    number: int  # 0 for the first turn of the game
+    round_number: int
+    storyteller: int
+    storyteller_card: int
+    description: str
+    draws: list[list[int]]  # cards every player drew after the previous turn, the whole hand before the first one
+    table: list[tuple[int, int]]  # card and its owner, in the order they lay on the table
+    votes: list[tuple[int, int]]  # voter and card
+    deltas: list[int]  # score change of every player
+
+
+@dataclass
+class ReplayState:
+    """the game before a turn"""
+    turn: int
+    round_number: int
+    storyteller: int
+    hands: list[list[int]]
+    scores: list[int]
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    """text file, gzip compressed for *.gz"""
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.GzipFile(path, mode + "b"), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class GameRecorder(GameObserver):
+    """Writes the game of an engine to path; create it before the first turn, close it after the last one"""
+
+    def __init__(self, path: str, engine: DixitEngine, seed: int | None = None) -> None:
+        self.engine = engine
+        self.players = list(engine.players)
+        self._index = {player: index for index, player in enumerate(self.players)}
+        self._hands: list[list[Card]] = [[] for _ in self.players]  # Hands after the previous turn's cards left
+        self._scores = [player.score for player in self.players]
+        self._file = _open(path, "w")
+        self._write({"event": "game", "version": FORMAT_VERSION, "time": round(time.time(), 3), "seed": seed,
+                     "players": [player.name for player in self.players], "scores": self._scores,
+                     "winning_score": engine.winning_score})
+        engine.add_observer(self)
+
+    def turn_finished(self, result: TurnResult) -> None:
+        # The hands of the result are from before the played cards left, the scores already include the turn
+        draws = [[card.key for card in hand[len(previous):]] for hand, previous in zip(result.hands, self._hands)]
+        scores = [player.score for player in self.players]
+        self._write({
+            "event": "turn",
+            "turn": self.engine.turns_played,
+            "round": result.round_number,
+            "storyteller": self._index[result.storyteller],
+            "card": result.storyteller_card.key,
+            "description": result.description,
+            "draws": draws,
+            "table": [[card.key, self._index[owner]] for card, owner in result.cards_on_table],
+            "votes": [[self._index[voter], card.key] for voter, card in result.voting],
+            "deltas": [after - before for after, before in zip(scores, self._scores)],
+        })
+        played = {card for card, _ in result.cards_on_table}
+        self._hands = [[card for card in hand if card not in played] for hand in result.hands]
+        self._scores = scores
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._write({"event": "end", "turns": self.engine.turns_played, "scores": self._scores})
+        self._file.close()
+
+    def _write(self, record: dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+# Rules of scoring a recorded turn: the turn and the number of players in, the score change of every player out
+ScoringRules = Callable[[RecordedTurn, int], list[int]]
+
+
+def standard_rules(turn: RecordedTurn, number_of_players: int, bonus_cap: int | None = None) -> list[int]:
+    """the rules of DixitEngine._calculate_scores; bonus_cap limits the points for votes on a player's own card"""
+    deltas = [0] * number_of_players
+    correct = sum(1 for _, card in turn.votes if card == turn.storyteller_card)
+    if correct == 0 or correct == number_of_players - 1:
+        for player in range(number_of_players):
+            if player != turn.storyteller:
+                deltas[player] += 2
+    else:
+        deltas[turn.storyteller] += 3
+        for voter, card in turn.votes:
+            if card == turn.storyteller_card:
+                deltas[voter] += 3
+    for card, owner in turn.table:
+        if card != turn.storyteller_card:
+            votes = sum(1 for _, voted in turn.votes if voted == card)
+            deltas[owner] += votes if bonus_cap is None else min(votes, bonus_cap)
+    return deltas
+
+
+def no_consolation_rules(turn: RecordedTurn, number_of_players: int) -> list[int]:
+    """like the standard rules, but when everyone or no one guessed, the other players get nothing for it"""
+    deltas = standard_rules(turn, number_of_players)
+    correct = sum(1 for _, card in turn.votes if card == turn.storyteller_card)
+    if correct == 0 or correct == number_of_players - 1:
+        for player in range(number_of_players):
+            if player != turn.storyteller:
+                deltas[player] -= 2
+    return deltas
+
+
+RULES: dict[str, ScoringRules] = {
+    "standard": standard_rules,
+    "capped_bonus": lambda turn, players: standard_rules(turn, players, bonus_cap=3),  # At most 3 points for votes
+    "no_consolation": no_consolation_rules,
+}
+
+
+class _ReplayPlayer(AbstractPlayer):
+    """player of a replayed turn, only carries the name, score and hand; it can not make any decisions"""
+
+    def __init__(self, name: str, score: int, cards_on_hand: list[Card]) -> None:
+        self.name = name
+        self.score = score
+        self.cards_on_hand = cards_on_hand
+
+    def take_card(self, card: Card) -> None:
+        self.cards_on_hand.append(card)
+
+    def make_description(self, card: Card) -> str:
+        raise RuntimeError("Hráči přehrávané hry se nerozhodují, jen nesou stav")
+
+    def choose_card(self, description: str, laid_out_cards: list[Card]) -> Card:
+        raise RuntimeError("Hráči přehrávané hry se nerozhodují, jen nesou stav")
+
+    def score_add(self, number: int) -> None:
+        self.score += number
+
+
+class GameReplay:
+    """A loaded recording; the state before any turn is rebuilt from the nearest snapshot,
+    a snapshot is kept every snapshot_every turns"""
+
+    def __init__(self, header: dict[str, Any], turns: list[RecordedTurn], snapshot_every: int = 50) -> None:
+        self.seed: int | None = header.get("seed")
+        self.players: list[str] = header["players"]
+        self.initial_scores: list[int] = header.get("scores") or [0] * len(self.players)
+        self.turns = turns
+        self.snapshot_every = snapshot_every
+        self._snapshots: list[ReplayState] = []
+        hands: list[list[int]] = [[] for _ in self.players]
+        scores = list(self.initial_scores)
+        for turn in turns:
+            hands = self._hands_before(turn, hands)
+            if turn.number % snapshot_every == 0:
+                self._snapshots.append(ReplayState(turn.number, turn.round_number, turn.storyteller,
+                                                   [list(hand) for hand in hands], list(scores)))
+            scores = [score + delta for score, delta in zip(scores, turn.deltas)]
+            hands = self._after(turn, hands)
+        self.final_scores = scores
+
+    @classmethod
+    def load(cls, path: str, snapshot_every: int = 50) -> "GameReplay":
+        with _open(path, "r") as f:
+            return cls.parse(f, snapshot_every)
+
+    @classmethod
+    def parse(cls, lines: Iterable[str], snapshot_every: int = 50) -> "GameReplay":
+        header: dict[str, Any] | None = None
+        turns: list[RecordedTurn] = []
+        for line in lines:
+            record = json.loads(line)
+            if record["event"] == "game":
+                if record.get("version") != FORMAT_VERSION:
+                    raise ValueError(f"Nepodporovaná verze záznamu hry: {record.get('version')}")
+                header = record
+            elif record["event"] == "turn":
+                turns.append(RecordedTurn(len(turns), record["round"], record["storyteller"], record["card"],
+                                          record["description"], record["draws"],
+                                          [(card, owner) for card, owner in record["table"]],
+                                          [(voter, card) for voter, card in record["votes"]], record["deltas"]))
+        if header is None:
+            raise ValueError("Záznam hry nemá úvodní řádek 'game'")
+        return cls(header, turns, snapshot_every)
+
+    @staticmethod
+    def _hands_before(turn: RecordedTurn, hands: list[list[int]]) -> list[list[int]]:
+        return [hand + drawn for hand, drawn in zip(hands, turn.draws)]
+
+    @staticmethod
+    def _after(turn: RecordedTurn, hands: list[list[int]]) -> list[list[int]]:
+        played = {card for card, _ in turn.table}
+        return [[card for card in hand if card not in played] for hand in hands]
+
+    def state(self, turn: int) -> ReplayState:
+        """hands and scores before the turn (0 is the first); len(turns) is the end of the game, without hands"""
+        if not 0 <= turn <= len(self.turns):
+            raise IndexError(f"Hra má jen {len(self.turns)} tahů")
+        if turn == len(self.turns):
+            return ReplayState(turn, self.turns[-1].round_number if self.turns else 1, -1,
+                               [[] for _ in self.players], list(self.final_scores))
+        snapshot = self._snapshots[turn // self.snapshot_every]
+        hands = [list(hand) for hand in snapshot.hands]
+        scores = list(snapshot.scores)
+        for number in range(snapshot.turn, turn):
+            recorded = self.turns[number]
+            scores = [score + delta for score, delta in zip(scores, recorded.deltas)]
+            hands = self._hands_before(self.turns[number + 1], self._after(recorded, hands))
+        current = self.turns[turn]
+        return ReplayState(turn, current.round_number, current.storyteller, hands, scores)
+
+    def result(self, turn: int, manager: AbstractCardManager) -> TurnResult:
+        """the turn as DixitEngine reported it, e.g. to draw it with DixitGame._update_ui;
+        the players are stand-ins with the scores after the turn"""
+        state = self.state(turn)
+        recorded = self.turns[turn]
+        players = [_ReplayPlayer(name, score + delta, [manager.find_card(key) for key in hand])
+                   for name, score, delta, hand in zip(self.players, state.scores, recorded.deltas, state.hands)]
+        storyteller_card = manager.find_card(recorded.storyteller_card)
+        return TurnResult(recorded.round_number, players[recorded.storyteller], storyteller_card, recorded.description,
+                          [(manager.find_card(card), players[owner]) for card, owner in recorded.table],
+                          [(players[voter], manager.find_card(card)) for voter, card in recorded.votes],
+                          [list(player.cards_on_hand) for player in players])
+
+    def rescore(self, rules: ScoringRules = standard_rules) -> list[list[int]]:
+        """scores of every player after every turn when the game is scored by other rules;
+        the decisions stay as recorded, so e.g. the game may end later or earlier than it would have"""
+        scores = list(self.initial_scores)
+        history: list[list[int]] = []
+        for turn in self.turns:
+            scores = [score + delta for score, delta in zip(scores, rules(turn, len(self.players)))]
+            history.append(scores)
+        return history
+
+    def verify(self) -> list[int]:
+        """numbers of the turns whose recorded score changes differ from the standard rules"""
+        return [turn.number for turn in self.turns if standard_rules(turn, len(self.players)) != turn.deltas]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded game without any model calls")
+    parser.add_argument("recording", help="file written by GameRecorder (*.jsonl or *.jsonl.gz)")
+    parser.add_argument("--turn", type=int, default=None, help="show the hands and scores before this turn")
+    parser.add_argument("--rules", default=None, choices=sorted(RULES), help="final scores under other rules")
+    parser.add_argument("--verify", action="store_true", help="check the score changes against the standard rules")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    replay = GameReplay.load(args.recording)
+    elapsed = time.perf_counter() - start
+    print(f"{len(replay.turns)} tahů načteno za {elapsed * 1000:.1f} ms, hráči: {', '.join(replay.players)}")
+    print(f"konečné skóre: {dict(zip(replay.players, replay.final_scores))}")
+    if args.turn is not None:
+        state = replay.state(args.turn)
+        print(f"před tahem {state.turn} (kolo {state.round_number}): skóre {dict(zip(replay.players, state.scores))}")
+        for name, hand in zip(replay.players, state.hands):
+            print(f"  {name}: {hand}")
+    if args.rules:
+        final = replay.rescore(RULES[args.rules])[-1] if replay.turns else replay.initial_scores
+        print(f"skóre podle pravidel {args.rules}: {dict(zip(replay.players, final))}")
+    if args.verify:
+        different = replay.verify()
+        print("všechny tahy odpovídají pravidlům" if not different else f"tahy s jiným skóre: {different}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,44 +2,132 @@ import os
 import json
 import base64
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import NamedTuple
 
-from abstracts import Card
+from card_pack import CardPack, PackSource, write_card_pack
 
 
-def process_images_to_json(input_picture_directory: str, output_json_file: str) -> None:
+class ImportReport(NamedTuple):
+    """what an import did compared to the previous card pack"""
+    added: int
+    changed: int
+    removed: int
+    unchanged: int
+
+
+def _get_key_from_name(file: str) -> int:
+    """files are named x.png, therefore the 0 index is the x portion of string"""
+    return int(os.path.splitext(file)[0])
+
+
+def _given(data: bytes) -> bytes:
+    """image bytes already read, for PackSource.read"""
+    return data
+
+
+def _read_picture(path: str) -> tuple[str, int, bytes]:
+    """MD5 checksum of the base64 encoding, modification time in ns and raw bytes of one image"""
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, "rb") as _f:  #"rb" means read in binary mode
+        data: bytes = _f.read()
+    checksum: str = hashlib.md5(base64.b64encode(data)).hexdigest()
+    return checksum, mtime_ns, data
+
+
+def _list_pictures(input_picture_directory: str) -> list[tuple[int, str]]:
+    """key and path of every image, sorted by key"""
+    files: list[str] = os.listdir(input_picture_directory)
+    return [(_get_key_from_name(picture), os.path.join(input_picture_directory, picture))
+            for picture in sorted(files, key=_get_key_from_name)]
+
+
+def _read_pictures(input_picture_directory: str, workers: int | None = None) -> list[tuple[int, str, str, int, bytes]]:
+    """key, path, checksum, modification time and raw bytes of every image, sorted by key;
+    the files are read and hashed on a thread pool (hashlib releases the GIL for large buffers)"""
+    pictures = _list_pictures(input_picture_directory)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        read = list(executor.map(_read_picture, [path for _, path in pictures]))
+    return [(key, path, checksum, mtime_ns, data) for (key, path), (checksum, mtime_ns, data) in zip(pictures, read)]
+
+
+def process_images_to_json(input_picture_directory: str, output_json_file: str, workers: int | None = None) -> None:
     """input: directory of images to be processed;
         output: json file with images' metadata (key, path, MD5 checksum, base64 encoding of image)
         :param input_picture_directory:
         :param output_json_file:
+        :param workers: threads hashing the images, default is chosen by ThreadPoolExecutor
         :return: None
     """
+    json_data: str = json.dumps([{"key": key, "path": path, "checksum": checksum,
+                                  "encoded_picture": base64.b64encode(data).decode("utf-8")}
+                                 for key, path, checksum, _, data in _read_pictures(input_picture_directory, workers)],
+                                ensure_ascii=False, indent=4)
+    temporary = f"{output_json_file}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(json_data)
+    os.replace(temporary, output_json_file)
+
 
-    def _get_key_from_name(file: str) -> int:
-        """files are named x.png, therefore the 0 index is the x portion of string"""
-        return int(os.path.splitext(file)[0])
+def process_images_to_pack(input_picture_directory: str, output_pack_file: str, workers: int | None = None,
+                           incremental: bool = True) -> ImportReport:
+    """input: directory of images to be processed;
+        output: binary card pack (see card_pack.py) with key, path, MD5 checksum and the raw image bytes
 
-    def _encode_to_b64(file: str) -> str:
-        with open(file, "rb") as _f:  #"rb" means read in binary mode
-            b64_image: str = base64.b64encode(_f.read()).decode("utf-8")
-        return b64_image
+        With incremental=True an existing pack is reused: images whose size and modification time match
+        its index are copied over from it without hashing, only added and changed files are read and hashed
+        (on a thread pool), removed files are dropped. The new pack replaces the old one atomically,
+        a pack that is already up to date is not written at all.
+        :param input_picture_directory:
+        :param output_pack_file:
+        :param workers: threads hashing the images, default is chosen by ThreadPoolExecutor
+        :param incremental: reuse the unchanged cards of an existing output_pack_file
+        :return: counts of added, changed, removed and unchanged cards
+    """
+    old_pack: CardPack | None = None
+    if incremental:
+        try:
+            old_pack = CardPack(output_pack_file)
+        except (FileNotFoundError, ValueError):
+            old_pack = None
+    old_entries = {entry.path: entry for entry in old_pack.entries.values()} if old_pack else {}
 
-    def _calculate_md5(encoded_pic: str) -> str:
-        return hashlib.md5(encoded_pic.encode("utf-8")).hexdigest()
+    try:
+        pictures = _list_pictures(input_picture_directory)
+        sources: dict[str, PackSource] = {}
+        to_read: list[tuple[int, str]] = []
+        for key, path in pictures:
+            entry = old_entries.get(path)
+            stat = os.stat(path)
+            if old_pack is not None and entry is not None and entry.key == key \
+                    and (entry.length, entry.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                sources[path] = PackSource(key, path, entry.checksum, entry.mtime_ns, entry.length,
+                                           partial(old_pack.image_bytes, key))
+            else:
+                to_read.append((key, path))
 
-    pictures: list[Card] = []
-    files: list[str] = os.listdir(input_picture_directory)
-    sorted_files: list[str] = sorted(files, key=_get_key_from_name)
+        changed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (key, path), (checksum, mtime_ns, data) in zip(
+                    to_read, executor.map(_read_picture, [path for _, path in to_read])):
+                entry = old_entries.get(path)
+                if entry is not None and entry.checksum != checksum:
+                    changed += 1
+                sources[path] = PackSource(key, path, checksum, mtime_ns, len(data), partial(_given, data))
 
-    for picture in sorted_files:
-        key: int = _get_key_from_name(picture)
-        path: str = os.path.join(input_picture_directory, picture)
-        base64_data: str = _encode_to_b64(path)
-        checksum: str = _calculate_md5(base64_data)
-        pictures.append(Card(key=key, path=path, checksum=checksum, encoded_picture=base64_data))
+        added = sum(path not in old_entries for _, path in to_read)
+        report = ImportReport(added=added, changed=changed, removed=sum(path not in sources for path in old_entries),
+                              unchanged=len(pictures) - added - changed)
+        if old_pack is not None and not to_read and not report.removed:
+            return report  # The pack is up to date, nothing is written
+        write_card_pack(output_pack_file, [sources[path] for _, path in pictures],
+                        before_replace=old_pack.close if old_pack else None)
+        return report
+    finally:
+        if old_pack is not None:
+            old_pack.close()
 
-    json_data: str = json.dumps([picture.model_dump() for picture in pictures], ensure_ascii=False, indent=4)
-    with open(output_json_file, "w", encoding="utf-8") as f:
-        f.write(json_data)
 
 if __name__ == "__main__":
-    process_images_to_json("card_images","images.json")
\ No newline at end of file
+    print(process_images_to_pack("card_images", "cards.pack"))
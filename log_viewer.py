@@ -0,0 +1,258 @@
+"""Tk window following a log file like tail -f
+
+Only the last lines are read when the window opens, then only what was appended since the last look, so a big
+log opens as fast as a small one. Older lines are loaded on request. The JSONL event log of event_log.py is shown
+as readable lines and can be filtered by player and round, the text log by any text.
+
+usage: python log_viewer.py dixit.events.jsonl
+"""
+import json
+import os
+import sys
+import tkinter as tk
+from typing import Any, BinaryIO
+
+
+class LogTail:
+    """Reads the end of a growing file and then only the lines appended to it; lines come with the offset they
+    start at, so older ones can be read later. A file replaced by rotation or truncated is read from its start"""
+
+    def __init__(self, path: str, block_size: int = 65536, catch_up_bytes: int = 1_000_000) -> None:
+        self.path = path
+        self.block_size = block_size
+        self.catch_up_bytes = catch_up_bytes  # More new data than this is skipped, only its end is read
+        self.rotations = 0
+        self._offset = 0  # End of the last complete line read
+        self._identity: tuple[int, int] | None = None
+
+    def tail(self, max_lines: int) -> list[tuple[int, str]]:
+        """the last max_lines complete lines; read_new continues after them"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        self._identity = (stat.st_dev, stat.st_ino)
+        with open(self.path, "rb") as f:
+            end = self._last_line_end(f, stat.st_size)
+            self._offset = end
+            return self._lines_before(f, end, max_lines)
+
+    def older(self, before: int, max_lines: int) -> list[tuple[int, str]]:
+        """at most max_lines lines that end just before the offset before"""
+        if before <= 0:
+            return []
+        with open(self.path, "rb") as f:
+            return self._lines_before(f, before, max_lines)
+
+    def read_new(self) -> list[tuple[int, str]]:
+        """the complete lines appended since the last call, a line still being written waits for the next call"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        identity = (stat.st_dev, stat.st_ino)
+        if identity != self._identity or stat.st_size < self._offset:
+            if self._identity is not None:
+                self.rotations += 1
+            self._identity = identity
+            self._offset = 0
+        if stat.st_size == self._offset:
+            return []
+        skip = stat.st_size - self._offset > self.catch_up_bytes
+        start = stat.st_size - self.catch_up_bytes if skip else self._offset
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(stat.st_size - start)
+        if skip:  # Starts in the middle of a line
+            first = data.find(b"\n") + 1
+            data, start = data[first:], start + first
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return []
+        self._offset = start + end
+        return _split(data[:end], start)
+
+    def _last_line_end(self, f: BinaryIO, size: int) -> int:
+        position = size
+        while position > 0:
+            block = min(self.block_size, position)
+            f.seek(position - block)
+            newline = f.read(block).rfind(b"\n")
+            if newline >= 0:
+                return position - block + newline + 1
+            position -= block
+        return 0
+
+    def _lines_before(self, f: BinaryIO, end: int, max_lines: int) -> list[tuple[int, str]]:
+        position, data = end, b""
+        while position > 0 and data.count(b"\n") <= max_lines:
+            block = min(self.block_size, position)
+            position -= block
+            f.seek(position)
+            data = f.read(block) + data
+        if position > 0:  # The first line is cut, it belongs to the next call of older
+            first = data.find(b"\n") + 1
+            data, position = data[first:], position + first
+        return _split(data, position)[-max_lines:]
+
+
+def _split(data: bytes, offset: int) -> list[tuple[int, str]]:
+    """complete lines of data (which ends with a newline) and their offsets, data starts at offset"""
+    lines: list[tuple[int, str]] = []
+    for raw in data.split(b"\n")[:-1]:
+        lines.append((offset, raw.decode("utf-8", errors="replace").rstrip("\r")))
+        offset += len(raw) + 1
+    return lines
+
+
+def format_event(record: dict[str, Any]) -> str:
+    """one event of the JSONL log as a readable line"""
+    game = f"hra {record['game']}, " if record.get("game") is not None else ""
+    if record.get("event") == "turn":
+        placements = ", ".join(f"{name} {card}" for name, card in record.get("placements", {}).items())
+        votes = ", ".join(f"{name} → {card}" for name, card in record.get("votes", {}).items())
+        scores = ", ".join(f"{name} {score}" for name, score in record.get("scores", {}).items())
+        return (f"{game}kolo {record.get('round')}, vypravěč {record.get('storyteller')} "
+                f"(karta {record.get('storyteller_card')}): „{record.get('description')}“ | vyloženo: {placements} "
+                f"| hlasy: {votes} | skóre: {scores}")
+    details = {name: value for name, value in record.items() if name not in ("event", "time", "game")}
+    return f"{game}{record.get('event')}: {json.dumps(details, ensure_ascii=False)}"
+
+
+def event_matches(record: dict[str, Any], player: str, round_number: int | None) -> bool:
+    """player (case insensitive, empty matches all) told the story, played or voted; the round, if given, fits"""
+    if round_number is not None and record.get("round") != round_number:
+        return False
+    if not player:
+        return True
+    names = {record.get("storyteller"), *record.get("placements", {}), *record.get("votes", {}), *record.get("scores", {})}
+    return player.casefold() in {str(name).casefold() for name in names}
+
+
+class LogViewer:
+    """Window with the tail of a log file that follows new lines every poll_ms; about max_lines lines are kept,
+    the oldest are dropped as new ones come, "Starší řádky" loads more from the file.
+    events=True reads a JSONL event log of event_log.py"""
+
+    def __init__(self, root: tk.Misc, path: str, events: bool = False, max_lines: int = 2000,
+                 poll_ms: int = 500) -> None:
+        self.tail = LogTail(path)
+        self.events = events
+        self.max_lines = max_lines
+        self.poll_ms = poll_ms
+        self._lines: list[tuple[int, str]] = []  # Offset and text of the lines loaded, filtered or not
+        self._rotations = 0
+
+        self.window = tk.Toplevel(root)
+        self.window.title(f"Log - {os.path.basename(path)}")
+        # Sized from the main window, centered horizontally, 10% from the top
+        main_width, main_height = root.winfo_width(), root.winfo_height()
+        window_width, window_height = max(600, int(main_width * 0.4)), max(400, int(main_height * 0.8))
+        x = root.winfo_x() + (main_width - window_width) // 2
+        y = root.winfo_y() + int(main_height * 0.1)
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        self.window.minsize(300, 400)
+
+        filters = tk.Frame(self.window)
+        filters.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(10, 0))
+        self.player_filter = tk.StringVar()
+        self.round_filter = tk.StringVar()
+        tk.Label(filters, text="Hráč:" if events else "Hledat:").pack(side=tk.LEFT)
+        tk.Entry(filters, textvariable=self.player_filter, width=20).pack(side=tk.LEFT, padx=5)
+        if events:
+            tk.Label(filters, text="Kolo:").pack(side=tk.LEFT)
+            tk.Entry(filters, textvariable=self.round_filter, width=6).pack(side=tk.LEFT, padx=5)
+        self.player_filter.trace_add("write", lambda *_: self._render())
+        self.round_filter.trace_add("write", lambda *_: self._render())
+
+        buttons = tk.Frame(self.window)
+        buttons.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
+        tk.Button(buttons, text="Starší řádky", command=self._load_older).pack(side=tk.LEFT)
+        self.follow = tk.BooleanVar(value=True)
+        tk.Checkbutton(buttons, text="Sledovat nové řádky", variable=self.follow).pack(side=tk.LEFT, padx=10)
+        tk.Button(buttons, text="Zavřít", command=self.window.destroy).pack(side=tk.RIGHT)
+
+        text_frame = tk.Frame(self.window)
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.text = tk.Text(text_frame, wrap=tk.NONE, state=tk.DISABLED)
+        scrollbar_y = tk.Scrollbar(text_frame, orient=tk.VERTICAL, command=self.text.yview)
+        scrollbar_x = tk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=self.text.xview)
+        self.text.configure(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
+        self.text.grid(row=0, column=0, sticky="nsew")
+        scrollbar_y.grid(row=0, column=1, sticky="ns")
+        scrollbar_x.grid(row=1, column=0, sticky="ew")
+        text_frame.grid_rowconfigure(0, weight=1)
+        text_frame.grid_columnconfigure(0, weight=1)
+
+        self._lines = self.tail.tail(max_lines)
+        self._render()
+        self.window.after(self.poll_ms, self._poll)
+
+    def _poll(self) -> None:
+        if not self.window.winfo_exists():
+            return
+        new_lines = self.tail.read_new()
+        if self.tail.rotations != self._rotations:
+            # Offsets of the lines already loaded belong to the old file, older lines can not be read anymore
+            self._rotations = self.tail.rotations
+            self._lines = [(0, text) for _, text in self._lines]
+        if new_lines:
+            self._lines.extend(new_lines)
+            if len(self._lines) > self.max_lines * 3 // 2:
+                # Dropped in batches, so a busy log is not redrawn on every poll
+                del self._lines[:len(self._lines) - self.max_lines]
+                self._render()
+            else:
+                self._append([text for _, text in new_lines])
+        self.window.after(self.poll_ms, self._poll)
+
+    def _load_older(self) -> None:
+        before = self._lines[0][0] if self._lines else 0
+        older = self.tail.older(before, self.max_lines)
+        if older:
+            self._lines[:0] = older
+            self._render()
+            self.text.see("1.0")
+
+    def _shown(self, lines: list[str]) -> list[str]:
+        """the lines that pass the filters, event lines formatted"""
+        search = self.player_filter.get().strip()
+        if not self.events:
+            return [line for line in lines if search.casefold() in line.casefold()]
+        round_text = self.round_filter.get().strip()
+        round_number = int(round_text) if round_text.isdigit() else None
+        shown = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and event_matches(record, search, round_number):
+                shown.append(format_event(record))
+        return shown
+
+    def _render(self) -> None:
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "".join(line + "\n" for line in self._shown([text for _, text in self._lines])))
+        self.text.config(state=tk.DISABLED)
+        if self.follow.get():
+            self.text.see(tk.END)
+
+    def _append(self, lines: list[str]) -> None:
+        shown = self._shown(lines)
+        if not shown:
+            return
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, "".join(line + "\n" for line in shown))
+        self.text.config(state=tk.DISABLED)
+        if self.follow.get():
+            self.text.see(tk.END)
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.withdraw()
+    path = sys.argv[1] if len(sys.argv) > 1 else "dixit.events.jsonl"
+    viewer = LogViewer(root, path, events=path.endswith(".jsonl"))
+    root.wait_window(viewer.window)
@@ -1,4 +1,5 @@
-from dixit_game import DixitGame, Player
+from dixit_game import DixitGame
+from players import Player
 import tkinter as tk
 
 root = tk.Tk()
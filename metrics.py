@@ -0,0 +1,216 @@
+"""In-memory metrics of the game: phase durations, API call latency, payload sizes, tokens, retries and errors
+
+Histograms have fixed buckets like Prometheus ones, counters only add up; every value can carry labels
+(e.g. player="Petr"). The registry can be dumped as JSON or Prometheus text, also periodically from a
+background thread, so a running game or simulation can be watched from outside.
+
+    metrics.observe("dixit_api_call_seconds", 0.8, player="Petr", kind="choice")
+    metrics.inc("dixit_api_errors_total", player="Petr", error="RateLimitError")
+    with metrics.time("dixit_phase_seconds", phase="voting"):
+        ...
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000)
+TOKENS_BUCKETS = (10, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _buckets_for(name: str) -> tuple[float, ...]:
+    """buckets follow the unit at the end of the name, as in the Prometheus naming conventions"""
+    if name.endswith("_bytes"):
+        return BYTES_BUCKETS
+    if name.endswith("_tokens"):
+        return TOKENS_BUCKETS
+    return SECONDS_BUCKETS
+
+
+class Histogram:
+    """count, sum, min, max and counts per bucket of the observed values"""
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float | None:
+        """estimate, linear inside the bucket the quantile falls into"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else min(self.min, self.buckets[0])
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"count": self.count, "sum": self.sum, "min": self.min if self.count else None,
+                "max": self.max if self.count else None, "p50": self.quantile(0.5), "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99), "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts))}
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms; one instance (metrics) is shared by the whole process"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._dump_stop: threading.Event | None = None
+        self._dump_thread: threading.Thread | None = None
+
+    def inc(self, name: str, amount: float = 1, **labels: Any) -> None:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(_buckets_for(name))
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: Any) -> Iterator[None]:
+        """observe how long the block took, in seconds, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def histogram(self, name: str, **labels: Any) -> Histogram | None:
+        """one series, e.g. for the overlay; None when nothing was observed yet"""
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            return self._histograms.get(name, {}).get(key)
+
+    def merged(self, name: str) -> Histogram | None:
+        """all series of a histogram added together, e.g. the API latency of all players"""
+        with self._lock:
+            series = list(self._histograms.get(name, {}).values())
+            if not series:
+                return None
+            result = Histogram(series[0].buckets)
+            for histogram in series:
+                result.counts = [a + b for a, b in zip(result.counts, histogram.counts)]
+                result.count += histogram.count
+                result.sum += histogram.sum
+                result.min = min(result.min, histogram.min)
+                result.max = max(result.max, histogram.max)
+            return result
+
+    def total(self, name: str) -> float:
+        """sum of a counter over all its labels"""
+        with self._lock:
+            return sum(self._counters.get(name, {}).values())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        """everything as plain data, the labels are written as name{label="value"}"""
+        with self._lock:
+            return {
+                "time": time.time(),
+                "counters": {_series_name(name, key): value
+                             for name, series in self._counters.items() for key, value in series.items()},
+                "histograms": {_series_name(name, key): histogram.to_dict()
+                               for name, series in self._histograms.items() for key, histogram in series.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines: list[str] = []
+        with self._lock:
+            for name, counters in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{_series_name(name, key)} {value:g}" for key, value in counters.items())
+            for name, histograms in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in histograms.items():
+                    cumulative = 0
+                    for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{_series_name(name + '_bucket', key + (('le', bound),))} {cumulative}")
+                    lines.append(f"{_series_name(name + '_sum', key)} {histogram.sum:g}")
+                    lines.append(f"{_series_name(name + '_count', key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """write the metrics atomically, as Prometheus text for *.prom files, JSON otherwise"""
+        if path.endswith(".prom"):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def start_dump(self, path: str, interval: float = 10.0) -> None:
+        """dump every interval seconds on a daemon thread until stop_dump, which writes the last dump"""
+        self.stop_dump()
+        stop = self._dump_stop = threading.Event()
+
+        def run() -> None:
+            while not stop.wait(interval):
+                self.dump(path)
+            self.dump(path)
+
+        self._dump_thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_dump(self) -> None:
+        if self._dump_stop is not None and self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+        self._dump_stop = self._dump_thread = None
+
+
+def _series_name(name: str, labels: Labels) -> str:
+    if not labels:
+        return name
+    escaped = ",".join(f'{label}="{_escape(value)}"' for label, value in labels)
+    return f"{name}{{{escaped}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# One registry for the whole process
+metrics = Metrics()
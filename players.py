@@ -0,0 +1,390 @@
+from typing import TYPE_CHECKING, Any, Callable
+import asyncio
+import json
+import logging
+import re
+import time
+from abstracts import AbstractAsyncPlayer, AbstractBatchChooser, AbstractPlayer, Card
+from api_images import api_images
+from dixit_engine import FALLBACK_DESCRIPTION
+from metrics import metrics
+from rate_limiter import PRIORITY_CHOICE, PRIORITY_DESCRIPTION, Permit, RateLimiter, rate_limiter
+from response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    import openai
+
+
+log = logging.getLogger("dixit")
+
+MODEL = "gpt-4o-mini"
+
+_openai_module: Any = None
+
+
+def _openai() -> Any:
+    """the openai module, imported by the first real API call: it takes longer to import than the rest of the game,
+    so debug games and offline simulations never load it. The key from sk.py is set here as well"""
+    global _openai_module
+    if _openai_module is None:
+        import openai
+        openai.api_key = _api_key()
+        _openai_module = openai
+    return _openai_module
+
+
+def _api_key() -> str | None:
+    """key from sk.py; None (no sk.py or an empty key) falls back to the OPENAI_API_KEY variable"""
+    try:
+        from sk import mykey
+    except ImportError:
+        return None
+    return mykey or None
+
+
+class InvalidAnswer(ValueError):
+    """the model's answer could not be used, e.g. no number of a laid out card"""
+
+
+def parse_card_number(content: str | None, number_of_cards: int) -> int | None:
+    """index of the chosen card in an answer like "3", "'3'", "Karta 3." or "Vybírám kartu číslo 3",
+    the first number that is a valid card number counts; None when there is none"""
+    if not content:
+        return None
+    for match in re.finditer(r"\d+", content):
+        number = int(match.group())
+        if 1 <= number <= number_of_cards:
+            return number - 1
+    return None
+
+
+def parse_batch_answer(content: str | None, allowed: dict[str, set[int]]) -> dict[str, int]:
+    """card indexes from an answer like {"Petr": 3, "Jana": "5"}, also wrapped in text or ```json fences;
+    allowed are the card numbers (from 1) each player may choose, players missing from the answer or answering
+    a number they may not choose are left out"""
+    match = re.search(r"\{.*\}", content or "", re.DOTALL)
+    if match is None:
+        return {}
+    try:
+        answer = json.loads(match.group())
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(answer, dict):
+        return {}
+    indexes: dict[str, int] = {}
+    for name, numbers in allowed.items():
+        number = re.search(r"\d+", str(answer.get(name, "")))
+        if number is not None and int(number.group()) in numbers:
+            indexes[name] = int(number.group()) - 1
+    return indexes
+
+
+class Player(AbstractPlayer):
+    """AI powered player"""
+
+    def __init__(self, name: str, nature: str = "jsi hráč hry dixit", temperature: float = 0,
+                 cache: ResponseCache | None = None, timeout: float = 60.0, limiter: RateLimiter | None = None) -> None:
+        """set how the player will behave; with a cache, repeated questions are answered without an API call;
+        timeout bounds every HTTP request of the client; the calls share the limiter's budget, by default the one
+        of the whole process"""
+        self.nature = nature
+        self.limiter = limiter if limiter is not None else rate_limiter
+        self.timeout = timeout
+        self.temperature = temperature
+        self.name = name
+        self.cards_on_hand: list[Card] = []
+        self.score = 0
+        self.cache = cache
+
+    def take_card(self, card: Card) -> None:
+        self.cards_on_hand.append(card)
+
+    def make_description(self, card: Card) -> str:
+        content = self._complete(self._description_request(card), [card], "description")
+        return content if content else FALLBACK_DESCRIPTION
+
+    def choose_card(self, description: str, laid_out_cards: list[Card]) -> Card:
+        """look at all cards 'on the table' and compare them with the description;
+        raises InvalidAnswer when the answer names no card, the engine then retries or plays a random card"""
+        content = self._complete(self._choice_request(description, laid_out_cards), laid_out_cards, "choice",
+                                 lambda answer: parse_card_number(answer, len(laid_out_cards)) is not None)
+        return laid_out_cards[self._card_index(content, len(laid_out_cards))]
+
+    def _card_index(self, content: str | None, number_of_cards: int) -> int:
+        index = parse_card_number(content, number_of_cards)
+        if index is None:
+            metrics.inc("dixit_invalid_answers_total", player=self.name)
+            raise InvalidAnswer(f"Hráč {self.name} neodpověděl číslem karty 1 až {number_of_cards}: {content!r}")
+        return index
+
+    def _complete(self, request: dict[str, Any], cards: list[Card], kind: str,
+                  valid: Callable[[str], bool] = bool) -> str | None:
+        """one chat completion, answered from the cache when possible; only valid answers are cached"""
+        key = self.cache.key(request, cards, self.nature, self.temperature) if self.cache else None
+        if self.cache and key:
+            cached = self.cache.get(key, self.temperature)
+            if cached is not None and valid(cached):
+                metrics.inc("dixit_cache_hits_total", player=self.name, kind=kind)
+                return cached
+        metrics.observe("dixit_api_request_bytes", _payload_bytes(request), player=self.name, kind=kind)
+        queued = time.perf_counter()
+        api = _openai()
+        with self.limiter.limited(_estimated_tokens(request), _priority(kind)) as permit:
+            start = time.perf_counter()
+            metrics.observe("dixit_rate_limit_wait_seconds", start - queued, kind=kind)
+            try:
+                raw = api.chat.completions.with_raw_response.create(**request, timeout=self.timeout)
+            except api.OpenAIError as e:
+                metrics.inc("dixit_api_errors_total", player=self.name, kind=kind, error=type(e).__name__)
+                raise
+            content = self._record_response(raw, time.perf_counter() - start, kind, permit)
+        if self.cache and key and content and valid(content):
+            self.cache.put(key, content, self.temperature)
+        return content
+
+    def _record_response(self, raw: Any, elapsed: float, kind: str, permit: Permit) -> str | None:
+        """metrics of one raw API response (latency, retries the client made, tokens), returns its content;
+        the permit gets the rate limit headers and the real token usage"""
+        response = raw.parse()
+        permit.headers = raw.headers
+        metrics.observe("dixit_api_call_seconds", elapsed, player=self.name, kind=kind)
+        if raw.retries_taken:
+            metrics.inc("dixit_api_retries_total", raw.retries_taken, player=self.name, kind=kind)
+        if response.usage is not None:
+            metrics.inc("dixit_api_tokens_total", response.usage.prompt_tokens, player=self.name, type="prompt")
+            metrics.inc("dixit_api_tokens_total", response.usage.completion_tokens, player=self.name, type="completion")
+            permit.used_tokens = response.usage.total_tokens
+        content: str | None = response.choices[0].message.content
+        return content
+
+    def score_add(self, number: int) -> None:
+        self.score += number
+
+    def _description_request(self, card: Card) -> dict[str, Any]:
+        """arguments of the chat completion call for make_description, shared by the sync and async players"""
+        prompt = """Na základě zadaného obrázku vytvoř originální a abstraktní pojem, který vystihuje jeho atmosféru nebo koncept. 
+        Vyhni se přímému popisu věcí na obrázku. 
+        Například pro obrázek králíka ve skafandru by správný pojem mohl být "dobrodružství mimozemského života",
+        nikoliv "zvířecí astronaut".
+        Pojem nesmí být delší než 30 znaků a musí být originální. 
+        Vypiš mi pouze tento pojem ve formátu: 'pojem'.
+        """
+        return dict(
+            model=MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f" jsi hráč hry Dixit, který odpovídá na dotazy v roli {self.nature}, tvoje role by se mela odrazit v tom jak odpovidáš na dotazy"
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": api_images.data_url(card),
+                                "detail": "low",
+                            },
+                        },
+                    ],
+                }
+            ],
+            max_completion_tokens=75,
+            n=1,
+            temperature=self.temperature
+        )
+
+    def _choice_request(self, description: str, laid_out_cards: list[Card]) -> dict[str, Any]:
+        """arguments of the chat completion call for choose_card, shared by the sync and async players"""
+        prompt = f"Na základě zadaných obrázků vyber ten, který nejlépe sedí zadanému popisu:{description}. Napiš mi pouze číslo karty ve formatu:1"
+        built_message:list[dict[str,str]|dict[str,Any]] = []
+        for i in range(len(laid_out_cards)):
+            g = {"type": "image_url",
+                 "image_url": {
+                     "url": api_images.data_url(laid_out_cards[i]),
+                     "detail": "low"}}
+            built_message.append(g)
+
+        return dict(
+            model=MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f" jsi hráč hry Dixit, který odpovídá na dotazy v roli {self.nature}, tvoje role by se mela odrazit v tom jak se rozhoduješ"
+                },
+                {
+                    "role": "user",
+                    "content": [{"type": "text", "text": prompt}] + built_message,
+                }
+            ],
+            max_tokens=300,
+            n=1,
+            temperature=self.temperature
+        )
+
+
+class AsyncPlayer(Player, AbstractAsyncPlayer):
+    """AI powered player for DixitEngine.turn_async; its calls are coroutines on a shared AsyncOpenAI client,
+    so all players of a phase and many games run on one event loop without a thread per call
+    """
+
+    def __init__(self, name: str, nature: str = "jsi hráč hry dixit", temperature: float = 0,
+                 cache: ResponseCache | None = None, client: "openai.AsyncOpenAI | None" = None,
+                 timeout: float = 60.0, limiter: RateLimiter | None = None) -> None:
+        super().__init__(name, nature, temperature, cache, timeout, limiter)
+        self.client = client
+
+    async def make_description_async(self, card: Card) -> str:
+        content = await self._complete_async(self._description_request(card), [card], "description")
+        return content if content else FALLBACK_DESCRIPTION
+
+    async def choose_card_async(self, description: str, laid_out_cards: list[Card]) -> Card:
+        content = await self._complete_async(self._choice_request(description, laid_out_cards), laid_out_cards, "choice",
+                                             lambda answer: parse_card_number(answer, len(laid_out_cards)) is not None)
+        return laid_out_cards[self._card_index(content, len(laid_out_cards))]
+
+    async def _complete_async(self, request: dict[str, Any], cards: list[Card], kind: str,
+                              valid: Callable[[str], bool] = bool) -> str | None:
+        key = self.cache.key(request, cards, self.nature, self.temperature) if self.cache else None
+        if self.cache and key:
+            # SQLite blocks, the lookup runs on a thread so the other games on the event loop go on meanwhile
+            cached = await asyncio.to_thread(self.cache.get, key, self.temperature)
+            if cached is not None and valid(cached):
+                metrics.inc("dixit_cache_hits_total", player=self.name, kind=kind)
+                return cached
+        metrics.observe("dixit_api_request_bytes", _payload_bytes(request), player=self.name, kind=kind)
+        queued = time.perf_counter()
+        api = _openai()
+        async with self.limiter.limited_async(_estimated_tokens(request), _priority(kind)) as permit:
+            start = time.perf_counter()
+            metrics.observe("dixit_rate_limit_wait_seconds", start - queued, kind=kind)
+            try:
+                raw = await self._async_client().chat.completions.with_raw_response.create(**request,
+                                                                                            timeout=self.timeout)
+            except api.OpenAIError as e:
+                metrics.inc("dixit_api_errors_total", player=self.name, kind=kind, error=type(e).__name__)
+                raise
+            content = self._record_response(raw, time.perf_counter() - start, kind, permit)
+        if self.cache and key and content and valid(content):
+            await asyncio.to_thread(self.cache.put, key, content, self.temperature)
+        return content
+
+    def _async_client(self) -> "openai.AsyncOpenAI":
+        return self.client if self.client is not None else shared_async_client()
+
+
+class BatchChooser(AsyncPlayer, AbstractBatchChooser):
+    """One model request for the choices of several players: every card is uploaded once, the prompt lists each
+    player's persona and the card numbers they may choose, and the answer is a JSON object of names and numbers.
+    Players the answer misses or gets wrong come back as None, the engine then asks them one by one
+    """
+
+    def __init__(self, temperature: float = 0, cache: ResponseCache | None = None,
+                 client: "openai.AsyncOpenAI | None" = None, timeout: float = 60.0,
+                 limiter: RateLimiter | None = None) -> None:
+        super().__init__("hromadná volba", "jsi několik hráčů hry dixit", temperature, cache, client, timeout, limiter)
+
+    def choose_cards(self, description: str, options: list[tuple[AbstractPlayer, list[Card]]]) -> list[Card | None]:
+        cards, allowed = _batch_cards(options)
+        content = self._complete(self._batch_request(description, options, cards, allowed), cards, "batch",
+                                 lambda answer: len(parse_batch_answer(answer, allowed)) == len(allowed))
+        return self._batch_result(content, options, cards, allowed)
+
+    async def choose_cards_async(self, description: str,
+                                 options: list[tuple[AbstractPlayer, list[Card]]]) -> list[Card | None]:
+        cards, allowed = _batch_cards(options)
+        content = await self._complete_async(self._batch_request(description, options, cards, allowed), cards, "batch",
+                                             lambda answer: len(parse_batch_answer(answer, allowed)) == len(allowed))
+        return self._batch_result(content, options, cards, allowed)
+
+    def _batch_result(self, content: str | None, options: list[tuple[AbstractPlayer, list[Card]]], cards: list[Card],
+                      allowed: dict[str, set[int]]) -> list[Card | None]:
+        indexes = parse_batch_answer(content, allowed)
+        if len(indexes) < len(allowed):
+            metrics.inc("dixit_invalid_answers_total", len(allowed) - len(indexes), player=self.name)
+            log.warning("Hromadná odpověď neobsahuje platnou kartu pro všechny hráče: %r", content)
+        return [cards[indexes[player.name]] if player.name in indexes else None for player, _ in options]
+
+    def _batch_request(self, description: str, options: list[tuple[AbstractPlayer, list[Card]]], cards: list[Card],
+                       allowed: dict[str, set[int]]) -> dict[str, Any]:
+        """arguments of the chat completion call for choose_cards"""
+        players = "\n".join(f"- {player.name} (povaha: {getattr(player, 'nature', 'hráč hry dixit')}): "
+                             f"{', '.join(map(str, sorted(allowed[player.name])))}" for player, _ in options)
+        prompt = f"""Hraješ za několik hráčů hry Dixit najednou. Vypravěč k jedné z karet řekl popis: {description}.
+        Obrázky jsou karty očíslované od 1 v pořadí, v jakém jsou přiloženy. Každý hráč podle své povahy vybere jednu kartu,
+        která nejlépe sedí popisu, a smí vybrat jen z čísel karet uvedených u jeho jména:
+{players}
+        Odpověz pouze JSON objektem, kde klíčem je jméno hráče a hodnotou číslo karty, např. {{"{options[0][0].name}": 1}}."""
+        images = [{"type": "image_url", "image_url": {"url": api_images.data_url(card), "detail": "low"}}
+                  for card in cards]
+        return dict(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": " jsi zkušený hráč hry Dixit, který se umí vžít do role jiných hráčů"},
+                {"role": "user", "content": [{"type": "text", "text": prompt}] + images},
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=20 + 15 * len(options),
+            n=1,
+            temperature=self.temperature
+        )
+
+
+def _batch_cards(options: list[tuple[AbstractPlayer, list[Card]]]) -> tuple[list[Card], dict[str, set[int]]]:
+    """every card once, in order of appearance, and the card numbers (from 1) each player may choose"""
+    numbers: dict[Card, int] = {}
+    allowed: dict[str, set[int]] = {}
+    for player, cards in options:
+        allowed[player.name] = {numbers.setdefault(card, len(numbers) + 1) for card in cards}
+    return list(numbers), allowed
+
+
+def _payload_bytes(request: dict[str, Any]) -> int:
+    """approximate size of the request body, the texts and image data URLs of all messages"""
+    size = 0
+    for message in request["messages"]:
+        content = message["content"]
+        for part in content if isinstance(content, list) else [{"type": "text", "text": content}]:
+            size += len(part["text"].encode("utf-8")) if part["type"] == "text" else len(part["image_url"]["url"])
+    return size
+
+
+def _estimated_tokens(request: dict[str, Any]) -> int:
+    """tokens the request may cost, paid to the limiter before the call: about 4 characters of text per token,
+    85 per image with detail "low" and the whole allowed completion"""
+    tokens = request.get("max_completion_tokens") or request.get("max_tokens") or 0
+    for message in request["messages"]:
+        content = message["content"]
+        for part in content if isinstance(content, list) else [{"type": "text", "text": content}]:
+            tokens += len(part["text"]) // 4 if part["type"] == "text" else 85
+    return tokens
+
+
+def _priority(kind: str) -> int:
+    return PRIORITY_DESCRIPTION if kind == "description" else PRIORITY_CHOICE
+
+
+_shared_async_client: "openai.AsyncOpenAI | None" = None
+
+
+def use_base_url(base_url: str) -> None:
+    """send the calls of all players, sync and async, to another OpenAI compatible endpoint, e.g. fake_openai.py"""
+    global _shared_async_client
+    _openai().base_url = base_url.rstrip("/") + "/"  # The module client joins paths without adding a slash
+    _shared_async_client = None
+    shared_async_client(base_url)
+
+
+def shared_async_client(base_url: str | None = None, max_connections: int = 512) -> "openai.AsyncOpenAI":
+    """One AsyncOpenAI client, i.e. one HTTP connection pool, for all async players of the process;
+    created on the first call, base_url (or the OPENAI_BASE_URL variable) points it to another endpoint
+    """
+    global _shared_async_client
+    if _shared_async_client is None:
+        import httpx
+        api = _openai()
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        _shared_async_client = api.AsyncOpenAI(api_key=_api_key(), base_url=base_url,
+                                               http_client=api.DefaultAsyncHttpxClient(limits=limits))
+    return _shared_async_client
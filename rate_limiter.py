@@ -0,0 +1,209 @@
+"""Shared request and token budget for all API calls of the process
+
+Two token buckets (requests and tokens per minute) refill continuously; a call waits until both can pay for it
+and there is a free concurrency slot. Waiting calls are served by priority, so the storyteller's description,
+which blocks the whole turn, goes before the voting calls. The limits follow the x-ratelimit-* headers of
+the responses, and a 429 pauses all calls for Retry-After seconds and halves the concurrency, which then grows
+back by one after every successful round of calls.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, Mapping
+
+from metrics import metrics
+
+
+log = logging.getLogger("dixit")
+
+PRIORITY_DESCRIPTION = 0  # The storyteller's call blocks the whole turn
+PRIORITY_CHOICE = 1
+
+
+class Permit:
+    """one admitted call; set used_tokens and headers from the response before the block ends"""
+    __slots__ = ("tokens", "used_tokens", "headers")
+
+    def __init__(self, tokens: int) -> None:
+        self.tokens = tokens  # Estimate paid up front
+        self.used_tokens: int | None = None
+        self.headers: Mapping[str, str] | None = None
+
+
+class _Bucket:
+    __slots__ = ("capacity", "level", "updated")
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """seconds until amount is available, 0 when it is; more than the capacity only waits for a full bucket"""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity) if self.capacity else 0.0
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute plus an adaptive limit of concurrent calls"""
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 200_000,
+                 max_concurrency: int = 64) -> None:
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._successes = 0
+        self._waiting: list[tuple[int, int]] = []  # Heap of (priority, ticket)
+        self._tickets = itertools.count()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @contextmanager
+    def limited(self, tokens: int, priority: int = PRIORITY_CHOICE) -> Iterator[Permit]:
+        """blocks until the call may start; a RateLimitError (429) raised inside pauses all calls"""
+        ticket = self._enqueue(priority)
+        try:
+            with self._changed:
+                while (delay := self._try_admit(ticket, tokens)) > 0:
+                    self._changed.wait(delay)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        permit = Permit(tokens)
+        try:
+            yield permit
+        except Exception as e:
+            self._release(permit, e)
+            raise
+        self._release(permit, None)
+
+    @asynccontextmanager
+    async def limited_async(self, tokens: int, priority: int = PRIORITY_CHOICE) -> AsyncIterator[Permit]:
+        """limited for coroutines, waits without blocking the event loop"""
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_admit(ticket, tokens)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(min(delay, 0.05))  # Polls, a thread may free a slot at any time
+        except BaseException:  # E.g. cancelled by a deadline, the ticket must not block the others
+            self._abandon(ticket)
+            raise
+        permit = Permit(tokens)
+        try:
+            yield permit
+        except Exception as e:
+            self._release(permit, e)
+            raise
+        self._release(permit, None)
+
+    def _enqueue(self, priority: int) -> tuple[int, int]:
+        with self._lock:
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            return ticket
+
+    def _abandon(self, ticket: tuple[int, int]) -> None:
+        with self._changed:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._changed.notify_all()
+
+    def _try_admit(self, ticket: tuple[int, int], tokens: int) -> float:
+        """under the lock: admit the ticket and return 0, or return how long to wait before trying again"""
+        now = time.monotonic()
+        if self._waiting[0] != ticket:
+            return 0.05  # Somebody with a higher priority or an older ticket goes first
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= self.concurrency:
+            return 0.05
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        delay = max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+        if delay > 0:
+            return delay
+        heapq.heappop(self._waiting)
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        self.in_flight += 1
+        self._changed.notify_all()  # The next ticket is now at the head
+        return 0.0
+
+    def _release(self, permit: Permit, error: Exception | None) -> None:
+        with self._changed:
+            self.in_flight -= 1
+            if permit.used_tokens is not None:
+                self.tokens.level = min(self.tokens.capacity, self.tokens.level + permit.tokens - permit.used_tokens)
+            if permit.headers is not None:
+                self._adapt_limits(permit.headers)
+            if getattr(error, "status_code", None) == 429:
+                self._rate_limited(getattr(getattr(error, "response", None), "headers", {}))
+            elif error is None:
+                self._successes += 1
+                if self.concurrency < self.max_concurrency and self._successes >= self.concurrency:
+                    self.concurrency += 1  # Additive increase after a round of successful calls
+                    self._successes = 0
+            self._changed.notify_all()
+
+    def _rate_limited(self, headers: Mapping[str, str]) -> None:
+        retry_after = _seconds(headers.get("retry-after")) or _seconds(headers.get("x-ratelimit-reset-requests")) or 1.0
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self.concurrency = max(1, self.concurrency // 2)  # Multiplicative decrease
+        self._successes = 0
+        metrics.inc("dixit_rate_limited_total")
+        log.warning("API vrátilo 429, dotazy čekají %.1f s, souběžně nejvýše %s", retry_after, self.concurrency)
+
+    def _adapt_limits(self, headers: Mapping[str, str]) -> None:
+        # Take over the limits the API reports, and its view of what is left of them
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = _number(headers.get(f"x-ratelimit-limit-{kind}"))
+            remaining = _number(headers.get(f"x-ratelimit-remaining-{kind}"))
+            if limit:
+                bucket.capacity = limit
+            if remaining is not None:
+                bucket.level = min(bucket.level, remaining)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"concurrency": self.concurrency, "in_flight": self.in_flight, "waiting": len(self._waiting),
+                    "requests_left": round(self.requests.level, 1), "tokens_left": round(self.tokens.level)}
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _seconds(value: str | None) -> float | None:
+    """Retry-After ("2") or the reset headers of OpenAI ("1s", "6m0s", "250ms")"""
+    if not value:
+        return None
+    number = _number(value)
+    if number is not None:
+        return number
+    total = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total or None
+
+
+# One budget for all players of the process; the defaults fit gpt-4o-mini on the first usage tier
+rate_limiter = RateLimiter()
@@ -0,0 +1,101 @@
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any
+
+from abstracts import Card
+
+
+log = logging.getLogger("dixit")
+
+
+class ResponseCache:
+    """Opt-in on-disk (SQLite) cache of model answers, keyed by the prompt, the checksums of the cards in order,
+    the persona (nature) and the temperature.
+
+    With sample_size > 1 answers of calls with temperature > 0 are not repeated verbatim: up to sample_size
+    different answers are collected per key and after that a random one of them is returned.
+    Entries older than max_age seconds and the least recently used entries above max_entries are evicted.
+    Safe to share between threads; several processes may use the same file
+    """
+
+    def __init__(self, path: str = "responses.sqlite", max_entries: int = 100_000, max_age: float = 30 * 24 * 3600,
+                 sample_size: int = 1) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.sample_size = sample_size
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_eviction = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (id INTEGER PRIMARY KEY, key TEXT NOT NULL, "
+                                 "response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_key ON responses (key)")
+        self.evict()
+
+    @staticmethod
+    def key(request: dict[str, Any], cards: list[Card], nature: str, temperature: float) -> str:
+        """hash of everything that determines the answer; the images are represented by their checksums"""
+        texts: list[str] = []
+        for message in request["messages"]:
+            content = message["content"]
+            if isinstance(content, str):
+                texts.append(content)
+            else:
+                texts.extend(part["text"] for part in content if part["type"] == "text")
+        material = json.dumps([request["model"], texts, [card.checksum for card in cards], nature, temperature],
+                              ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, temperature: float) -> str | None:
+        """cached answer or None; in sampling mode None until sample_size answers were collected"""
+        sampling = self.sample_size > 1 and temperature > 0
+        with self._lock:
+            rows = self._connection.execute("SELECT id, response FROM responses WHERE key = ? ORDER BY id DESC",
+                                            (key,)).fetchall()
+            if not rows or (sampling and len(rows) < self.sample_size):
+                self.misses += 1
+                return None
+            row_id: int
+            response: str
+            row_id, response = random.choice(rows) if sampling else rows[0]
+            self._connection.execute("UPDATE responses SET last_used = ? WHERE id = ?", (time.time(), row_id))
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str, temperature: float) -> None:
+        sampling = self.sample_size > 1 and temperature > 0
+        now = time.time()
+        with self._lock:
+            if not sampling:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._connection.execute("INSERT INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                                     (key, response, now, now))
+            self._puts_since_eviction += 1
+            evict = self._puts_since_eviction >= 100
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        """drop entries older than max_age, then the least recently used ones above max_entries"""
+        with self._lock:
+            self._puts_since_eviction = 0
+            self._connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            self._connection.execute("DELETE FROM responses WHERE id IN (SELECT id FROM responses "
+                                     "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
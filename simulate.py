@@ -0,0 +1,244 @@
+"""Plays many complete games without any UI; debug games as fast as possible,
+real games with the threaded turn pipeline or concurrently on one event loop
+
+usage: python simulate.py --games 1000 --seed 42
+       python simulate.py --games 50 --api-async [--base-url http://127.0.0.1:8000/v1]
+       python simulate.py --games 5 --api --fake-api  (offline, against fake_openai.py)
+       python simulate.py --games 5 --api --fake-api --batch  (one call per placement and per voting)
+       python simulate.py --games 1000 --feature-players  (offline players choosing by the card features)
+       python simulate.py --games 1000 --players 12 --decks 2  (bigger tables need more cards)
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Iterable
+
+from abstracts import AbstractCardManager, AbstractPlayer
+from card_manager import CardManager, CombinedCardManager
+from dixit_engine import DixitEngine, GameObserver, TurnResult
+from event_log import EventLog
+from game_recording import GameRecorder
+from metrics import metrics
+from players import AsyncPlayer, BatchChooser, Player, shared_async_client, use_base_url
+from response_cache import ResponseCache
+from worker_pool import InlinePool, WorkerPool
+
+if TYPE_CHECKING:
+    from vote_matrix import VoteCollector
+
+# NumPy (card_features, vote_matrix) and the fake API server are imported only by the runs that use them,
+# so short debug runs and the tournament workers start without them; see the startup benchmark in benchmark.py
+
+
+DEFAULT_PLAYERS: list[tuple[str, str, float]] = [
+    ("Petr", "učitelka mateřské školky", 1),
+    ("Jana", "hloupý Honza", 0.9),
+    ("Josef", "milovník fyziky", 0.8),
+    ("Pavel", "farmář, který neumí číst", 0.7),
+]
+# Further seats for bigger tables, --players takes the first n of DEFAULT_PLAYERS + EXTRA_PLAYERS
+EXTRA_PLAYERS: list[tuple[str, str, float]] = [
+    ("Eva", "dítě ve školce", 0.9),
+    ("Karel", "neandrtálec", 0.7),
+    ("Marie", "babička, která peče buchty", 0.8),
+    ("Tomáš", "programátor", 0.6),
+    ("Lucie", "malířka", 1),
+    ("Jan", "kapitán lodi", 0.8),
+    ("Anna", "astronomka", 0.7),
+    ("Martin", "hasič", 0.9),
+]
+
+
+def play_one_game(manager: AbstractCardManager, seed: int, winning_score: int = 30,
+                  players: list[tuple[str, str, float]] = DEFAULT_PLAYERS, debug: bool = True,
+                  cache: ResponseCache | None = None, observers: Iterable[GameObserver] = (),
+                  batch: bool = False, record: str | None = None,
+                  collectors: "list[VoteCollector] | None" = None, feature_players: bool = False) -> DixitEngine:
+    """play one complete game with fresh players, returns the finished engine;
+    batch asks all players of a phase in one call, record is a file the game is recorded to (game_recording.py),
+    collectors gets a VoteCollector of the game for statistics; feature_players plays a real game (not debug)
+    with FeaturePlayer instead of the model players"""
+    pool: WorkerPool | None = None
+    if feature_players:
+        from card_features import FeaturePlayer
+        index = manager.features()
+        seated: list[AbstractPlayer] = [FeaturePlayer(name, index, seed=seed * len(players) + i)
+                                        for i, (name, _, _) in enumerate(players)]
+        debug = False
+        pool = InlinePool()  # Decisions take microseconds, a hand-off to the pool threads would cost more
+    else:
+        seated = [Player(name, nature, temperature, cache) for name, nature, temperature in players]
+    engine = DixitEngine(seated, manager, debug=debug, seed=seed, winning_score=winning_score,
+                         batch=BatchChooser(cache=cache) if batch else None, pool=pool)
+    for observer in observers:
+        engine.add_observer(observer)
+    recorder = GameRecorder(record, engine, seed) if record else None
+    if collectors is not None:
+        from vote_matrix import VoteCollector
+        collectors.append(VoteCollector(engine))
+    engine.play_game()
+    engine.close()
+    if recorder:
+        recorder.close()
+    return engine
+
+
+async def play_games_async(manager: AbstractCardManager, seeds: list[int], winning_score: int = 30,
+                           players: list[tuple[str, str, float]] = DEFAULT_PLAYERS,
+                           cache: ResponseCache | None = None, batch: bool = False,
+                           events: EventLog | None = None, record_dir: str | None = None) -> list[DixitEngine]:
+    """play real games concurrently on the running event loop, every player of every game shares one AsyncOpenAI client"""
+    engines = [DixitEngine([AsyncPlayer(name, nature, temperature, cache) for name, nature, temperature in players], manager,
+                           seed=seed, winning_score=winning_score, batch=BatchChooser(cache=cache) if batch else None)
+               for seed in seeds]
+    if events is not None:
+        for seed, engine in zip(seeds, engines):
+            engine.add_observer(events.observer(seed))
+    recorders = [GameRecorder(recording_path(record_dir, seed), engine, seed)
+                 for seed, engine in zip(seeds, engines)] if record_dir else []
+    await asyncio.gather(*(engine.play_game_async() for engine in engines))
+    for engine in engines:
+        engine.close()
+    for recorder in recorders:
+        recorder.close()
+    return engines
+
+
+def recording_path(directory: str, seed: int) -> str:
+    return os.path.join(directory, f"game-{seed}.jsonl.gz")
+
+
+class TurnTimer(GameObserver):
+    """wall time of every turn, to see the tail latency of the turn pipeline"""
+
+    def __init__(self) -> None:
+        self.durations: list[float] = []
+        self._last = time.perf_counter()
+
+    def turn_finished(self, result: TurnResult) -> None:
+        now = time.perf_counter()
+        self.durations.append(now - self._last)
+        self._last = now
+
+    def start(self) -> None:
+        """the next turn starts now, call before each game"""
+        self._last = time.perf_counter()
+
+    def summary(self) -> str:
+        durations = sorted(self.durations)
+        if not durations:
+            return "žádné tahy"
+        return ", ".join(f"p{p} {durations[min(len(durations) - 1, len(durations) * p // 100)] * 1000:.0f} ms"
+                         for p in (50, 90, 99)) + f", max {durations[-1] * 1000:.0f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless simulation of Dixit games")
+    parser.add_argument("--games", type=int, default=1000, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed + i")
+    parser.add_argument("--winning-score", type=int, default=30)
+    parser.add_argument("--players", type=int, default=len(DEFAULT_PLAYERS),
+                        help=f"number of players at the table, 3 to {len(DEFAULT_PLAYERS) + len(EXTRA_PLAYERS)}")
+    parser.add_argument("--decks", type=int, default=1,
+                        help="play with this many copies of the deck joined, 6 cards are needed per player")
+    parser.add_argument("--api", action="store_true",
+                        help="play real games one after another, the players of a turn on their own threads")
+    parser.add_argument("--api-async", action="store_true",
+                        help="play real games with AsyncPlayer, all games at once on one event loop")
+    parser.add_argument("--base-url", default=None, help="OpenAI compatible endpoint for --api and --api-async")
+    parser.add_argument("--fake-api", action="store_true",
+                        help="answer the API calls by a local fake_openai.py server (FAKE_OPENAI_* variables set it up)")
+    parser.add_argument("--batch", action="store_true",
+                        help="ask all players of the placement and of the voting in one API call per phase")
+    parser.add_argument("--events", default=None, help="JSONL file the turns of all games are appended to")
+    parser.add_argument("--record", default=None,
+                        help="directory every game is recorded to as game-<seed>.jsonl.gz, see game_recording.py")
+    parser.add_argument("--stats", action="store_true",
+                        help="print score distributions, storyteller success and game lengths (debug and --api games)")
+    parser.add_argument("--feature-players", action="store_true",
+                        help="play real games with offline players choosing by the card features (card_features.py)")
+    parser.add_argument("--cache", default=None, help="SQLite file caching the model answers across runs")
+    parser.add_argument("--metrics", default=None,
+                        help="file for the phase and API metrics, dumped periodically (*.prom Prometheus text, else JSON)")
+    parser.add_argument("--metrics-interval", type=float, default=10, help="seconds between the metrics dumps")
+    parser.add_argument("--cache-sample", type=int, default=1,
+                        help="collect this many different answers per question before sampling from the cache")
+    args = parser.parse_args()
+
+    deck = CardManager("cards.pack", "card_images")
+    manager = CombinedCardManager([deck] * args.decks) if args.decks > 1 else deck
+    players = (DEFAULT_PLAYERS + EXTRA_PLAYERS)[:args.players]
+    cache = ResponseCache(args.cache, sample_size=args.cache_sample) if args.cache else None
+    wins: dict[str, int] = {name: 0 for name, _, _ in players}
+    turns = 0
+
+    fake_server = None
+    if args.fake_api:
+        from fake_openai import FakeApiSettings, start_fake_openai
+        fake_server = start_fake_openai(FakeApiSettings.from_env(port=0))
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        args.base_url = fake_server.base_url
+    if args.base_url:
+        use_base_url(args.base_url)
+    timer = TurnTimer()
+    events = EventLog(args.events) if args.events else None
+    collectors: "list[VoteCollector] | None" = [] if args.stats else None
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    if args.metrics:
+        metrics.start_dump(args.metrics, args.metrics_interval)
+
+    start = time.perf_counter()
+    if args.api_async:
+        shared_async_client(base_url=args.base_url)
+        seeds = [args.seed + i for i in range(args.games)]
+        engines: Iterable[DixitEngine] = asyncio.run(play_games_async(manager, seeds, args.winning_score, players,
+                                                                     cache=cache, batch=args.batch, events=events,
+                                                                     record_dir=args.record))
+    elif args.api:
+        played: list[DixitEngine] = []
+        for i in range(args.games):
+            timer.start()
+            observers = [timer, events.observer(args.seed + i)] if events else [timer]
+            played.append(play_one_game(manager, args.seed + i, args.winning_score, players, debug=False, cache=cache,
+                                        observers=observers, batch=args.batch,
+                                        record=recording_path(args.record, args.seed + i) if args.record else None,
+                                        collectors=collectors))
+        engines = played
+    else:
+        engines = (play_one_game(manager, args.seed + i, args.winning_score, players,
+                                 observers=[events.observer(args.seed + i)] if events else (),
+                                 record=recording_path(args.record, args.seed + i) if args.record else None,
+                                 collectors=collectors, feature_players=args.feature_players)
+                   for i in range(args.games))
+    for engine in engines:
+        for winner in engine.winners():
+            wins[winner.name] += 1
+        turns += engine.turns_played
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} her, {turns} tahů za {elapsed:.3f} s "
+          f"({args.games / elapsed:.0f} her/s, {turns / elapsed:.0f} tahů/s)")
+    for name, count in wins.items():
+        print(f"  {name}: {count} výher ({count / args.games:.1%})")
+    if args.api:
+        print(f"trvání tahu: {timer.summary()}")
+    if events:
+        events.close()
+    if collectors:
+        from vote_matrix import TurnBatch, batch_statistics
+        print(json.dumps(batch_statistics(TurnBatch.from_collectors(collectors)), ensure_ascii=False, indent=2))
+    if cache:
+        print(f"cache: {cache.stats()}")
+    if fake_server:
+        print(f"falešné API: {fake_server.stats()}")
+        fake_server.shutdown()
+    if args.metrics:
+        metrics.stop_dump()
+        print(f"metriky: {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""engines shared by the tests, on the players and the deck of benchmark.py"""
+from benchmark import SyntheticCards, named_players
+from dixit_engine import DixitEngine
+
+
+def debug_engine(count: int = 4, seed: int = 1, winning_score: int = 30) -> DixitEngine:
+    """engine choosing randomly, without any model calls"""
+    return DixitEngine(named_players(count), SyntheticCards(100), debug=True, seed=seed, winning_score=winning_score)
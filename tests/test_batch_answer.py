@@ -0,0 +1,28 @@
+import pytest
+
+from players import parse_batch_answer
+
+
+ALLOWED = {"Petr": {1, 2, 3}, "Jana": {2, 3, 4}, "Josef": {1, 4}}
+
+
+def test_plain_answer() -> None:
+    assert parse_batch_answer('{"Petr": 3, "Jana": "2", "Josef": 4}', ALLOWED) == {"Petr": 2, "Jana": 1, "Josef": 3}
+
+
+def test_answer_wrapped_in_text_and_fences() -> None:
+    content = 'Tady je volba:\n```json\n{"Petr": 1,\n "Jana": "karta 4"}\n```\nHodně štěstí!'
+
+    assert parse_batch_answer(content, ALLOWED) == {"Petr": 0, "Jana": 3}
+
+
+def test_numbers_a_player_may_not_choose_are_left_out() -> None:
+    # Jana may not vote for her own card 1, Josef's 7 is not on the table, Eva does not play
+    content = '{"Petr": 2, "Jana": 1, "Josef": 7, "Eva": 3}'
+
+    assert parse_batch_answer(content, ALLOWED) == {"Petr": 1}
+
+
+@pytest.mark.parametrize("content", [None, "", "nevím", "{nejde o json}", "[1, 2, 3]", '{"Petr": null}'])
+def test_unusable_answers_choose_nothing(content: str | None) -> None:
+    assert parse_batch_answer(content, ALLOWED) == {}
@@ -0,0 +1,43 @@
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from card_manager import CardManager, CombinedCardManager
+
+
+def _deck(directory: Path, keys: list[int]) -> CardManager:
+    pictures = directory / "card_images"
+    pictures.mkdir()
+    for key in keys:
+        with io.BytesIO() as data:
+            Image.new("RGB", (8, 12), (key * 40 % 256, 90, 160)).save(data, format="PNG")
+            (pictures / f"{key}.png").write_bytes(data.getvalue())
+    return CardManager(str(directory / "cards.pack"), str(pictures))
+
+
+def test_combined_keys_are_shifted_past_the_decks_before(tmp_path: Path) -> None:
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    first = _deck(tmp_path / "first", [1, 2, 5])
+    second = _deck(tmp_path / "second", [1, 3])
+
+    combined = CombinedCardManager([first, second, first])
+
+    # Offsets: 0, then past the first deck's highest key 5, then past the second deck's highest key 3
+    assert sorted(combined.dict_of_cards) == [1, 2, 5, 7, 9, 11, 12, 15]
+    assert combined.find_card(9).image_bytes == second.find_card(3).image_bytes
+    assert combined.find_card(15).image_bytes == first.find_card(5).image_bytes
+    assert combined.find_card(15) != combined.find_card(5)  # Copies of a deck are different cards
+    assert [card.key for card in first.dict_of_cards.values()] == [1, 2, 5]  # The decks themselves are unchanged
+
+
+def test_combined_features_cover_every_card(tmp_path: Path) -> None:
+    deck = _deck(tmp_path, [1, 2, 3])
+    combined = CombinedCardManager([deck, deck])
+
+    cards = list(combined.dict_of_cards.values())
+    vectors = combined.features().vectors(cards)
+
+    assert vectors.shape[0] == 6
+    assert (vectors[:3] == vectors[3:]).all()
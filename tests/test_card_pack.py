@@ -0,0 +1,56 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from card_pack import CardPack, PackSource, write_card_pack
+
+
+def _source(key: int, data: bytes) -> PackSource:
+    return PackSource(key, f"card_images/{key}.png", hashlib.md5(data).hexdigest(), 1_700_000_000_000_000_000 + key,
+                      len(data), lambda: data)
+
+
+def test_pack_round_trip(tmp_path: Path) -> None:
+    path = str(tmp_path / "cards.pack")
+    pictures = {1: b"\x89PNG first", 2: b"", 7: os.urandom(5000), 2**40: "Žluťoučký kůň".encode("utf-8")}
+    write_card_pack(path, [_source(key, data) for key, data in pictures.items()])
+
+    pack = CardPack(path)
+    try:
+        assert sorted(pack.entries) == sorted(pictures)
+        for key, data in pictures.items():
+            entry = pack.entries[key]
+            assert (entry.path, entry.checksum, entry.length) == (f"card_images/{key}.png",
+                                                                  hashlib.md5(data).hexdigest(), len(data))
+            assert entry.mtime_ns == 1_700_000_000_000_000_000 + key
+            assert pack.image_bytes(key) == data
+    finally:
+        pack.close()
+
+
+def test_damaged_pack_is_rejected(tmp_path: Path) -> None:
+    path = str(tmp_path / "cards.pack")
+    write_card_pack(path, [_source(1, b"picture")])
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 1)
+
+    with pytest.raises(ValueError):
+        CardPack(path)
+
+
+def test_source_changed_while_writing_keeps_the_old_pack(tmp_path: Path) -> None:
+    path = str(tmp_path / "cards.pack")
+    write_card_pack(path, [_source(1, b"picture")])
+    grown = PackSource(1, "card_images/1.png", "0" * 32, 0, 3, lambda: b"longer than announced")
+
+    with pytest.raises(ValueError):
+        write_card_pack(path, [grown])
+
+    pack = CardPack(path)
+    try:
+        assert pack.image_bytes(1) == b"picture"
+    finally:
+        pack.close()
+    assert os.listdir(tmp_path) == ["cards.pack"]
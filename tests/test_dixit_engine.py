@@ -0,0 +1,92 @@
+import pytest
+
+from abstracts import Card
+from benchmark import SyntheticCards, named_players
+from dixit_engine import DixitEngine, GameObserver, TurnResult
+from worker_pool import WorkerPool
+
+from helpers import debug_engine
+
+
+def _copy(card: Card) -> Card:
+    """the same card as another object, as cards loaded again or from a recording are"""
+    return Card(card.key, card.path, card.checksum)
+
+
+def test_scores_compare_cards_by_value() -> None:
+    engine = debug_engine(4)
+    storyteller, *others = engine.players
+    storyteller_card = storyteller.cards_on_hand[0]
+    engine.cards_on_table = [(_copy(storyteller_card), storyteller)] + [(player.cards_on_hand[0], player)
+                                                                         for player in others]
+    # The first voter finds the storyteller's card, the others vote for the first voter's card
+    voting = [(others[0], _copy(storyteller_card)), (others[1], others[0].cards_on_hand[0]),
+              (others[2], others[0].cards_on_hand[0])]
+
+    engine._calculate_scores(voting, storyteller, storyteller_card)
+
+    assert [player.score for player in engine.players] == [3, 3 + 2, 0, 0]
+
+
+def test_scores_when_everyone_finds_the_storyteller() -> None:
+    engine = debug_engine(4)
+    storyteller, *others = engine.players
+    storyteller_card = storyteller.cards_on_hand[0]
+    engine.cards_on_table = [(storyteller_card, storyteller)] + [(player.cards_on_hand[0], player) for player in others]
+
+    engine._calculate_scores([(player, _copy(storyteller_card)) for player in others], storyteller, storyteller_card)
+
+    assert [player.score for player in engine.players] == [0, 2, 2, 2]
+
+
+def test_abandoned_turn_can_be_played_again() -> None:
+    engine = debug_engine(4)
+    storyteller = engine.players[0]
+    hands = [list(player.cards_on_hand) for player in engine.players]
+    engine._start_turn()  # The turn fails after the storyteller's card was laid out
+
+    engine.abandon_turn()
+    result = engine.turn()
+
+    assert engine.table() == []
+    assert result.storyteller is storyteller
+    assert result.hands == hands
+    assert len(result.cards_on_table) == len(engine.players)
+
+
+def test_players_with_the_same_name_are_rejected() -> None:
+    seated = named_players(4)
+    seated[3].name = seated[1].name
+
+    with pytest.raises(ValueError, match=seated[1].name):
+        DixitEngine(seated, SyntheticCards(100), debug=True)
+
+
+class _FailingObserver(GameObserver):
+    def turn_finished(self, result: TurnResult) -> None:
+        raise RuntimeError("pozorovatel selhal")
+
+
+def test_turn_finishes_when_an_observer_fails() -> None:
+    engine = debug_engine(4)
+    engine.add_observer(_FailingObserver())
+
+    with pytest.raises(RuntimeError):
+        engine.turn()
+
+    assert (engine.turns_played, engine.index_storyteller, engine.table()) == (1, 1, [])
+    assert all(len(player.cards_on_hand) == 6 for player in engine.players)
+
+
+def test_close_stops_only_the_pools_the_engine_created() -> None:
+    engine = debug_engine(4)
+    created = engine.worker_pool()
+    engine.close()
+    with pytest.raises(RuntimeError):  # Shut down, takes no more calls
+        created.call_all([lambda: 1], [lambda: 0])
+
+    shared = WorkerPool(max_workers=2)
+    engine = DixitEngine(named_players(4), SyntheticCards(100), debug=True, pool=shared)
+    engine.close()
+    assert shared.call_all([lambda: 1], [lambda: 0]) == [1]
+    shared.shutdown()
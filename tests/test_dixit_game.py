@@ -0,0 +1,15 @@
+import pytest
+
+from dixit_game import VOTE_LINE_HEIGHT, table_layout
+
+
+@pytest.mark.parametrize("count", range(3, 13))
+def test_rows_keep_clear_of_the_table(count: int) -> None:
+    positions, table_y = table_layout(count, 1920, 1150)
+    above = [y for _, y in positions if y < table_y]
+    below = [y for _, y in positions if y > table_y]
+
+    assert above and below
+    assert max(above) + 130 < table_y - 80  # Panel above ends before the owners' names over the cards
+    assert table_y + 70 + VOTE_LINE_HEIGHT * (count - 1) < min(below) - 60  # Voters end before the name of the row below
+    assert max(below) + 130 <= 1150
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from dixit_engine import GameObserver, TurnResult
+from game_recording import GameRecorder, GameReplay
+
+from helpers import debug_engine
+
+
+class _Hands(GameObserver):
+    """hands of the players before every turn, by card keys"""
+
+    def __init__(self) -> None:
+        self.hands: list[list[list[int]]] = []
+
+    def turn_finished(self, result: TurnResult) -> None:
+        self.hands.append([[card.key for card in hand] for hand in result.hands])
+
+
+@pytest.mark.parametrize("name", ["game.jsonl", "game.jsonl.gz"])
+def test_recorded_game_replays_and_verifies(tmp_path: Path, name: str) -> None:
+    engine = debug_engine(5, seed=3)
+    hands = _Hands()
+    engine.add_observer(hands)
+    recorder = GameRecorder(str(tmp_path / name), engine, seed=3)
+    engine.play_game()
+    recorder.close()
+
+    replay = GameReplay.load(str(tmp_path / name), snapshot_every=4)
+
+    assert replay.verify() == []
+    assert replay.final_scores == [player.score for player in engine.players]
+    assert len(replay.turns) == engine.turns_played
+    for turn in (0, 5, len(replay.turns) - 1):
+        assert replay.state(turn).hands == hands.hands[turn]
+
+
+def test_verify_finds_changed_scores(tmp_path: Path) -> None:
+    engine = debug_engine(4, seed=5, winning_score=10)
+    recorder = GameRecorder(str(tmp_path / "game.jsonl"), engine, seed=5)
+    engine.play_game()
+    recorder.close()
+    replay = GameReplay.load(str(tmp_path / "game.jsonl"))
+
+    replay.turns[2].deltas[0] += 1
+
+    assert replay.verify() == [2]
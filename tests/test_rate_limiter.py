@@ -0,0 +1,21 @@
+import pytest
+
+from rate_limiter import _seconds
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("2", 2.0),
+    ("0.5", 0.5),
+    ("1s", 1.0),
+    ("250ms", 0.25),
+    ("6m0s", 360.0),
+    ("1h2m3.5s", 3723.5),
+    ("20ms", 0.02),
+])
+def test_reset_headers(value: str, seconds: float) -> None:
+    assert _seconds(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "0s"])
+def test_unknown_or_zero_reset_is_none(value: str | None) -> None:
+    assert _seconds(value) is None
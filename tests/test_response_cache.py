@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+class _Clock:
+    """time.time() of the cache, one second further on every call"""
+
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr("response_cache.time.time", clock)
+    return clock
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path, clock: _Clock) -> None:
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.put(key, f"odpověď {key}", temperature=0)
+    assert cache.get("a", temperature=0) == "odpověď a"  # "b" is now the least recently used
+    cache.put("d", "odpověď d", temperature=0)
+
+    cache.evict()
+
+    assert [cache.get(key, temperature=0) for key in ("a", "b", "c", "d")] == ["odpověď a", None, "odpověď c",
+                                                                              "odpověď d"]
+    assert cache.stats()["entries"] == 3
+    cache.close()
+
+
+def test_old_entries_are_evicted(tmp_path: Path, clock: _Clock) -> None:
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_age=3600)
+    cache.put("old", "stará odpověď", temperature=0)
+    clock.now += 3600
+    cache.put("new", "nová odpověď", temperature=0)
+
+    cache.evict()
+
+    assert cache.get("old", temperature=0) is None
+    assert cache.get("new", temperature=0) == "nová odpověď"
+    cache.close()
+
+
+def test_every_hundredth_put_evicts(tmp_path: Path, clock: _Clock) -> None:
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_entries=10)
+    for index in range(99):
+        cache.put(str(index), "odpověď", temperature=0)
+    assert cache.stats()["entries"] == 99
+
+    cache.put("99", "odpověď", temperature=0)
+
+    assert cache.stats()["entries"] == 10
+    assert cache.get("99", temperature=0) == "odpověď"
+    cache.close()
@@ -0,0 +1,26 @@
+import numpy as np
+
+from helpers import debug_engine
+from vote_matrix import TurnBatch, VoteCollector, score_turns
+
+
+def test_vectorized_scores_match_the_engine() -> None:
+    # Games of 3 to 12 players in one batch, so the narrower ones are padded
+    collectors = []
+    for count in range(3, 13):
+        engine = debug_engine(count, seed=count)
+        collectors.append(VoteCollector(engine))
+        for _ in range(40):
+            engine.turn()
+    batch = TurnBatch.from_collectors(collectors)
+
+    assert batch.owners.shape == (400, 12)
+    np.testing.assert_array_equal(score_turns(batch), batch.deltas)
+
+
+def test_bonus_cap_limits_the_points_for_votes() -> None:
+    # Storyteller 0 has slot 0, everyone but player 1 votes for player 1's card in slot 1
+    batch = TurnBatch.from_rows([0], [0], [[0, 1, 2, 3, 4]], [[-1, 0, 1, 1, 1]], [[0, 0, 0, 0, 0]])
+
+    np.testing.assert_array_equal(score_turns(batch), [[3, 3 + 3, 0, 0, 0]])
+    np.testing.assert_array_equal(score_turns(batch, bonus_cap=2), [[3, 3 + 2, 0, 0, 0]])
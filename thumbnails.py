@@ -0,0 +1,97 @@
+import io
+import os
+import json
+import logging
+from typing import Iterable
+
+from PIL import Image, ImageTk
+
+from abstracts import Card
+
+
+log = logging.getLogger("dixit")
+
+
+class ThumbnailCache:
+    """Decodes and resizes every card image at most once and keeps the Tk images for all redraws;
+    entries are keyed by card key and checksum, so a changed image file gets a new thumbnail.
+    Optionally all thumbnails are kept in one sprite atlas on disk, so the next start decodes one file
+    instead of every card
+    """
+
+    def __init__(self, size: tuple[int, int] = (80, 120), atlas_file: str | None = "thumbnails.png") -> None:
+        self.size = size
+        self.atlas_file = atlas_file
+        self._images: dict[tuple[int, str], Image.Image] = {}
+        self._photos: dict[tuple[int, str], ImageTk.PhotoImage] = {}
+
+    def image(self, card: Card) -> Image.Image:
+        """resized PIL image of the card, decoded from disk only on the first call"""
+        cache_key = (card.key, card.checksum)
+        image = self._images.get(cache_key)
+        if image is None:
+            with Image.open(io.BytesIO(card.image_bytes)) as original:
+                image = original.resize(self.size)
+            self._images[cache_key] = image
+        return image
+
+    def photo(self, card: Card) -> ImageTk.PhotoImage:
+        """Tk image of the card; needs an existing Tk root, the reference is kept here, so it is not garbage collected"""
+        cache_key = (card.key, card.checksum)
+        photo = self._photos.get(cache_key)
+        if photo is None:
+            photo = ImageTk.PhotoImage(self.image(card))
+            self._photos[cache_key] = photo
+        return photo
+
+    def preload(self, cards: Iterable[Card]) -> None:
+        """fill the cache for all cards at startup, from the atlas when it is up to date, else from the image files"""
+        cards = list(cards)
+        if self.atlas_file and self._load_atlas(cards):
+            log.info(f"Náhledy karet načteny z atlasu '{self.atlas_file}'")
+            return
+        for card in cards:
+            self.image(card)
+        if self.atlas_file:
+            self._save_atlas(cards)
+
+    def _index_file(self) -> str:
+        assert self.atlas_file is not None
+        return os.path.splitext(self.atlas_file)[0] + ".json"
+
+    def _load_atlas(self, cards: list[Card]) -> bool:
+        assert self.atlas_file is not None
+        try:
+            with open(self._index_file(), "r", encoding="utf-8") as f:
+                index: dict[str, list[int]] = json.load(f)
+            if index.pop("size", None) != list(self.size):
+                return False
+            if any(f"{card.key}:{card.checksum}" not in index for card in cards):
+                return False
+            with Image.open(self.atlas_file) as atlas:
+                atlas.load()
+                for card in cards:
+                    x, y = index[f"{card.key}:{card.checksum}"]
+                    self._images[(card.key, card.checksum)] = atlas.crop((x, y, x + self.size[0], y + self.size[1]))
+            return True
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, OSError) as e:
+            log.info(f"Atlas náhledů '{self.atlas_file}' nelze použít: {e}")
+            return False
+
+    def _save_atlas(self, cards: list[Card]) -> None:
+        assert self.atlas_file is not None
+        width, height = self.size
+        columns = max(1, int(len(cards) ** 0.5))
+        rows = (len(cards) + columns - 1) // columns
+        atlas = Image.new("RGBA", (columns * width, max(1, rows) * height))
+        index: dict[str, list[int]] = {"size": [width, height]}
+        for i, card in enumerate(cards):
+            x, y = (i % columns) * width, (i // columns) * height
+            atlas.paste(self.image(card), (x, y))
+            index[f"{card.key}:{card.checksum}"] = [x, y]
+        try:
+            atlas.save(self.atlas_file)
+            with open(self._index_file(), "w", encoding="utf-8") as f:
+                json.dump(index, f)
+        except OSError as e:
+            log.info(f"Atlas náhledů '{self.atlas_file}' se nepodařilo uložit: {e}")
@@ -0,0 +1,160 @@
+"""Round-robin tournaments of Dixit games played on a pool of processes
+
+Every worker loads the CardManager once, plays the games it is given and sends back
+only a compact GameRecord per game; the parent aggregates win rates and Elo ratings.
+
+usage: python tournament.py --games-per-lineup 1000 --workers 8
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from card_manager import CardManager
+from response_cache import ResponseCache
+from simulate import play_one_game
+
+
+PlayerSpec = tuple[str, str, float]  # name, nature, temperature
+
+DEFAULT_PERSONALITIES: list[PlayerSpec] = [
+    ("Petr", "učitelka mateřské školky", 1),
+    ("Jana", "hloupý Honza", 0.9),
+    ("Josef", "milovník fyziky", 0.8),
+    ("Pavel", "farmář, který neumí číst", 0.7),
+    ("Eva", "dítě ve školce", 0.9),
+    ("Karel", "neandrtálec", 0.7),
+]
+
+
+class GameRecord(NamedTuple):
+    """result of one game, the only thing sent back from a worker"""
+    seed: int
+    lineup: tuple[int, ...]  # indices into the personalities, in seating order
+    scores: tuple[int, ...]  # final scores in seating order
+    turns: int
+
+
+class PersonalityStats(NamedTuple):
+    name: str
+    nature: str
+    temperature: float
+    games: int
+    wins: float  # shared wins count as a fraction
+    win_rate: float
+    average_score: float
+    rating: float
+
+
+# worker globals, set once per process by _init_worker
+_manager: CardManager | None = None
+_personalities: list[PlayerSpec] = []
+_settings: tuple[bool, int] = (True, 30)
+_cache: ResponseCache | None = None
+
+
+def _init_worker(store_file: str, input_directory: str, personalities: list[PlayerSpec], debug: bool,
+                 winning_score: int, cache_file: str | None) -> None:
+    global _manager, _personalities, _settings, _cache
+    _manager = CardManager(store_file, input_directory)
+    _personalities = personalities
+    _settings = (debug, winning_score)
+    _cache = ResponseCache(cache_file) if cache_file else None
+
+
+def _play_game(task: tuple[int, tuple[int, ...]]) -> GameRecord:
+    seed, lineup = task
+    assert _manager is not None, "worker was not initialized"
+    debug, winning_score = _settings
+    engine = play_one_game(_manager, seed, winning_score, [_personalities[i] for i in lineup], debug=debug, cache=_cache)
+    return GameRecord(seed, lineup, tuple(player.score for player in engine.players), engine.turns_played)
+
+
+def round_robin(number_of_personalities: int, table_size: int, games_per_lineup: int,
+                seed: int = 0) -> list[tuple[int, tuple[int, ...]]]:
+    """every combination of personalities plays games_per_lineup games,
+    seats are rotated between the games so nobody is always the first storyteller"""
+    tasks: list[tuple[int, tuple[int, ...]]] = []
+    for lineup in itertools.combinations(range(number_of_personalities), table_size):
+        for game in range(games_per_lineup):
+            shift = game % table_size
+            tasks.append((seed + len(tasks), lineup[shift:] + lineup[:shift]))
+    return tasks
+
+
+def run_tournament(tasks: list[tuple[int, tuple[int, ...]]], personalities: list[PlayerSpec],
+                   workers: int | None = None, debug: bool = True, winning_score: int = 30,
+                   store_file: str = "cards.pack", input_directory: str = "card_images",
+                   cache_file: str | None = None) -> list[GameRecord]:
+    """play all tasks on a process pool and return the records sorted by seed"""
+    CardManager(store_file, input_directory)  # (re)generate the card store once, before the workers race for it
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(store_file, input_directory, personalities, debug, winning_score,
+                                       cache_file)) as executor:
+        records = list(executor.map(_play_game, tasks, chunksize=chunksize))
+    return sorted(records, key=lambda record: record.seed)
+
+
+def aggregate(records: list[GameRecord], personalities: list[PlayerSpec], k_factor: float = 16) -> list[PersonalityStats]:
+    """win rates, average scores and Elo ratings; a game counts as a round of pairwise matches by final score"""
+    games = [0] * len(personalities)
+    wins = [0.0] * len(personalities)
+    points = [0] * len(personalities)
+    ratings = [1500.0] * len(personalities)
+
+    for record in records:
+        best = max(record.scores)
+        winners = [seat for seat, score in enumerate(record.scores) if score == best]
+        for seat, personality in enumerate(record.lineup):
+            games[personality] += 1
+            points[personality] += record.scores[seat]
+            if seat in winners:
+                wins[personality] += 1 / len(winners)
+
+        deltas = [0.0] * len(record.lineup)
+        for a, b in itertools.combinations(range(len(record.lineup)), 2):
+            rating_a, rating_b = ratings[record.lineup[a]], ratings[record.lineup[b]]
+            expected = 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+            actual = 1.0 if record.scores[a] > record.scores[b] else 0.5 if record.scores[a] == record.scores[b] else 0.0
+            change = k_factor / (len(record.lineup) - 1) * (actual - expected)
+            deltas[a] += change
+            deltas[b] -= change
+        for seat, personality in enumerate(record.lineup):
+            ratings[personality] += deltas[seat]
+
+    return [PersonalityStats(name, nature, temperature, games[i], wins[i], wins[i] / games[i] if games[i] else 0.0,
+                             points[i] / games[i] if games[i] else 0.0, ratings[i])
+            for i, (name, nature, temperature) in enumerate(personalities)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Round-robin tournament of Dixit personalities on a process pool")
+    parser.add_argument("--games-per-lineup", type=int, default=1000)
+    parser.add_argument("--table-size", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, default is the CPU count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--winning-score", type=int, default=30)
+    parser.add_argument("--api", action="store_true", help="play real games with OpenAI players instead of debug games")
+    parser.add_argument("--cache", default=None, help="SQLite file caching the model answers, shared by all workers")
+    args = parser.parse_args()
+
+    personalities = DEFAULT_PERSONALITIES
+    tasks = round_robin(len(personalities), args.table_size, args.games_per_lineup, args.seed)
+
+    start = time.perf_counter()
+    records = run_tournament(tasks, personalities, args.workers, debug=not args.api, winning_score=args.winning_score,
+                             cache_file=args.cache)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(records)} her za {elapsed:.2f} s ({len(records) / elapsed:.0f} her/s)")
+    for stats in sorted(aggregate(records, personalities), key=lambda s: s.rating, reverse=True):
+        print(f"  {stats.name:<8} ({stats.nature}, t={stats.temperature}): rating {stats.rating:.0f}, "
+              f"výhry {stats.win_rate:.1%} z {stats.games} her, průměr {stats.average_score:.1f} bodů")
+
+
+if __name__ == "__main__":
+    main()
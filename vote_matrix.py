@@ -0,0 +1,179 @@
+"""Votes of many turns as NumPy arrays, their vectorized scoring and statistics over large simulation batches
+
+A turn is a row: owners[t, s] is the player whose card lies in table slot s, votes[t, p] the slot player p voted
+for (-1 for the storyteller). Games with fewer players than the widest one are padded with -1. score_turns scores
+all rows at once with the rules of DixitEngine._calculate_scores; one turn of 4 to 12 players is scored faster
+in plain Python, the arrays pay off from batches of about a hundred turns on.
+
+    collectors = [VoteCollector(engine) for engine in engines]   # before the games are played
+    ...
+    batch = TurnBatch.from_collectors(collectors)
+    print(batch_statistics(batch))
+"""
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from dixit_engine import DixitEngine, GameObserver, TurnResult
+from game_recording import GameReplay
+
+
+class TurnBatch(NamedTuple):
+    """turns of one or more games, row t is one turn"""
+    game: np.ndarray  # (T,) index of the game
+    players: np.ndarray  # (T,) number of players
+    storyteller: np.ndarray  # (T,) index of the storyteller
+    owners: np.ndarray  # (T, P) owner of the card in each table slot, -1 for padding
+    votes: np.ndarray  # (T, P) slot each player voted for, -1 for the storyteller and padding
+    deltas: np.ndarray  # (T, P) recorded score changes, 0 for padding
+
+    @staticmethod
+    def from_rows(game: list[int], storyteller: list[int], owners: list[list[int]], votes: list[list[int]],
+                  deltas: list[list[int]]) -> "TurnBatch":
+        width = max((len(row) for row in owners), default=0)
+
+        uniform = all(len(row) == width for row in owners)
+
+        def padded(rows: list[list[int]], fill: int) -> np.ndarray:
+            if uniform:  # All games have the same number of players, no padding needed
+                return np.array(rows, dtype=np.int32).reshape(len(rows), width)
+            array = np.full((len(rows), width), fill, dtype=np.int32)
+            for index, row in enumerate(rows):
+                array[index, :len(row)] = row
+            return array
+
+        return TurnBatch(np.asarray(game, dtype=np.int32), np.asarray([len(row) for row in owners], dtype=np.int32),
+                         np.asarray(storyteller, dtype=np.int32), padded(owners, -1), padded(votes, -1),
+                         padded(deltas, 0))
+
+    @staticmethod
+    def from_replays(replays: list[GameReplay]) -> "TurnBatch":
+        game, storyteller, owners, votes, deltas = [], [], [], [], []
+        for index, replay in enumerate(replays):
+            for turn in replay.turns:
+                slots = {card: slot for slot, (card, _) in enumerate(turn.table)}
+                voted = [-1] * len(replay.players)
+                for voter, card in turn.votes:
+                    voted[voter] = slots[card]
+                game.append(index)
+                storyteller.append(turn.storyteller)
+                owners.append([owner for _, owner in turn.table])
+                votes.append(voted)
+                deltas.append(turn.deltas)
+        return TurnBatch.from_rows(game, storyteller, owners, votes, deltas)
+
+    @staticmethod
+    def from_collectors(collectors: list["VoteCollector"]) -> "TurnBatch":
+        """one batch of the games of all collectors, game i is the game of collectors[i]"""
+        game, storyteller, owners, votes, deltas = [], [], [], [], []
+        for index, collector in enumerate(collectors):
+            game.extend([index] * len(collector.owners))
+            storyteller.extend(collector.storyteller)
+            owners.extend(collector.owners)
+            votes.extend(collector.votes)
+            deltas.extend(collector.deltas)
+        return TurnBatch.from_rows(game, storyteller, owners, votes, deltas)
+
+
+class VoteCollector(GameObserver):
+    """Collects the turns of one engine as rows of a TurnBatch, see TurnBatch.from_collectors;
+    it adds itself to the engine, create it before the first turn"""
+
+    def __init__(self, engine: DixitEngine) -> None:
+        self._index = {player: index for index, player in enumerate(engine.players)}
+        self._scores = [player.score for player in engine.players]
+        self._players = list(engine.players)
+        self.storyteller: list[int] = []
+        self.owners: list[list[int]] = []
+        self.votes: list[list[int]] = []
+        self.deltas: list[list[int]] = []
+        engine.add_observer(self)
+
+    def turn_finished(self, result: TurnResult) -> None:
+        slots = {card: slot for slot, (card, _) in enumerate(result.cards_on_table)}
+        voted = [-1] * len(self._players)
+        for voter, card in result.voting:
+            voted[self._index[voter]] = slots[card]
+        scores = [player.score for player in self._players]
+        self.storyteller.append(self._index[result.storyteller])
+        self.owners.append([self._index[owner] for _, owner in result.cards_on_table])
+        self.votes.append(voted)
+        self.deltas.append([after - before for after, before in zip(scores, self._scores)])
+        self._scores = scores
+
+
+def vote_matrix(batch: TurnBatch) -> np.ndarray:
+    """(T, P, P) one-hot matrix, [t, voter, slot] is 1 where the voter voted for the card in the slot"""
+    turns, width = batch.votes.shape
+    matrix = np.zeros((turns, width, width), dtype=np.int8)
+    rows, voters = np.nonzero(batch.votes >= 0)
+    matrix[rows, voters, batch.votes[rows, voters]] = 1
+    return matrix
+
+
+def score_turns(batch: TurnBatch, bonus_cap: int | None = None) -> np.ndarray:
+    """(T, P) score changes of every turn by the rules of DixitEngine._calculate_scores;
+    bonus_cap limits the points a player gets for votes on their card"""
+    turns, width = batch.votes.shape
+    rows = np.arange(turns)
+    voting = batch.votes >= 0
+    # Slot of the storyteller's card in every turn
+    storyteller_slot = np.argmax(batch.owners == batch.storyteller[:, None], axis=1)
+    correct = voting & (batch.votes == storyteller_slot[:, None])
+    number_correct = correct.sum(axis=1)
+    all_or_none = (number_correct == 0) | (number_correct == batch.players - 1)
+
+    seated = np.arange(width)[None, :] < batch.players[:, None]
+    others = seated & (np.arange(width)[None, :] != batch.storyteller[:, None])
+    deltas = np.where(all_or_none[:, None] & others, 2, 0)
+    deltas += np.where(~all_or_none[:, None] & correct, 3, 0)
+    deltas[rows, batch.storyteller] += np.where(all_or_none, 0, 3)
+
+    # Votes per slot, then given to the slot's owner; the storyteller's card gives no bonus
+    flat = (rows[:, None] * width + batch.votes)[voting]
+    received = np.bincount(flat, minlength=turns * width).reshape(turns, width)
+    received[rows, storyteller_slot] = 0
+    if bonus_cap is not None:
+        received = np.minimum(received, bonus_cap)
+    bonus = np.zeros((turns, width + 1), dtype=received.dtype)  # Padding slots (owner -1) go to the extra column
+    np.add.at(bonus, (np.repeat(rows, width), np.where(batch.owners >= 0, batch.owners, width).ravel()),
+              received.ravel())
+    return deltas + bonus[:, :width]
+
+
+def _summary(values: np.ndarray) -> dict[str, Any]:
+    if not len(values):
+        return {"n": 0}
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {"n": int(len(values)), "mean": round(float(values.mean()), 3), "std": round(float(values.std()), 3),
+            "min": int(values.min()), "p10": float(p10), "p50": float(p50), "p90": float(p90), "max": int(values.max())}
+
+
+def batch_statistics(batch: TurnBatch, deltas: np.ndarray | None = None) -> dict[str, Any]:
+    """score distributions, storyteller success and game lengths; deltas are the score changes to use,
+    by default the recorded ones (pass score_turns(...) to see other rules)"""
+    deltas = batch.deltas if deltas is None else deltas
+    games = int(batch.game.max()) + 1 if len(batch.game) else 0
+    width = batch.owners.shape[1]
+    final = np.zeros((games, width), dtype=np.int64)
+    np.add.at(final, batch.game, deltas)
+    players = np.zeros(games, dtype=np.int32)
+    players[batch.game] = batch.players
+    seated = np.arange(width)[None, :] < players[:, None]
+    winners = seated & (final == np.where(seated, final, np.iinfo(np.int64).min).max(axis=1, keepdims=True))
+
+    storyteller_gain = deltas[np.arange(len(batch.storyteller)), batch.storyteller]
+    success = storyteller_gain >= 3  # The storyteller scores only when some, but not all, guessed right
+    return {
+        "games": games,
+        "turns": int(len(batch.game)),
+        "game_length": _summary(np.bincount(batch.game, minlength=games)),
+        "final_score": _summary(final[seated]),
+        "winning_score": _summary(final.max(axis=1, initial=0)),
+        "storyteller_success_rate": round(float(success.mean()), 4) if len(success) else None,
+        "storyteller_success_by_seat": [round(float(success[batch.storyteller == seat].mean()), 4)
+                                        if (batch.storyteller == seat).any() else None for seat in range(width)],
+        "win_rate_by_seat": [round(float(winners[:, seat].sum() / seated[:, seat].sum()), 4)
+                             if seated[:, seat].any() else None for seat in range(width)],
+        "score_histogram": np.bincount(np.clip(final[seated] // 5, 0, None)).tolist(),  # Buckets of 5 points
+    }
@@ -0,0 +1,101 @@
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from random import Random
+from typing import Callable, TypeVar
+
+from metrics import metrics
+
+
+log = logging.getLogger("dixit")
+
+T = TypeVar("T")
+
+
+class WorkerPool:
+    """Bounded thread pool for the players' API calls.
+    A failed call is retried with exponential backoff and random jitter; a batch of calls never takes longer than
+    its deadline, calls that failed or did not finish in time are replaced by their fallback. A call that hangs
+    keeps its thread until it returns, but nobody waits for it anymore
+    """
+
+    def __init__(self, max_workers: int = 16, deadline: float = 60.0, attempts: int = 3, backoff: float = 0.5,
+                 max_backoff: float = 8.0) -> None:
+        self.deadline = deadline
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="player-call")
+        self._jitter = Random()  # Only for the backoff, the game decisions use the engine's seeded rng
+
+    def call_all(self, calls: list[Callable[[], T]], fallbacks: list[Callable[[], T]],
+                 deadline: float | None = None) -> list[T]:
+        """run all calls at once and wait at most deadline seconds (default self.deadline) for them;
+        the fallbacks of the calls that failed or were late are called here, in order"""
+        end = time.monotonic() + (self.deadline if deadline is None else deadline)
+        futures = [self._executor.submit(self._attempt, call, end) for call in calls]
+        wait(futures, timeout=max(0.0, end - time.monotonic()))
+        return [self._result(future, fallback) for future, fallback in zip(futures, fallbacks)]
+
+    def call(self, call: Callable[[], T], fallback: Callable[[], T], deadline: float | None = None) -> T:
+        return self.call_all([call], [fallback], deadline)[0]
+
+    def _attempt(self, call: Callable[[], T], end: float) -> T:
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except Exception as e:
+                attempt += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1)) * self._jitter.uniform(0.5, 1.5)
+                if attempt >= self.attempts or time.monotonic() + delay >= end:
+                    raise
+                log.warning("Volání selhalo (%s: %s), pokus %s za %.2f s", type(e).__name__, e, attempt + 1, delay)
+                metrics.inc("dixit_call_retries_total", error=type(e).__name__)
+                time.sleep(delay)
+
+    @staticmethod
+    def _result(future: Future[T], fallback: Callable[[], T]) -> T:
+        if not future.done():
+            future.cancel()  # Still queued or running, its result will not be used
+            metrics.inc("dixit_call_fallbacks_total", reason="deadline")
+            log.warning("Volání nestihlo termín, použije se náhradní odpověď")
+            return fallback()
+        error = future.exception()
+        if error is not None:
+            metrics.inc("dixit_call_fallbacks_total", reason=type(error).__name__)
+            log.warning("Volání selhalo (%s: %s), použije se náhradní odpověď", type(error).__name__, error)
+            return fallback()
+        return future.result()
+
+    def shutdown(self) -> None:
+        """stop taking calls; calls still running are not waited for"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class InlinePool(WorkerPool):
+    """Runs the calls one after another on the calling thread, for players that decide locally (e.g. FeaturePlayer),
+    where handing a call to another thread costs more than the call; a call that fails gets its fallback,
+    there are no retries and no deadline
+    """
+
+    def __init__(self) -> None:
+        # No executor, nothing runs on other threads
+        self.deadline = float("inf")
+        self.attempts = 1
+
+    def call_all(self, calls: list[Callable[[], T]], fallbacks: list[Callable[[], T]],
+                 deadline: float | None = None) -> list[T]:
+        return [self._inline(call, fallback) for call, fallback in zip(calls, fallbacks)]
+
+    @staticmethod
+    def _inline(call: Callable[[], T], fallback: Callable[[], T]) -> T:
+        try:
+            return call()
+        except Exception as e:
+            metrics.inc("dixit_call_fallbacks_total", reason=type(e).__name__)
+            log.warning("Volání selhalo (%s: %s), použije se náhradní odpověď", type(e).__name__, e)
+            return fallback()
+
+    def shutdown(self) -> None:
+        """nothing to stop, the calls ran on the caller's thread"""